@@ -0,0 +1,89 @@
+#
+# Script: benchmarks/bench_delta.py
+#
+# https://github.com/djacobson/pysubtask
+#
+# Bytes sent by delta uploads ('delta': True watch files, SFTP) vs full uploads,
+# for typical edit patterns of a CSV data file rewritten in place:
+#
+# edit_1      = 1 value overwritten (same length) mid-file
+# edit_100    = 100 values overwritten (same length), scattered
+# append_1pct = 1% new rows appended
+# tail_1pct   = last 1% of rows rewritten
+# truncate    = last 10% of rows removed
+# insert_1    = 1 row inserted mid-file (shifts the rest, see pysubtask/delta.py)
+# rewrite     = every row rewritten
+#
+# Usage: python benchmarks/bench_delta.py [--rows 200000] [--block-sizes 4096,16384,65536]
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pysubtask.delta import BlockManifest, changed_blocks  # noqa: E402
+
+
+def make_rows(nrows, seed=0):
+	rnd = random.Random(seed)
+	return [b'2020-01-01 00:00:%08d,%.4f,%.4f,sensor\n' % (i, rnd.random() * 100, rnd.random() * 100) for i in range(nrows)]
+
+
+def overwrite_values(rows, count, seed=1):
+	rnd = random.Random(seed)
+	rows = list(rows)
+	for _ in range(count):
+		i = rnd.randrange(len(rows))
+		rows[i] = rows[i][:-len(b'sensor\n')] + b'SENSOR\n'  # same length
+	return rows
+
+
+def edit_patterns(rows):
+	n = len(rows)
+	rnd = random.Random(2)
+	return [
+		('edit_1', overwrite_values(rows, 1)),
+		('edit_100', overwrite_values(rows, 100)),
+		('append_1pct', rows + make_rows(n // 100, seed=3)),
+		('tail_1pct', rows[:n - n // 100] + make_rows(n // 100, seed=4)),
+		('truncate', rows[:n - n // 10]),
+		('insert_1', rows[:n // 2] + [b'2020-01-01 00:00:inserted,0.0,0.0,sensor\n'] + rows[n // 2:]),
+		('rewrite', [b'%s%.4f\n' % (row[:-1], rnd.random()) for row in rows]),
+	]
+
+
+def delta_bytes(old, new, block_size):
+	manifest = BlockManifest(block_size)
+	for _ in changed_blocks(io.BytesIO(old), BlockManifest(block_size), manifest):
+		pass
+
+	start = time.perf_counter()
+	sent = sum(len(data) for _, data in changed_blocks(io.BytesIO(new), manifest, BlockManifest(block_size)))
+	return sent, (time.perf_counter() - start) * 1000
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Delta vs full upload bytes benchmark')
+	parser.add_argument('--rows', default=200000, type=int, help='CSV rows in the data file')
+	parser.add_argument('--block-sizes', default='4096,16384,65536', help='Comma separated manifest block sizes')
+	args = parser.parse_args()
+
+	rows = make_rows(args.rows)
+	old = b''.join(rows)
+	print('data file: {} rows, {} bytes'.format(args.rows, len(old)))
+	print('{:>12} {:>8} {:>12} {:>12} {:>8} {:>10}'.format(
+		'pattern', 'block', 'full bytes', 'delta bytes', 'sent %', 'scan ms'))
+	for name, newRows in edit_patterns(rows):
+		new = b''.join(newRows)
+		for block_size in [int(n) for n in args.block_sizes.split(',')]:
+			sent, ms = delta_bytes(old, new, block_size)
+			print('{:>12} {:>8} {:>12} {:>12} {:>8.2f} {:>10.2f}'.format(
+				name, block_size, len(new), sent, sent * 100.0 / max(1, len(new)), ms))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,571 @@
+#
+# Script: benchmarks/bench_e2e.py
+#
+# https://github.com/djacobson/pysubtask
+#
+# End-to-end benchmark of FTPTaskMaster / DropboxTaskMaster (master + spawned subtask)
+# against local stand-in servers, run in this process (no network, no accounts):
+#
+# ftp     = pyftpdlib FTP server
+# sftp    = paramiko SFTP server (pysftp client)
+# dropbox = fake Dropbox API v2 (HTTPS, self-signed cert), the Dropbox SDK in the
+#           subtask is pointed at it by its DROPBOX_API_HOST / DROPBOX_API_CONTENT_HOST
+#           and requests' REQUESTS_CA_BUNDLE environment variables
+#
+# Synthetic appenders write --rate lines/sec (round robin) across --files watch files,
+# each write followed by a master notify. Every line carries its sequence number: when
+# a server completes a transfer, the last line of the remote file marks it and every
+# earlier line of that file as visible.
+#
+# Per backend:
+# latency   = notify -> remote visible, p50 / p90 / p99 / max millisecs
+# bytes/s   = payload bytes received by the server per sec
+# tx/MB     = completed transfers per MB of appended data
+# cpu/rss   = subtask CPU secs and peak RSS MB (Linux /proc, else not reported)
+#
+# Results are saved as JSON (--output) to compare versions, --baseline prints the
+# change vs previously saved results.
+#
+# Requires: pyftpdlib, paramiko + pysftp, dropbox (cryptography, for the test cert)
+#
+# Usage: python benchmarks/bench_e2e.py [--backends ftp,sftp,dropbox] [--files 4] [--rate 20]
+#                                       [--duration 20] [--interval 1] [--appendonly]
+#                                       [--output e2e.json] [--baseline previous_e2e.json]
+
+import os
+import sys
+import ssl
+import json
+import time
+import socket
+import shutil
+import logging
+import argparse
+import datetime
+import tempfile
+import platform
+import threading
+import subprocess
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+RepoDir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, RepoDir)
+
+from pysubtask._config import Struct  # noqa: E402
+
+_User = 'bench'
+_Password = 'bench'
+_DrainSecs = 15  # Max wait for the last lines to be visible after the appenders stop
+
+
+##########################
+# Remote visible tracker #
+##########################
+
+class RemoteRecorder():
+	"""Notify times of each watch file's lines, and their latency once visible remotely."""
+
+	def __init__(self, names):
+		self._lock = threading.Lock()
+		self._index = {name: i for i, name in enumerate(names)}
+		self._notified = [[] for _ in names]  # notify time per sequence
+		self._visible = [0 for _ in names]  # lines visible (sequences < this)
+		self.latencies = []
+		self.transfers = 0
+		self.bytes_received = 0
+
+	def notified(self, index, seq, stamp):
+		with self._lock:
+			self._notified[index].append(stamp)
+
+	def received(self, path, nbytes):
+		# A server completed a transfer of path (nbytes received)
+		now = time.monotonic()
+		index = self._index.get(os.path.basename(path))
+		seq = last_sequence(path)
+		with self._lock:
+			self.transfers += 1
+			self.bytes_received += nbytes
+			if index is None or seq is None:
+				return
+			while self._visible[index] <= seq and self._visible[index] < len(self._notified[index]):
+				self.latencies.append(now - self._notified[index][self._visible[index]])
+				self._visible[index] += 1
+
+	def pending(self):
+		with self._lock:
+			return sum(len(stamps) - visible for stamps, visible in zip(self._notified, self._visible))
+
+
+def last_sequence(path, tail=4096):
+	# Sequence of the last complete line of path, None if none (i.e.: compressed)
+	try:
+		with open(path, 'rb') as f:
+			f.seek(max(0, os.path.getsize(path) - tail))
+			data = f.read()
+	except OSError:
+		return None
+	lines = data.split(b'\n')[:-1]
+	if not lines:
+		return None
+	try:
+		return int(lines[-1].split(b',', 2)[1])
+	except (IndexError, ValueError):
+		return None
+
+
+##############
+# FTP server #
+##############
+
+def serve_ftp(remoteDir, recorder):
+	from pyftpdlib.authorizers import DummyAuthorizer
+	from pyftpdlib.handlers import FTPHandler
+	from pyftpdlib.servers import FTPServer
+
+	class BenchFTPHandler(FTPHandler):
+
+		def log_transfer(self, cmd, filename, receive, completed, elapsed, bytes):
+			if receive and completed:
+				recorder.received(filename, bytes)
+
+	authorizer = DummyAuthorizer()
+	authorizer.add_user(_User, _Password, remoteDir, perm='elradfmwMT')
+	BenchFTPHandler.authorizer = authorizer
+	logging.getLogger('pyftpdlib').addHandler(logging.NullHandler())  # else logs every command to stderr
+
+	server = FTPServer(('127.0.0.1', 0), BenchFTPHandler)
+	threading.Thread(target=server.serve_forever, name='BenchFTP', daemon=True).start()
+	return server.socket.getsockname()[1], server.close_all
+
+
+###############
+# SFTP server #
+###############
+
+def serve_sftp(remoteDir, recorder):
+	import paramiko
+	from bench_sftp import BenchServer, BenchSFTP
+
+	logging.getLogger('paramiko').setLevel(logging.CRITICAL)  # subtask host open probes (no SSH banner)
+	key = paramiko.RSAKey.generate(2048)
+	sock = socket.socket()
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind(('127.0.0.1', 0))
+	sock.listen(16)
+	transports = []
+
+	def handle(conn):
+		transport = paramiko.Transport(conn)
+		transport.add_server_key(key)
+		transport.set_subsystem_handler('sftp', paramiko.SFTPServer, BenchSFTP, remoteDir, recorder)
+		transports.append(transport)
+		try:
+			transport.start_server(server=BenchServer())
+		except Exception:
+			pass
+
+	def accept():
+		while True:
+			try:
+				conn, _ = sock.accept()
+			except OSError:
+				return  # closed
+			threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+	def close():
+		sock.close()
+		for transport in transports:
+			transport.close()
+
+	threading.Thread(target=accept, name='BenchSFTP', daemon=True).start()
+	return sock.getsockname()[1], close
+
+
+######################
+# Fake Dropbox (API) #
+######################
+
+def self_signed_cert(folder):
+	# PEM cert + key files for 127.0.0.1
+	import ipaddress
+	from cryptography import x509
+	from cryptography.x509.oid import NameOID
+	from cryptography.hazmat.primitives import hashes, serialization
+	from cryptography.hazmat.primitives.asymmetric import ec
+
+	key = ec.generate_private_key(ec.SECP256R1())
+	name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+	now = datetime.datetime.utcnow()
+	cert = (
+		x509.CertificateBuilder()
+		.subject_name(name)
+		.issuer_name(name)
+		.public_key(key.public_key())
+		.serial_number(x509.random_serial_number())
+		.not_valid_before(now - datetime.timedelta(days=1))
+		.not_valid_after(now + datetime.timedelta(days=1))
+		.add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]), critical=False)
+		.add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+		.sign(key, hashes.SHA256()))
+	certFile = os.path.join(folder, 'bench_cert.pem')
+	keyFile = os.path.join(folder, 'bench_key.pem')
+	with open(certFile, 'wb') as f:
+		f.write(cert.public_bytes(serialization.Encoding.PEM))
+	with open(keyFile, 'wb') as f:
+		f.write(key.private_bytes(
+			serialization.Encoding.PEM,
+			serialization.PrivateFormat.TraditionalOpenSSL,
+			serialization.NoEncryption()))
+	return certFile, keyFile
+
+
+_Account = {
+	'account_id': 'dbid:' + 'A' * 35,
+	'name': {
+		'given_name': 'Bench', 'surname': 'Bench', 'familiar_name': 'Bench',
+		'display_name': 'Bench', 'abbreviated_name': 'BB'},
+	'email': 'bench@localhost',
+	'email_verified': True,
+	'disabled': False,
+	'locale': 'en',
+	'referral_link': 'https://localhost/referrals',
+	'is_paired': False,
+	'account_type': {'.tag': 'basic'},
+	'root_info': {'.tag': 'user', 'root_namespace_id': '1', 'home_namespace_id': '1'},
+}
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+class FakeDropbox():
+	"""Dropbox API v2 routes used by the subtask, files saved to remoteDir, completed uploads reported to recorder."""
+
+	def __init__(self, remoteDir, recorder):
+		self.remoteDir = remoteDir
+		self.recorder = recorder
+		self.sessions = {}
+		self.lock = threading.Lock()
+		self.routes = {
+			'/2/users/get_current_account': self.get_current_account,
+			'/2/files/upload': self.upload,
+			'/2/files/upload_session/start': self.session_start,
+			'/2/files/upload_session/append_v2': self.session_append,
+			'/2/files/upload_session/finish': self.session_finish}
+
+	def metadata(self, path, size):
+		stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+		return {
+			'name': os.path.basename(path), 'id': 'id:bench', 'rev': '0123456789abcdef',
+			'client_modified': stamp, 'server_modified': stamp, 'size': size,
+			'path_lower': path.lower(), 'path_display': path}
+
+	def commit(self, path, data, nbytes):
+		local = os.path.join(self.remoteDir, path.lstrip('/'))
+		with open(local, 'wb') as f:
+			f.write(data)
+		self.recorder.received(local, nbytes)
+		return self.metadata(path, len(data))
+
+	def get_current_account(self, arg, body):
+		return _Account
+
+	def upload(self, arg, body):
+		return self.commit(arg['path'], body, len(body))
+
+	def session_start(self, arg, body):
+		with self.lock:
+			session_id = 'session{}'.format(len(self.sessions))
+			self.sessions[session_id] = bytearray(body)
+		return {'session_id': session_id}
+
+	def session_append(self, arg, body):
+		with self.lock:
+			self.sessions[arg['cursor']['session_id']] += body
+		return None
+
+	def session_finish(self, arg, body):
+		with self.lock:
+			data = self.sessions.pop(arg['cursor']['session_id']) + body
+		return self.commit(arg['commit']['path'], bytes(data), len(data))
+
+
+class BenchDropboxHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'  # keep-alive, as the real API
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		arg = json.loads(self.headers.get('Dropbox-API-Arg') or 'null')
+		route = self.server.dropbox.routes.get(self.path.split('?')[0])
+		if route is None:
+			self.send_error(404)
+			return
+		self.reply(json.dumps(route(arg, body)).encode('utf8'))
+
+	def reply(self, content):
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+	def log_message(self, format, *args):
+		pass
+
+
+def serve_dropbox(remoteDir, recorder, certFile, keyFile):
+	server = ThreadingHTTPServer(('127.0.0.1', 0), BenchDropboxHandler)
+	server.dropbox = FakeDropbox(remoteDir, recorder)
+	context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+	context.load_cert_chain(certFile, keyFile)
+	server.socket = context.wrap_socket(server.socket, server_side=True)
+	threading.Thread(target=server.serve_forever, name='BenchDropbox', daemon=True).start()
+
+	def close():
+		server.shutdown()
+		server.server_close()
+	return server.server_address[1], close
+
+
+##################
+# Subtask probes #
+##################
+
+def subtask_usage(pid):
+	# (CPU secs, peak RSS MB) of pid from Linux /proc, (None, None) elsewhere
+	try:
+		with open('/proc/{}/stat'.format(pid)) as f:
+			fields = f.read().rsplit(')', 1)[1].split()
+		cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+		with open('/proc/{}/status'.format(pid)) as f:
+			status = dict(line.split(':', 1) for line in f if ':' in line)
+		rss = int(status['VmHWM'].split()[0]) / 1024.0
+	except (OSError, KeyError, ValueError, IndexError):
+		return None, None
+	return round(cpu, 3), round(rss, 1)
+
+
+def percentile(values, pct):
+	if not values:
+		return None
+	values = sorted(values)
+	return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+#############
+# Scenarios #
+#############
+
+def make_config(args, backend, port):
+	cfg = Struct('Bench config')
+	cfg.base = Struct('Bench base')
+	cfg.base.TimerIntervalSecs = args.interval
+	cfg.base.NotifyChannel = args.channel
+	cfg.base.RuntimeMode = args.runtime
+	cfg.ftp = Struct('Bench ftp')
+	cfg.ftp.Host = '127.0.0.1'
+	cfg.ftp.HostPort = port
+	cfg.ftp.User = _User
+	cfg.ftp.Password = _Password
+	cfg.ftp.UseSFTP = backend == 'sftp'
+	cfg.ftp.HostFTPPath = ''
+	cfg.ftp.HostSFTPPath = ''
+	cfg.ftp.ConnectionMode = args.connection_mode
+	cfg.dropbox = Struct('Bench dropbox')
+	cfg.dropbox.AccessToken = 'bench-token'
+	cfg.dropbox.ConnectionMode = args.connection_mode
+	return cfg
+
+
+def run_appenders(master, recorder, files, args):
+	# --rate lines/sec for --duration secs, round robin across files, each notified
+	line = b'%d,%d,%.6f,' + b'x' * max(0, args.line_bytes - 32) + b'\n'
+	handles = [open(f, 'ab') for f in files]
+	seqs = [0 for _ in files]
+	appended = 0
+	total = int(args.rate * args.duration)
+	start = time.monotonic()
+	for n in range(total):
+		delay = start + n / float(args.rate) - time.monotonic()
+		if delay > 0:
+			time.sleep(delay)
+		i = n % len(files)
+		data = line % (i, seqs[i], time.time())
+		handles[i].write(data)
+		handles[i].flush()
+		appended += len(data)
+		recorder.notified(i, seqs[i], time.monotonic())
+		master.notify_file_by_index(i)
+		seqs[i] += 1
+	for f in handles:
+		f.close()
+	return appended, time.monotonic() - start
+
+
+def run_backend(backend, args, root):
+	workDir = os.path.join(root, backend)
+	remoteDir = os.path.join(workDir, 'remote')
+	os.makedirs(os.path.join(workDir, 'data'))
+	os.makedirs(remoteDir)
+	names = ['bench{:03d}.csv'.format(i) for i in range(args.files)]
+	files = [os.path.join(workDir, 'data', name) for name in names]
+	for f in files:
+		open(f, 'wb').close()
+	recorder = RemoteRecorder(names)
+
+	if backend == 'ftp':
+		port, close = serve_ftp(remoteDir, recorder)
+	elif backend == 'sftp':
+		port, close = serve_sftp(remoteDir, recorder)
+	else:
+		certFile, keyFile = self_signed_cert(workDir)
+		port, close = serve_dropbox(remoteDir, recorder, certFile, keyFile)
+		os.environ['DROPBOX_API_HOST'] = '127.0.0.1:{}'.format(port)
+		os.environ['DROPBOX_API_CONTENT_HOST'] = '127.0.0.1:{}'.format(port)
+		os.environ['REQUESTS_CA_BUNDLE'] = certFile
+
+	# Masters / subtasks use paths relative to the working dir (upload, state, logs)
+	cwd = os.getcwd()
+	os.chdir(workDir)
+	cfg = make_config(args, backend, port)
+	watchFiles = [{'file': f, 'appendonly': args.appendonly} for f in files]
+	if backend == 'dropbox':
+		from pysubtask.dropbox import DropboxTaskMaster
+		master = DropboxTaskMaster(watchFiles, cfg, LogToConsole=False)
+	else:
+		from pysubtask.ftp import FTPTaskMaster
+		master = FTPTaskMaster(watchFiles, cfg, LogToConsole=False)
+
+	usage = (None, None)
+	try:
+		master.start()
+		time.sleep(args.warmup)
+		appended, elapsed = run_appenders(master, recorder, files, args)
+		deadline = time.monotonic() + _DrainSecs + args.interval * 2
+		while recorder.pending() and time.monotonic() < deadline:
+			time.sleep(0.1)
+		if master._subtask:
+			usage = subtask_usage(master._subtask.pid)
+	finally:
+		master.stop(forcekill=False)
+		os.chdir(cwd)
+		close()
+		for env in ('DROPBOX_API_HOST', 'DROPBOX_API_CONTENT_HOST', 'REQUESTS_CA_BUNDLE'):
+			os.environ.pop(env, None)
+
+	latencies = [secs * 1000 for secs in recorder.latencies]
+	mb = appended / 1048576.0
+	return {
+		'lines': len(latencies) + recorder.pending(),
+		'lines_visible': len(latencies),
+		'bytes_appended': appended,
+		'bytes_received': recorder.bytes_received,
+		'bytes_per_sec': round(recorder.bytes_received / elapsed, 1),
+		'transfers': recorder.transfers,
+		'transfers_per_mb': round(recorder.transfers / mb, 2) if mb else None,
+		'latency_ms': {
+			'p50': percentile(latencies, 50),
+			'p90': percentile(latencies, 90),
+			'p99': percentile(latencies, 99),
+			'max': max(latencies) if latencies else None},
+		'subtask_cpu_secs': usage[0],
+		'subtask_peak_rss_mb': usage[1],
+	}
+
+
+def git_revision():
+	try:
+		return subprocess.check_output(
+			['git', 'describe', '--always', '--dirty'], cwd=RepoDir, stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def print_results(results, baseline=None):
+	print('{:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>11} {:>7} {:>8} {:>7}'.format(
+		'backend', 'lines', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'bytes/s', 'tx/MB', 'cpu s', 'rss MB'))
+	for backend, res in results.items():
+		lat = res['latency_ms']
+		print('{:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>11} {:>7} {:>8} {:>7}'.format(
+			backend, '{}/{}'.format(res['lines_visible'], res['lines']),
+			fmt(lat['p50']), fmt(lat['p90']), fmt(lat['p99']), fmt(lat['max']),
+			fmt(res['bytes_per_sec']), fmt(res['transfers_per_mb']),
+			fmt(res['subtask_cpu_secs']), fmt(res['subtask_peak_rss_mb'])))
+		if baseline and backend in baseline.get('results', {}):
+			base = baseline['results'][backend]
+			print('{:>8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>11} {:>7} {:>8} {:>7}'.format(
+				'vs base', '',
+				change(lat['p50'], base['latency_ms']['p50']),
+				change(lat['p90'], base['latency_ms']['p90']),
+				change(lat['p99'], base['latency_ms']['p99']),
+				change(lat['max'], base['latency_ms']['max']),
+				change(res['bytes_per_sec'], base['bytes_per_sec']),
+				change(res['transfers_per_mb'], base['transfers_per_mb']),
+				change(res['subtask_cpu_secs'], base['subtask_cpu_secs']),
+				change(res['subtask_peak_rss_mb'], base['subtask_peak_rss_mb'])))
+
+
+def fmt(value):
+	return '-' if value is None else '{:.1f}'.format(value)
+
+
+def change(value, base):
+	if value is None or not base:
+		return '-'
+	return '{:+.0f}%'.format((value - base) * 100.0 / base)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='End-to-end latency / throughput benchmark with local stand-in servers')
+	parser.add_argument('--backends', default='ftp,sftp,dropbox', help='Comma separated: ftp, sftp, dropbox')
+	parser.add_argument('--files', default=4, type=int, help='Watch files (N)')
+	parser.add_argument('--rate', default=20.0, type=float, help='Total writes (lines) per sec across all files (R)')
+	parser.add_argument('--duration', default=20.0, type=float, help='Secs of writes per backend')
+	parser.add_argument('--line-bytes', default=128, type=int, help='Bytes per written line')
+	parser.add_argument('--interval', default=1, type=int, help='Subtask base.TimerIntervalSecs')
+	parser.add_argument('--warmup', default=2.0, type=float, help='Secs between start() and the first write')
+	parser.add_argument('--appendonly', action='store_true', help="'appendonly' watch files")
+	parser.add_argument('--channel', action='store_true', help='base.NotifyChannel = True')
+	parser.add_argument('--runtime', default='thread', help="base.RuntimeMode, 'thread' or 'asyncio'")
+	parser.add_argument('--connection-mode', default='deadtime', help="ConnectionMode, 'deadtime' or 'persistent'")
+	parser.add_argument('--output', default=None, help='Save results JSON here (default: bench_e2e_<revision>.json)')
+	parser.add_argument('--baseline', default=None, help='Previous results JSON to compare with')
+	args = parser.parse_args()
+
+	# Subtasks: python -m pysubtask.<ext> from this tree
+	os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [RepoDir, os.environ.get('PYTHONPATH')]))
+
+	revision = git_revision()
+	results = {}
+	root = tempfile.mkdtemp(prefix='bench_e2e_')
+	try:
+		for backend in args.backends.split(','):
+			print('{}: {} files, {} lines/sec for {} secs...'.format(backend, args.files, args.rate, args.duration))
+			results[backend] = run_backend(backend, args, root)
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	baseline = None
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	print_results(results, baseline)
+
+	output = args.output or 'bench_e2e_{}.json'.format(revision or 'unknown')
+	with open(output, 'w') as f:
+		json.dump({
+			'revision': revision,
+			'timestamp': datetime.datetime.now().isoformat(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'params': vars(args),
+			'results': results,
+		}, f, indent=2)
+	print('saved [{}]'.format(output))
+
+
+if __name__ == "__main__":
+	main()
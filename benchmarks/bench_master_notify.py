@@ -0,0 +1,182 @@
+#
+# Script: benchmarks/bench_master_notify.py
+#
+# https://github.com/djacobson/pysubtask
+#
+# Per-call cost (microsecs) of the master's notify hot path, for 1 / 10 / 100 / 1000
+# watch files (notified round robin), master logging to its log file as in production:
+#
+# notify_file     = base.notify_file() (.notify exists: one utime)
+# legacy_touch    = previous notify_file(): open + fdopen + utime + close per call
+# by_index        = notify_file_by_index(), no burst mode
+# channel         = notify_file_by_index(), base.NotifyChannel (no subtask listening = touch fallback)
+# burst_held      = notify_file_by_index_burst_mode(), inside a burst (notify held)
+# burst_regular   = notify_file_by_index_burst_mode(), regular rate (notify every call)
+# burst_logged    = burst_regular with burst_mode.log_notifies = True (previous logging)
+# byte_burst      = notify_file_by_index_byte_burst_mode(), write offset passed (no stat)
+# check_pending   = check_pending_notifications(), half the files pending (per call, all files)
+#
+# Results are saved as JSON (--output) to track them over time, --baseline prints the
+# change vs previously saved results.
+#
+# Usage: python benchmarks/bench_master_notify.py [--sizes 1,10,100,1000] [--calls 20000]
+#                                                 [--output notify.json] [--baseline previous_notify.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+from datetime import timedelta
+
+RepoDir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, RepoDir)
+
+from pysubtask import base  # noqa: E402
+from pysubtask import defaults_config as defaults  # noqa: E402
+from pysubtask._config import Struct  # noqa: E402
+
+_Repeats = 3  # best of
+
+
+def legacy_notify_file(wfile):
+	# Previous implementation: name built + touch() per call
+	nfile = '{}.notify'.format(wfile)
+	flags = os.O_CREAT | os.O_APPEND
+	with os.fdopen(os.open(nfile, flags=flags, mode=0o666)) as f:
+		os.utime(f.fileno() if os.utime in os.supports_fd else nfile)
+
+
+def make_master(root, name, nfiles, burstmode=None, channel=False):
+	watchDir = os.path.join(root, name)
+	os.makedirs(watchDir)
+	files = [os.path.join(watchDir, 'f{:04d}.csv'.format(i)) for i in range(nfiles)]
+	for f in files:
+		open(f, 'w').close()
+	cfg = Struct('Bench base')
+	cfg.NotifyChannel = channel
+	watchFiles = [{'file': f, 'burstmode': burstmode} for f in files]
+	master = base.BaseTaskMaster(watchFiles, cfg, LogFileName=os.path.join(root, 'logs', 'bench_master.log'), LogToConsole=False)
+	master.notify_all_files()  # create the .notify files, initial burst mode notifies
+	return master, files
+
+
+def per_call_usecs(func, nfiles, calls):
+	# Best of _Repeats, func(index) called round robin
+	best = None
+	for _ in range(_Repeats):
+		start = time.perf_counter()
+		for n in range(calls):
+			func(n % nfiles)
+		usecs = (time.perf_counter() - start) * 1000000.0 / calls
+		best = usecs if best is None else min(best, usecs)
+	return round(best, 3)
+
+
+def bench_size(root, nfiles, calls):
+	results = {}
+	tag = 'n{}'.format(nfiles)
+
+	master, files = make_master(root, tag + '_plain', nfiles)
+	results['notify_file'] = per_call_usecs(lambda i: base.notify_file(files[i]), nfiles, calls)
+	results['legacy_touch'] = per_call_usecs(lambda i: legacy_notify_file(files[i]), nfiles, calls)
+	results['by_index'] = per_call_usecs(master.notify_file_by_index, nfiles, calls)
+
+	master, files = make_master(root, tag + '_channel', nfiles, channel=True)
+	results['channel'] = per_call_usecs(master.notify_file_by_index, nfiles, calls)
+
+	# Default triggers, calls far faster than start_trigger_milli: bursting, notifies held
+	master, files = make_master(root, tag + '_held', nfiles, burstmode=True)
+	results['burst_held'] = per_call_usecs(master.notify_file_by_index, nfiles, calls)
+
+	# No burst trigger: every call is a regular rate notify
+	master, files = make_master(root, tag + '_regular', nfiles, burstmode={'start_trigger_milli': 0})
+	results['burst_regular'] = per_call_usecs(master.notify_file_by_index, nfiles, calls)
+	log_notifies = getattr(defaults.burst_mode, 'log_notifies', False)  # (always logged before it existed)
+	defaults.burst_mode.log_notifies = True
+	try:
+		results['burst_logged'] = per_call_usecs(master.notify_file_by_index, nfiles, calls)
+	finally:
+		defaults.burst_mode.log_notifies = log_notifies
+
+	master, files = make_master(root, tag + '_bytes', nfiles, burstmode={'bytes_per_sec': 1 << 30})
+	offsets = [0] * nfiles
+
+	def byte_notify(i):
+		offsets[i] += 100
+		master.notify_file_by_index(i, offset=offsets[i])
+	results['byte_burst'] = per_call_usecs(byte_notify, nfiles, calls)
+
+	# Half the files pending, none expired
+	master, files = make_master(root, tag + '_pending', nfiles, burstmode=True)
+	future_dt = datetime.datetime.now() + timedelta(hours=1)
+	for i in range(0, nfiles, 2):
+		master._watch_files_state[i]['pending_data_dt'] = future_dt
+	results['check_pending'] = per_call_usecs(
+		lambda i: master.check_pending_notifications(), 1, max(100, calls // nfiles))
+
+	return results
+
+
+def git_revision():
+	try:
+		return subprocess.check_output(
+			['git', 'describe', '--always', '--dirty'], cwd=RepoDir, stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Master notify hot path microbenchmark')
+	parser.add_argument('--sizes', default='1,10,100,1000', help='Comma separated watch file counts')
+	parser.add_argument('--calls', default=20000, type=int, help='Calls per measurement')
+	parser.add_argument('--output', default=None, help='Save results JSON here (default: bench_master_notify_<revision>.json)')
+	parser.add_argument('--baseline', default=None, help='Previous results JSON to compare with')
+	args = parser.parse_args()
+
+	baseline = {}
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)['results']
+
+	revision = git_revision()
+	results = {}
+	root = tempfile.mkdtemp(prefix='pysubtask_bench_')
+	try:
+		for nfiles in [int(n) for n in args.sizes.split(',')]:
+			results[str(nfiles)] = bench_size(root, nfiles, args.calls)
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+	names = list(next(iter(results.values())).keys())
+	print('{:>14} '.format('usecs / call') + ' '.join('{:>14}'.format('{} files'.format(n)) for n in results))
+	for name in names:
+		cells = []
+		for size, res in results.items():
+			cell = '{:.2f}'.format(res[name])
+			base_usecs = baseline.get(size, {}).get(name)
+			if base_usecs:
+				cell += ' ({:+.0f}%)'.format((res[name] - base_usecs) * 100.0 / base_usecs)
+			cells.append('{:>14}'.format(cell))
+		print('{:>14} '.format(name) + ' '.join(cells))
+
+	output = args.output or 'bench_master_notify_{}.json'.format(revision or 'unknown')
+	with open(output, 'w') as f:
+		json.dump({
+			'revision': revision,
+			'timestamp': datetime.datetime.now().isoformat(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'params': vars(args),
+			'results': results,
+		}, f, indent=2)
+	print('saved [{}]'.format(output))
+
+
+if __name__ == "__main__":
+	main()
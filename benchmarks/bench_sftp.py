@@ -0,0 +1,104 @@
+#
+# Script: benchmarks/bench_sftp.py
+#
+# https://github.com/djacobson/pysubtask
+#
+# paramiko SFTP stand-in server classes for bench_e2e.py (imported only for its sftp backend)
+
+import os
+
+import paramiko
+
+
+class BenchServer(paramiko.ServerInterface):
+
+	def check_auth_password(self, username, password):
+		return paramiko.AUTH_SUCCESSFUL
+
+	def get_allowed_auths(self, username):
+		return 'password'
+
+	def check_channel_request(self, kind, chanid):
+		return paramiko.OPEN_SUCCEEDED
+
+
+class BenchHandle(paramiko.SFTPHandle):
+
+	def __init__(self, path, flags, recorder):
+		super().__init__(flags)
+		self.path = path
+		self.recorder = recorder
+		self.bytes = 0
+
+	def stat(self):
+		return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+	def chattr(self, attr):
+		if attr.st_size is not None:
+			self.writefile.flush()
+			os.ftruncate(self.writefile.fileno(), attr.st_size)
+		return paramiko.SFTP_OK
+
+	def write(self, offset, data):
+		self.bytes += len(data)
+		return super().write(offset, data)
+
+	def close(self):
+		super().close()
+		if self.bytes:
+			self.recorder.received(self.path, self.bytes)
+
+
+class BenchSFTP(paramiko.SFTPServerInterface):
+	"""SFTP subsystem serving remoteDir, completed writes reported to recorder."""
+
+	def __init__(self, server, remoteDir, recorder):
+		super().__init__(server)
+		self.remoteDir = remoteDir
+		self.recorder = recorder
+
+	def local(self, path):
+		return os.path.join(self.remoteDir, path.lstrip('/'))
+
+	def canonicalize(self, path):
+		return '/' + path.lstrip('/') if path not in ('.', '') else '/'
+
+	def stat(self, path):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.stat(self.local(path)))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	lstat = stat
+
+	def list_folder(self, path):
+		entries = []
+		for name in os.listdir(self.local(path)):
+			attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(self.local(path), name)))
+			attr.filename = name
+			entries.append(attr)
+		return entries
+
+	def chattr(self, path, attr):
+		if attr.st_atime is not None:
+			os.utime(self.local(path), (attr.st_atime, attr.st_mtime))
+		return paramiko.SFTP_OK
+
+	def open(self, path, flags, attr):
+		path = self.local(path)
+		try:
+			fd = os.open(path, flags, 0o666)
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		f = os.fdopen(fd, 'r+b' if flags & (os.O_WRONLY | os.O_RDWR) else 'rb')
+		handle = BenchHandle(path, flags, self.recorder)
+		handle.readfile = handle.writefile = f
+		return handle
+
+	def remove(self, path):
+		os.remove(self.local(path))
+		return paramiko.SFTP_OK
+
+	def rename(self, oldpath, newpath):
+		os.replace(self.local(oldpath), self.local(newpath))
+		return paramiko.SFTP_OK
@@ -0,0 +1,121 @@
+#
+# Script: benchmarks/bench_watch_dirs.py
+#
+# https://github.com/djacobson/pysubtask
+#
+# Per-tick cost of BaseSubtask watch dir tracking ({'dir': ...} watch entries),
+# for 1k / 10k / 100k files in a watch dir:
+#
+# initial  = first tick, discovering every file (creates each .notify)
+# idle     = tick with nothing changed (dir mtime short-circuit)
+# touched  = tick after 10 existing .notify files were touched
+# added    = tick after 1 new file was added (full scandir rescan)
+# legacy   = idle tick of the previous listdir + linear search implementation (<= 10k files only)
+#
+# Usage: python benchmarks/bench_watch_dirs.py [--sizes 1000,10000,100000]
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from pysubtask import base  # noqa: E402
+
+
+class BenchSubtask(base.BaseSubtask):
+
+	def _process_notify(self, psWatchFile):
+		# Count only, measure detection cost (not snapshot / upload)
+		self.notified += 1
+
+
+def legacy_tick(watchDir, notify_dir_files):
+	# Previous implementation: listdir + linear search per file, O(n^2) per tick
+	for watchDirFile in os.listdir(watchDir):
+		if watchDirFile.endswith(".notify"):
+			continue
+		ndirfile = os.path.join(watchDir, watchDirFile)
+		i = 0
+		for (cachedndirfile, cached_notify_stamp) in notify_dir_files:
+			if ndirfile == cachedndirfile:
+				break
+			i += 1
+		ndirnotifyfile = '{}.notify'.format(ndirfile)
+		if os.path.exists(ndirnotifyfile):
+			os.stat(ndirnotifyfile).st_mtime
+
+
+def timed(func):
+	start = time.perf_counter()
+	func()
+	return (time.perf_counter() - start) * 1000
+
+
+def bench_size(root, nfiles):
+	watchDir = os.path.join(root, 'watch_{}'.format(nfiles))
+	os.makedirs(watchDir)
+	for i in range(nfiles):
+		open(os.path.join(watchDir, 'f{:06d}.dat'.format(i)), 'w').close()
+
+	parser = BenchSubtask.parse_args_init(None, 'bench')
+	subtask = BenchSubtask(parser.parse_args([
+		'-wd', '"{}"'.format(watchDir),
+		'-bakto', '',
+		'-stateto', '',
+		'-noconsole']))
+	subtask.notified = 0
+
+	results = {'files': nfiles}
+	results['initial'] = timed(subtask._process_check_dynamic_dir_list)
+	results['initial_notified'] = subtask.notified
+
+	# Let the dir mtime age past its granularity, so the short-circuit applies
+	time.sleep(base._DirMtimeGranularitySecs + 0.5)
+	subtask._process_check_dynamic_dir_list()  # settle (rescan after .notify creation)
+
+	subtask.notified = 0
+	results['idle'] = timed(subtask._process_check_dynamic_dir_list)
+
+	time.sleep(0.01)
+	for i in range(10):
+		base.notify_file(os.path.join(watchDir, 'f{:06d}.dat'.format(i)))
+	results['touched'] = timed(subtask._process_check_dynamic_dir_list)
+	results['touched_notified'] = subtask.notified
+
+	open(os.path.join(watchDir, 'new.dat'), 'w').close()
+	results['added'] = timed(subtask._process_check_dynamic_dir_list)
+
+	if nfiles <= 10000:
+		notify_dir_files = [(os.path.join(watchDir, 'f{:06d}.dat'.format(i)), 0) for i in range(nfiles)]
+		results['legacy'] = timed(lambda: legacy_tick(watchDir, notify_dir_files))
+
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description='BaseSubtask watch dir tracking per-tick benchmark')
+	parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated file counts')
+	args = parser.parse_args()
+
+	root = tempfile.mkdtemp(prefix='pysubtask_bench_')
+	cwd = os.getcwd()
+	os.chdir(root)  # subtask logs go to ./logs
+	try:
+		print('{:>8} {:>12} {:>10} {:>10} {:>10} {:>12}'.format(
+			'files', 'initial ms', 'idle ms', 'touched ms', 'added ms', 'legacy ms'))
+		for nfiles in [int(n) for n in args.sizes.split(',')]:
+			r = bench_size(root, nfiles)
+			legacy = '{:.2f}'.format(r['legacy']) if 'legacy' in r else '-'
+			print('{:>8} {:>12.2f} {:>10.3f} {:>10.3f} {:>10.2f} {:>12}'.format(
+				r['files'], r['initial'], r['idle'], r['touched'], r['added'], legacy))
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
@@ -18,7 +18,7 @@ ftp.UseFTP = True  # Must be True to use SFTP
 
 # David's Dev S/FTP Server
 ftp.UseSFTP = True  # True = sftp protcol, False = unsecure ftp protcol
-ftp.User = "DAVIDJ-PC\David"
+ftp.User = "DAVIDJ-PC\\David"
 ftp.Password = "***************"
 ftp.Host = "DavidJ-PC"
 ftp.HostFTPPath = 'tagreader'
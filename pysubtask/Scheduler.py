@@ -0,0 +1,158 @@
+#
+# Script: Scheduler.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+import heapq
+import itertools
+import threading
+import time
+
+
+class _Job():
+
+	def __init__(self, name, seconds, target, args, fixed_rate):
+		self.name = name
+		self.seconds = seconds  # None = one shot
+		self.target = target
+		self.args = args
+		self.fixed_rate = fixed_rate
+		self.due = 0
+		self.generation = 0
+		self.cancelled = False
+
+
+class Scheduler():
+	"""A single long-lived thread that runs named periodic jobs and one shot calls, on a monotonic clock.
+
+	fixed_rate=True: runs are due every N secs from the first due time (no drift, late runs are skipped).
+	fixed_rate=False: runs are due N secs after the end of the previous run (fixed delay).
+	"""
+
+	def __init__(self, logger=None, name='Scheduler', daemon=False):
+		self.logger = logger
+		self.name = name
+		self.daemon = daemon
+		self._cond = threading.Condition()
+		self._heap = []  # (due, seq, generation, job)
+		self._jobs = {}
+		self._seq = itertools.count()
+		self._should_continue = False
+		self.thread = None
+
+	def add_job(self, name, seconds, target, fixed_rate=True, first_delay=None, args=()):
+		# Add (or replace) a named periodic job, first run after first_delay (default = seconds)
+		job = _Job(name, seconds, target, args, fixed_rate)
+		with self._cond:
+			old_job = self._jobs.get(name)
+			if old_job:
+				old_job.cancelled = True
+			self._jobs[name] = job
+			self._push(job, time.monotonic() + (seconds if first_delay is None else first_delay))
+		return job
+
+	def remove_job(self, name):
+		with self._cond:
+			job = self._jobs.pop(name, None)
+			if job:
+				job.cancelled = True
+
+	def run_now(self, name):
+		# Run a named job as soon as possible (fixed rate schedule continues from now)
+		with self._cond:
+			job = self._jobs.get(name)
+			if job:
+				self._push(job, time.monotonic())
+
+	def call_at(self, when, target, *args):
+		# One shot call at time.monotonic() based time, returns job (set job.cancelled = True to cancel)
+		job = _Job(None, None, target, args, False)
+		with self._cond:
+			self._push(job, when)
+		return job
+
+	def call_later(self, seconds, target, *args):
+		return self.call_at(time.monotonic() + seconds, target, *args)
+
+	def call_soon(self, target, *args):
+		return self.call_at(time.monotonic(), target, *args)
+
+	def _push(self, job, due):
+		# Re-pushing a job makes its older heap entries stale (lazy deletion)
+		job.generation += 1
+		job.due = due
+		heapq.heappush(self._heap, (due, next(self._seq), job.generation, job))
+		self._cond.notify()
+
+	def start(self):
+		with self._cond:
+			if self._should_continue:
+				return
+			self._should_continue = True
+		self.thread = threading.Thread(target=self._run, name=self.name)
+		self.thread.daemon = self.daemon
+		self.thread.start()
+
+	def stop(self):
+		# No further runs start after stop(), an in progress run is allowed to finish
+		with self._cond:
+			self._should_continue = False
+			self._cond.notify()
+
+	def join(self, timeout=None):
+		if self.thread and self.thread is not threading.current_thread():
+			self.thread.join(timeout)
+
+	@property
+	def is_running(self):
+		return self._should_continue
+
+	def _run(self):
+		while True:
+			entry = self._next_job()
+			if entry is None:
+				return  # stopped
+			job, generation = entry
+
+			try:
+				job.target(*job.args)
+			except Exception as e:
+				if self.logger:
+					self.logger.exception("Scheduler job [{}] failed: [{}]".format(job.name or job.target, e))
+
+			if job.seconds is not None:
+				self._reschedule(job, generation)
+
+	def _next_job(self):
+		# Wait for the next due job, (job, generation) popped from the heap, None if stopped
+		with self._cond:
+			while self._should_continue:
+				if not self._heap:
+					self._cond.wait()
+					continue
+				due, seq, generation, job = self._heap[0]
+				if job.cancelled or generation != job.generation:
+					heapq.heappop(self._heap)
+					continue
+				delay = due - time.monotonic()
+				if delay > 0:
+					self._cond.wait(delay)
+					continue
+				heapq.heappop(self._heap)
+				return job, generation
+		return None
+
+	def _reschedule(self, job, generation):
+		with self._cond:
+			if job.cancelled or generation != job.generation:
+				return  # removed, replaced or run_now() while running
+			now = time.monotonic()
+			if job.fixed_rate:
+				next_due = job.due + job.seconds
+				if next_due <= now:
+					# Late (callback took longer than interval), skip missed runs, stay on the grid
+					missed = int((now - job.due) // job.seconds)
+					next_due = job.due + job.seconds * (missed + 1)
+			else:
+				next_due = now + job.seconds
+			self._push(job, next_due)
@@ -0,0 +1,249 @@
+#
+# Script: pysubtask.aio.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Asyncio runtime mode for BaseSubtask (base.RuntimeMode = 'asyncio').
+#
+# One event loop thread runs detection, snapshot copies and transfers as tasks.
+# Blocking work is offloaded to executors:
+#
+# io executor       = detection (stat / scandir) and snapshot copies
+# transfer executor = extension transfers (ftplib, pysftp, dropbox), one pooled connection per worker
+#
+# Independent watch files transfer in parallel (up to the extension's TransferConcurrency),
+# while notifies for the same file are serialized (a notify during its transfer = one follow-up run).
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _AsyncJob():
+
+	def __init__(self, name, seconds, target, args, fixed_rate, executor):
+		self.name = name
+		self.seconds = seconds
+		self.target = target
+		self.args = args
+		self.fixed_rate = fixed_rate
+		self.executor = executor
+		self.task = None
+		self.wake = None
+
+
+class _AsyncCall():
+	# call_later() handle, cancel() from any thread (Scheduler jobs: set .cancelled = True, also honored)
+
+	def __init__(self, loop, target, args):
+		self.target = target
+		self.args = args
+		self.cancelled = False
+		self.timer = None  # loop TimerHandle, set on the loop thread
+		self._loop = loop
+
+	def cancel(self):
+		self.cancelled = True
+		try:
+			self._loop.call_soon_threadsafe(self._cancel_timer)
+		except RuntimeError:
+			pass  # loop already closed
+
+	def _cancel_timer(self):
+		if self.timer:
+			self.timer.cancel()
+
+
+class AsyncRuntime():
+	"""Scheduler compatible (add_job, call_soon, call_later, run_now, start, stop, join) asyncio runtime."""
+
+	def __init__(self, subtask, transfer_concurrency=1, io_concurrency=2, logger=None, name='AsyncRuntime'):
+		self.subtask = subtask
+		self.logger = logger
+		self.name = name
+		self.transfer_concurrency = max(1, transfer_concurrency)
+		self._io_executor = ThreadPoolExecutor(max(1, io_concurrency))
+		self._transfer_executor = ThreadPoolExecutor(self.transfer_concurrency)
+		self._loop = asyncio.new_event_loop()
+		self._jobs = {}
+		self._notify_tasks = {}  # watch file -> task, at most one per file (see subtask._notify_queue)
+		self._transfer_sem = None
+		self._should_continue = False
+		self.thread = None
+
+	def executor(self, name):
+		if name == 'transfer':
+			return self._transfer_executor
+		return self._io_executor
+
+	##
+	# Scheduler compatible interface (thread-safe)
+	##
+
+	def add_job(self, name, seconds, target, fixed_rate=True, first_delay=None, args=(), executor='io'):
+		job = _AsyncJob(name, seconds, target, args, fixed_rate, executor)
+		self._loop.call_soon_threadsafe(self._add_job, job, seconds if first_delay is None else first_delay)
+		return job
+
+	def remove_job(self, name):
+		self._loop.call_soon_threadsafe(self._remove_job, name)
+
+	def run_now(self, name):
+		def _wake():
+			job = self._jobs.get(name)
+			if job and job.wake:
+				job.wake.set()
+		self._loop.call_soon_threadsafe(_wake)
+
+	def call_soon(self, target, *args):
+		return self.call_later(0, target, *args)
+
+	def call_later(self, seconds, target, *args):
+		# Returns a handle, cancel() it (from any thread) to drop the call
+		call = _AsyncCall(self._loop, target, args)
+		self._loop.call_soon_threadsafe(self._call_later, seconds, call)
+		return call
+
+	def submit_notify(self, wfile):
+		# Hand a notified watch file to the loop (snapshot + transfer task)
+		self._loop.call_soon_threadsafe(self._submit_notify, wfile)
+
+	def start(self):
+		if self._should_continue:
+			return
+		self._should_continue = True
+		self.thread = threading.Thread(target=self._run, name=self.name)
+		self.thread.start()
+
+	def stop(self):
+		# No new runs start after stop(), in progress executor work is allowed to finish
+		if not self._should_continue:
+			return
+		self._should_continue = False
+		try:
+			self._loop.call_soon_threadsafe(self._shutdown)
+		except RuntimeError:
+			pass  # loop already closed
+
+	def join(self, timeout=None):
+		if self.thread and self.thread is not threading.current_thread():
+			self.thread.join(timeout)
+
+	@property
+	def is_running(self):
+		return self._should_continue
+
+	##
+	# Event loop thread
+	##
+
+	def _run(self):
+		asyncio.set_event_loop(self._loop)
+		self._transfer_sem = asyncio.Semaphore(self.transfer_concurrency)
+		try:
+			self._loop.run_forever()
+			# Let cancelled tasks unwind
+			tasks = [task for task in self._tasks() if not task.done()]
+			if tasks:
+				self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+		finally:
+			self._io_executor.shutdown(wait=True)
+			self._transfer_executor.shutdown(wait=True)
+			self._loop.close()
+
+	def _tasks(self):
+		return [task for task in list(self._notify_tasks.values()) + [job.task for job in self._jobs.values()] if task]
+
+	def _shutdown(self):
+		for task in self._tasks():
+			task.cancel()
+		self._loop.stop()
+
+	def _call_later(self, seconds, call):
+		if not call.cancelled:
+			call.timer = self._loop.call_later(seconds, self._run_call, call)
+
+	def _run_call(self, call):
+		if not call.cancelled:
+			self._run_in('io', call.target, *call.args)
+
+	def _add_job(self, job, first_delay):
+		old_job = self._jobs.get(job.name)
+		if old_job and old_job.task:
+			old_job.task.cancel()
+		self._jobs[job.name] = job
+		job.wake = asyncio.Event()
+		job.task = self._loop.create_task(self._periodic(job, first_delay))
+
+	def _remove_job(self, name):
+		job = self._jobs.pop(name, None)
+		if job and job.task:
+			job.task.cancel()
+
+	async def _periodic(self, job, first_delay):
+		loop = self._loop
+		next_due = loop.time() + first_delay
+		while self._should_continue:
+			delay = next_due - loop.time()
+			if delay > 0:
+				try:
+					await asyncio.wait_for(job.wake.wait(), delay)
+				except asyncio.TimeoutError:
+					pass
+				job.wake.clear()
+			if not self._should_continue:
+				return
+			start = loop.time()
+			await self._run_in(job.executor, job.target, *job.args)
+
+			now = loop.time()
+			if job.fixed_rate:
+				next_due = max(next_due, start) + job.seconds
+				if next_due <= now:
+					# Late, skip missed runs, stay on the grid
+					missed = int((now - next_due) // job.seconds)
+					next_due += job.seconds * (missed + 1)
+			else:
+				next_due = now + job.seconds
+
+	def _run_in(self, executor, target, *args):
+		future = self._loop.run_in_executor(self.executor(executor), self._call, target, args)
+		return future
+
+	def _call(self, target, args):
+		try:
+			return target(*args)
+		except Exception as e:
+			if self.logger:
+				self.logger.exception("AsyncRuntime call [{}] failed: [{}]".format(target, e))
+			return None
+
+	def _submit_notify(self, wfile):
+		if not self._should_continue:
+			return
+		# Already queued or in flight = coalesced (in flight: one follow-up run of the latest data when done)
+		if self.subtask._notify_queue.put(wfile):
+			self._notify_tasks[wfile] = self._loop.create_task(self._notify(wfile))
+
+	async def _notify(self, wfile):
+		queue = self.subtask._notify_queue
+		try:
+			while self._should_continue and queue.take(wfile):
+				try:
+					upFile = None
+					if self.subtask._process_budget(wfile):
+						upFile = await self._run_in('io', self.subtask._process_snapshot, wfile)
+					if upFile and self._should_continue:
+						async with self._transfer_sem:
+							await self._run_in(
+								'transfer',
+								self.subtask._process_pooled,
+								self.subtask._process_upload,
+								upFile,
+								wfile)
+				finally:
+					requeued = queue.done(wfile)
+				if not requeued:
+					break
+		finally:
+			self._notify_tasks.pop(wfile, None)
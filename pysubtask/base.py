@@ -12,13 +12,32 @@ import signal
 import subprocess
 import argparse
 from datetime import datetime, date, timedelta
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait as wait_futures
 import time
+import math
 import base64
 import logging
 import socket
+import threading
 
 from . import defaults_config as defaults
-from .InfiniteTimer import InfiniteTimer
+from .Scheduler import Scheduler
+from .aio import AsyncRuntime
+from .pool import ConnectionPool
+from .snapshot import SNAPSHOT_MODES, probe_snapshot_mode, snapshot_file
+from .workqueue import CoalescingQueue
+from .budget import TransferBudget
+from .transform import load_transform, TransformReader
+from .delta import BlockManifest, load_manifest, save_manifest
+from .dedup import UploadCache
+from .journal import UploadJournal, load_journal, journal_key, is_uploaded
+from .state import StateFile
+from .metrics import MetricsRegistry
+from .tracing import Tracer, write_notify_trace, read_notify_trace
+from .profiling import PROFILE_MODES, Profiler, profiled_phase
+from .watch import create_watcher, PollingWatcher
+from .channel import channel_available, NotifySender, NotifyReceiver
 
 ON_WINDOWS = (sys.platform == 'win32')
 CREATE_NEW_PROCESS_GROUP = 0x00000200
@@ -29,8 +48,43 @@ if ON_WINDOWS:
 else:
 	_SIGNAL_STOP_subtask = signal.SIGTERM
 _SIGNAL_STOP_subtask_INTERACTIVELY = signal.SIGINT  # CTRL+C
+_SIGNAL_PROFILE_subtask = getattr(signal, 'SIGUSR1', None)  # Toggle profiling (not on Windows: control file only)
 
 _HeartbeatFudgeFactorSecs = 10  # secs to add to expect val in hb file, for server to allow for transfer
+_DirMtimeGranularitySecs = 2  # secs, worst case dir mtime resolution (i.e.: FAT), to trust an unchanged mtime
+_StopJoinTimeoutSecs = 30  # secs, max wait on stop() for in progress transfers (asyncio runtime, backlog)
+_BacklogProgressSecs = 5  # secs, backlog upload progress log interval
+_HousekeepingProgressSecs = 5  # secs, master background housekeeping progress log interval
+
+# Subtask args for base_config settings, only passed when they differ from the defaults (config_args)
+_BaseConfigArgs = (
+	('DeltaBlockSize', '-dblock'),
+	('TimerIntervalSecs', '-i'),
+	('HeartbeatIntervalSecs', '-hb'),
+	('HeartbeatName', '-hbname'),
+	('WatchBackend', '-watch'),
+	('WatchRescanSecs', '-rescan'),
+	('RuntimeMode', '-runtime'),
+	('SnapshotConcurrency', '-sconc'),
+	('SnapshotMode', '-snapshot'),
+	('TransformWorkers', '-tworkers'),
+	('BudgetTransactions', '-btx'),
+	('BudgetBytes', '-bbytes'),
+	('BudgetWindowSecs', '-bwindow'),
+	('BudgetBurstSecs', '-bburst'),
+	('StateFolder', '-stateto'),
+	('BacklogOrder', '-border'),
+	('MetricsIntervalSecs', '-metrics'),
+	('MetricsFile', '-metricsfile'),
+	('MetricsPort', '-metricsport'),
+	('TraceSampleRate', '-trace'),
+	('TraceFile', '-tracefile'),
+	('ProfileMode', '-profile'))
+# Subtask flags for base_config settings turned off
+_BaseConfigOffFlags = (
+	('TimerFixedRate', '-fixeddelay'),
+	('SnapshotFenceAppendOnly', '-nofence'),
+	('DedupUploads', '-nodedup'))
 
 
 ###################
@@ -51,6 +105,15 @@ class BaseTaskMaster():
 
 		# Fill in non-specified config items with defaults
 		self.base_config = self.combine(pconfig, defaults.base)
+		self._state_folder = self.base_config.StateFolder  # Extensions: their own StateFolder
+		self._residual_journal = None
+		self._residual_live = None  # Background housekeeping: watch files notified instead of copied
+		self._residual_notify = []
+		self._archive_index = {}
+		self._archive_counts = [0, 0]
+		self.housekeeping = None  # Future of start()'s background housekeeping
+		self._housekeeping_cancel = threading.Event()
+		self._housekeeping_progress = None
 
 		self.baselogger = self.setup_logging(
 			__class__.__name__,
@@ -63,6 +126,18 @@ class BaseTaskMaster():
 			self.baselogger.error("No Watch files or dirs specified!")
 			return
 
+		# Optional notify channel (Unix datagram socket), touch() .notify files are the fallback
+		self.init_notify_channel(SubtaskModuleName)
+
+		# Optional sampled notify tracing (spans master notify -> subtask upload)
+		self._tracer = None
+		if self.base_config.TraceSampleRate > 0:
+			self._tracer = Tracer(self.base_config.TraceFile, self.base_config.TraceSampleRate, 'master')
+
+		# Pending (end of burst) data deadlines, one min-heap timer thread, started on first use
+		self._burst_lock = threading.RLock()
+		self._deadline_timer = None
+
 		# Convert WatchFiles list to arguments for subtask
 		self.init_base_args(SubtaskModuleName, LogToConsole)
 
@@ -75,27 +150,33 @@ class BaseTaskMaster():
 		# Create WatchFiles list
 		self._watch_files = []
 		self._watch_files_state = []
+		# Watch files only ever appended to (upload only new bytes since last transfer)
+		self._watch_files_append_only = []
+		# Watch files rewritten in place (upload only changed blocks)
+		self._watch_files_delta = []
+		# Watch files transformed before upload, 'file=transform' (i.e.: compressed)
+		self._watch_files_transform = []
 		# Create WatchDirs list
 		self._watch_dirs = []
 
 		for wfile in WatchFilesDirs:
 			if 'file' in wfile:
 				self._watch_files.append(wfile['file'])
+				if 'appendonly' in wfile and wfile['appendonly']:
+					self._watch_files_append_only.append(wfile['file'])
+				if 'delta' in wfile and wfile['delta']:
+					self._watch_files_delta.append(wfile['file'])
+				if 'transform' in wfile and wfile['transform']:
+					self._watch_files_transform.append('{}={}'.format(wfile['file'], wfile['transform']))
 				wfile_state = {
 					'prev_notify_dt': None,
 					'pending_data_dt': None,
+					'pending_job': None,
 					'burst_mode': None
 				}
 
 				if 'burstmode' in wfile and wfile['burstmode']:
-					wfile_burst_mode = {
-						'start_dt': None,
-						'count': 0,
-						'start_trigger_milli': defaults.burst_mode.start_trigger_milli,
-						'start_trigger_count': defaults.burst_mode.start_trigger_count,
-						'expire_milli': defaults.burst_mode.expire_milli
-					}
-					wfile_state['burst_mode'] = wfile_burst_mode
+					wfile_state['burst_mode'] = self.init_burst_mode(wfile)
 				self._watch_files_state.append(wfile_state)
 
 			elif 'dir' in wfile:
@@ -105,15 +186,57 @@ class BaseTaskMaster():
 			else:
 				self.baselogger.error("Unknown Watch list key [{}]".format(wfile))
 
+		# .notify file names, built once (notify() hot path)
+		self._notify_files = ['{}.notify'.format(wfile) for wfile in self._watch_files]
+
+	def init_burst_mode(self, wfile):
+		# Burst mode state of watch file wfile, from defaults and its per file settings
+		wfile_burst_mode = {
+			'start_dt': None,
+			'count': 0,
+			'start_trigger_milli': defaults.burst_mode.start_trigger_milli,
+			'start_trigger_count': defaults.burst_mode.start_trigger_count,
+			'expire_milli': defaults.burst_mode.expire_milli,
+			'bytes_per_sec': defaults.burst_mode.bytes_per_sec,
+			'max_buffered_bytes': defaults.burst_mode.max_buffered_bytes,
+			'rate_halflife_milli': defaults.burst_mode.rate_halflife_milli,
+			# Byte rate state
+			'rate': 0.0,
+			'last_size': None,
+			'last_sample_dt': None,
+			'notified_size': 0
+		}
+		# Per file settings, i.e.: 'burstmode': {'bytes_per_sec': 65536, 'max_buffered_bytes': 262144}
+		if isinstance(wfile['burstmode'], dict):
+			for key, value in wfile['burstmode'].items():
+				if key in wfile_burst_mode:
+					wfile_burst_mode[key] = value
+				else:
+					self.baselogger.error("Unknown burstmode key [{}] for [{}]".format(key, wfile['file']))
+		return wfile_burst_mode
+
+	def init_notify_channel(self, SubtaskModuleName=__name__):
+		self._notify_sender = None
+		self._notify_channel_path = None
+		if not self.base_config.NotifyChannel:
+			return
+		if not channel_available():
+			self.baselogger.error("Notify channel not available on [{}], using notify files.".format(sys.platform))
+			return
+
+		if len(self._watch_files) > 0:
+			watchFolder = os.path.dirname(self._watch_files[0])
+		else:
+			watchFolder = self._watch_dirs[0]
+		self._notify_channel_path = os.path.join(watchFolder, '.{}.sock'.format(SubtaskModuleName))
+		self._notify_sender = NotifySender(self._notify_channel_path)
+
 	def init_base_args(
 		self,
 		SubtaskModuleName=__name__,
 		LogToConsole=True):
 
 		# Convert WatchFiles list to arguments for subtask
-		wfiles_arg = '"{}"'.format(','.join(map(str, self._watch_files)))
-		wdirs_arg = '"{}"'.format(','.join(map(str, self._watch_dirs)))
-
 		PythonName = sys.executable
 
 		# Add specific args for base SubProc
@@ -122,19 +245,21 @@ class BaseTaskMaster():
 			'-m',
 			SubtaskModuleName
 		]
-		if len(self._watch_files) > 0:
-			self._subtaskArgs += ['-wf', wfiles_arg]
-		if len(self._watch_dirs) > 0:
-			self._subtaskArgs += ['-wd', wdirs_arg]
+		watch_lists = (
+			('-wf', self._watch_files),
+			('-wd', self._watch_dirs),
+			('-wfa', self._watch_files_append_only),
+			('-wfdelta', self._watch_files_delta),
+			('-wft', self._watch_files_transform))
+		for arg, watch_list in watch_lists:
+			if len(watch_list) > 0:
+				self._subtaskArgs += [arg, '"{}"'.format(','.join(map(str, watch_list)))]
+		if self._notify_channel_path:
+			self._subtaskArgs += ['-sock', self._notify_channel_path]
 		if not LogToConsole:
 			self._subtaskArgs += ['-noconsole']
 		# Only add these args if they differ from default config
-		if self.base_config.TimerIntervalSecs != defaults.base.TimerIntervalSecs:
-			self._subtaskArgs += ['-i', str(self.base_config.TimerIntervalSecs)]
-		if self.base_config.HeartbeatIntervalSecs != defaults.base.HeartbeatIntervalSecs:
-			self._subtaskArgs += ['-hb', str(self.base_config.HeartbeatIntervalSecs)]
-		if self.base_config.HeartbeatName != defaults.base.HeartbeatName:
-			self._subtaskArgs += ['-hbname', str(self.base_config.HeartbeatName)]
+		self._subtaskArgs += config_args(self.base_config, defaults.base, _BaseConfigArgs, _BaseConfigOffFlags)
 
 	def combine(self, master_dict, add_this_dict):
 		new_dict = master_dict
@@ -143,16 +268,81 @@ class BaseTaskMaster():
 				new_dict.__dict__[key] = value
 		return new_dict
 
-	def start(self, prearchive_expired_files_to_folder=None, precopy_files_to_folder=None):
+	def start(self, prearchive_expired_files_to_folder=None, precopy_files_to_folder=None, housekeeping_done=None):
+		# Returns the housekeeping Future (background housekeeping), else None.
+		# housekeeping_done(future) is called when background housekeeping completes
 		self.cleanup_all_notify_files()
+		self._housekeeping_cancel.clear()
 		if prearchive_expired_files_to_folder:
-			# First, prearchive expired files (all files types in log dir)
+			# First, prearchive expired files (all files types in log dir),
+			# before the subtask's first scan could upload them
 			self.archive_expired_files(prearchive_expired_files_to_folder)
+		if self.base_config.HousekeepingBackground and precopy_files_to_folder:
+			# Subtask starts uploading fresh data now, residual pre-copy continues in the background
+			self.baselogger.info('START!')
+			self.spawn_subtask()
+			executor = ThreadPoolExecutor(1, thread_name_prefix='Housekeeping')
+			self.housekeeping = executor.submit(self.housekeeping_run, precopy_files_to_folder)
+			executor.shutdown(wait=False)
+			if housekeeping_done:
+				self.housekeeping.add_done_callback(housekeeping_done)
+			return self.housekeeping
+
 		if precopy_files_to_folder:
 			# Second, precopy old / residual data files types (for preupload, etc.)
 			self.copy_residual_files(precopy_files_to_folder)
 		self.baselogger.info('START!')
 		self.spawn_subtask()
+		return None
+
+	def housekeeping_run(self, copyToFolder):
+		# Background start() housekeeping (low priority thread): pre-copy residual files,
+		# then notify the subtask to upload them. Returns the progress counts
+		lower_thread_priority()
+		self._housekeeping_progress = {
+			'copied': 0,
+			'start': time.monotonic(),
+			'logged': time.monotonic()}
+		try:
+			# Live watch files: notified (uploaded by the subtask), a copy could race its snapshots
+			self._residual_live = set(os.path.normpath(wfile) for wfile in self._watch_files)
+			self._residual_notify = []
+			self.copy_residual_files(copyToFolder)
+			if not self._housekeeping_cancel.is_set():
+				self.notify_backlog()
+				for notify_index, wfile in enumerate(self._watch_files):
+					if os.path.normpath(wfile) in self._residual_notify:
+						self.notify_file_by_index(notify_index, True)
+		except Exception as e:
+			self.baselogger.exception("Housekeeping: FAILED [{}]".format(e))
+			raise
+		finally:
+			self._residual_live = None
+			progress, self._housekeeping_progress = self._housekeeping_progress, None
+		self.baselogger.info("Housekeeping: DONE{} [{}] residual files copied in [{:.1f}] secs.".format(
+			' (stopped)' if self._housekeeping_cancel.is_set() else '',
+			progress['copied'],
+			time.monotonic() - progress['start']))
+		return {'copied': progress['copied']}
+
+	def housekeeping_step(self, key):
+		# Count one background housekeeping file, logging progress
+		progress = self._housekeeping_progress
+		if progress is None:
+			return
+		progress[key] += 1
+		now = time.monotonic()
+		if now - progress['logged'] >= _HousekeepingProgressSecs:
+			progress['logged'] = now
+			self.baselogger.info("Housekeeping: [{}] residual files copied...".format(progress['copied']))
+
+	def notify_backlog(self):
+		# Tell the subtask new residual (backlog) files are ready to upload
+		filename = self.state_filename('backlog.notify')
+		if not filename:
+			return
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		touch(filename)
 
 	def reset(self):
 		self.baselogger.info("RESET: BaseTaskMaster and BaseSubtask (Timer)!")
@@ -172,6 +362,10 @@ class BaseTaskMaster():
 			self._subtask.pid))
 
 	def stop(self, subtaskDescription=defaults.base.SubtaskDescription, forcekill=True):
+		if self.housekeeping and not self.housekeeping.done():
+			# Stops after the file in progress
+			self._housekeeping_cancel.set()
+			wait_futures([self.housekeeping], _StopJoinTimeoutSecs)
 		if self._subtask:
 			self.baselogger.info("STOP!: BaseTaskMaster attempting to stop BaseSubtask [{}]...".format(
 				self._subtask.pid))
@@ -187,6 +381,14 @@ class BaseTaskMaster():
 				else:
 					self._subtask.terminate()
 					self._subtask.wait()
+		if self._deadline_timer:
+			self._deadline_timer.stop()
+			self._deadline_timer = None
+		if self._notify_sender:
+			self._notify_sender.close()
+			self._notify_sender = None
+		if self._tracer:
+			self._tracer.close()
 		self.cleanup_all_notify_files()
 		self.baselogger.info("***** GOODBYE!: [{}] *****".format(subtaskDescription))
 
@@ -230,7 +432,11 @@ class BaseTaskMaster():
 	def copy_residual_files(self, relativeToFolder):
 		# Copy all files in watch list with same .ext to specified folder (i.e.: BakTo folder).
 		# Typically used to grab missed / residual data before start()
+		# Files the subtask's upload journal records as uploaded (same size + mtime) are skipped
 		residual_files_found = False
+		fullToFolder = None
+		self._residual_journal = load_journal(self.journal_filename())
+		self._residual_skipped = 0
 		if self._watch_files and len(self._watch_files) > 0:
 			watchFolder = os.path.dirname(self._watch_files[0])
 			if os.path.exists(watchFolder):
@@ -262,8 +468,28 @@ class BaseTaskMaster():
 				fextensions = ['*']
 				residual_files_found = self.copy_file_types_from_to(fextensions, watchFolder, fullToFolder)
 
+		if self._residual_skipped > 0:
+			self.baselogger.info("Residual: [{}] files already uploaded per journal, not copied.".format(
+				self._residual_skipped))
 		if not residual_files_found:
 			self.baselogger.info("No Residual files found to Copy")
+		self._residual_journal = None
+
+	def journal_filename(self):
+		# Subtask upload journal
+		return self.state_filename('journal.jsonl')
+
+	def state_filename(self, name):
+		# File in the subtask's state folder (relative to the first watch file folder)
+		if not self._state_folder:
+			return None
+		return os.path.join(self.watch_root(), self._state_folder, name)
+
+	def watch_root(self):
+		# First watch file folder (else first watch dir): subtask folders, journal keys
+		if len(self._watch_files) > 0:
+			return os.path.dirname(self._watch_files[0])
+		return self._watch_dirs[0]
 
 	def copy_file_types_from_to(self, fextensions, fromFolder, toFolder):
 		found_file = False
@@ -276,8 +502,10 @@ class BaseTaskMaster():
 	def archive_expired_files(self, relativeToFolder):
 		# Archive all expired files in first listed file path,
 		# to specified folder (i.e.: logs/archive folder).
-		arch_files_found = False
 		fullToFolder = None
+		self._archive_index = {}  # archive dir -> taken names, rebuilt each run
+		self._archive_counts = [0, 0]  # renamed, copied (one summary line per run)
+		start = time.monotonic()
 		if self._watch_files and len(self._watch_files) > 0:
 			watchFolder = os.path.dirname(self._watch_files[0])
 			if os.path.exists(watchFolder):
@@ -285,7 +513,7 @@ class BaseTaskMaster():
 				self.baselogger.info("Archiving expired files from [{}] to [{}]".format(
 					watchFolder,
 					fullToFolder))
-				arch_files_found = self.archive_from_to(watchFolder, fullToFolder)
+				self.archive_from_to(watchFolder, fullToFolder)
 
 		# Archive all expired files in each listed watch directory,
 		# to specified folder (i.e.: logs/archive folder).
@@ -298,90 +526,197 @@ class BaseTaskMaster():
 				self.baselogger.info("Archiving expired files from Watch directory [{}] to [{}]".format(
 					watchFolder,
 					fullToFolder))
-				arch_files_found = self.archive_from_to(watchFolder, fullToFolder)
+				self.archive_from_to(watchFolder, fullToFolder)
 
-		if not arch_files_found:
+		renamed, copied = self._archive_counts
+		if renamed + copied == 0:
 			self.baselogger.info("No expired files found to Archive")
+		else:
+			self.baselogger.info("Archived [{}] files ([{}] renamed, [{}] copied) to [{}] in [{:.3f}] secs".format(
+				renamed + copied, renamed, copied, fullToFolder, time.monotonic() - start))
 
 	def archive_from_to(self, fromFolder, toFolder):
 		days_old = defaults.base.ArchiveAfterDaysOld
 		move_date = date.today() - timedelta(days=days_old)
 		move_date = time.mktime(move_date.timetuple())
 
-		arch_files_found = False
-
-		for file in os.listdir(fromFolder):
-			fullfile = os.path.join(fromFolder, file)
-			if os.path.isfile(fullfile):
-				filetime = os.stat(fullfile).st_mtime
-				if filetime < move_date:
-					arch_files_found = True
-
-					# Build archive path and file name
-					fdate = datetime.fromtimestamp(filetime)
-					archpath = '{}{:02d}'.format(fdate.year, fdate.month)
-					archpath = os.path.join(archpath, '{:02d}'.format(fdate.day))
-					archpath = os.path.join(toFolder, archpath)
-					archfullfile = os.path.join(archpath, file)
-					if not os.path.exists(archpath):
-						os.makedirs(archpath)
-					else:
-						archfullfile = self.getAvailableFileName(archfullfile)
-
-					# Archive file
-					self.baselogger.info("Archiving [{}]".format(archfullfile))
-					shutil.copy2(fullfile, archfullfile)
-					os.remove(fullfile)
-
-		return arch_files_found
-
-	def getAvailableFileName(self, pfname):
-		if os.path.exists(pfname):
-			filename, file_extension = os.path.splitext(pfname)
-			i = 1
-			while True:
-				nfname = "{}_{}{}".format(filename, i, file_extension)
-				if not os.path.exists(nfname):
-					return nfname
+		# One scandir (cached stat), grouped per archive dir. Counts into _archive_counts
+		batches = {}
+		with os.scandir(fromFolder) as it:
+			for entry in it:
+				if not entry.is_file():
+					continue
+				stat = entry.stat()
+				if stat.st_mtime < move_date:
+					# Build archive path: [file-year][month]/[day_of_month]
+					fdate = datetime.fromtimestamp(stat.st_mtime)
+					archpath = os.path.join(
+						toFolder,
+						'{}{:02d}'.format(fdate.year, fdate.month),
+						'{:02d}'.format(fdate.day))
+					batches.setdefault(archpath, []).append((entry, stat))
+		counts = self._archive_counts
+		for archpath, entries in batches.items():
+			if not os.path.exists(archpath):
+				os.makedirs(archpath)
+			archdev = os.stat(archpath).st_dev
+			for entry, stat in entries:
+				if self._housekeeping_cancel.is_set():
+					break
+				archfullfile = self.archive_file_name(archpath, entry.name)
+				# Archive file: rename on the same filesystem, else copy + remove (no per file log)
+				if stat.st_dev == archdev:
+					os.rename(entry.path, archfullfile)
+					counts[0] += 1
+				else:
+					shutil.copy2(entry.path, archfullfile)
+					os.remove(entry.path)
+					counts[1] += 1
+
+	def archive_file_name(self, archpath, name):
+		# Free name in archpath for name (name, name_1, name_2, ...), via the taken names index
+		index = self._archive_index.get(archpath)
+		if index is None:
+			index = self._archive_index[archpath] = {'names': set(os.listdir(archpath)), 'next': {}}
+		taken = index['names']
+		if name in taken:
+			filename, file_extension = os.path.splitext(name)
+			i = index['next'].get(name, 1)
+			while "{}_{}{}".format(filename, i, file_extension) in taken:
 				i += 1
-		else:
-			return pfname
+			index['next'][name] = i + 1
+			name = "{}_{}{}".format(filename, i, file_extension)
+		taken.add(name)
+		return os.path.join(archpath, name)
 
 	def copy_pattern_from_to(self, fpattern, source_dir, dest_dir):
 		found_file = False
 		if not os.path.exists(dest_dir):
 			os.makedirs(dest_dir)
 
+		journal = self._residual_journal
 		files = glob.iglob(os.path.join(source_dir, fpattern))
 		for file in files:
+			if self._housekeeping_cancel.is_set():
+				break
 			if os.path.isfile(file):
+				if journal and self.journal_uploaded(journal, file, dest_dir):
+					self._residual_skipped += 1
+					continue
 				found_file = True
+				if self._residual_live and os.path.normpath(file) in self._residual_live:
+					self._residual_notify.append(os.path.normpath(file))
+					continue
 				shutil.copy2(file, dest_dir)
+				self.housekeeping_step('copied')
 
 		return found_file
 
+	def journal_uploaded(self, journal, file, dest_dir):
+		# file's current content uploaded per the journal, as itself (live snapshot) or
+		# as its earlier residual copy in dest_dir (backlog upload)
+		stat = os.stat(file)
+		root = self.watch_root()
+		if is_uploaded(journal.get(journal_key(file, root)), stat):
+			return True
+		copied = os.path.join(dest_dir, os.path.basename(file))
+		return is_uploaded(journal.get(journal_key(copied, root)), stat)
+
 	def notify_all_files(self):
 		for notify_index, wfile in enumerate(self._watch_files):
 			self.notify_file_by_index(notify_index, True)
 
-	def notify_file_by_index(self, notify_index, ignore_burst_mode=False):
+	def notify_file_by_index(self, notify_index, ignore_burst_mode=False, offset=-1):
+		# offset: optional write offset (data file size) passed to the subtask over the notify channel
 		if notify_index < 0 or notify_index >= len(self._watch_files):
 			self.baselogger.error("Notify file index [{}] out of range!".format(notify_index))
 			return
 
-		wfile = self._watch_files[notify_index]
 		wfile_state = self._watch_files_state[notify_index]
+		if self._tracer and 'trace' not in wfile_state and self._tracer.sampled():
+			# Traced from here (incl. burst buffering) to its upload: (trace id, start)
+			wfile_state['trace'] = (self._tracer.new_id(), time.time())
 
-		curr_notify_dt = datetime.now()
 		if not ignore_burst_mode and wfile_state['burst_mode']:
-			wfile_state['pending_data_dt'] = self.notify_file_by_index_burst_mode(notify_index)
+			with self._burst_lock:
+				curr_notify_dt = datetime.now()
+				if wfile_state['burst_mode']['bytes_per_sec'] > 0:
+					pending_data_dt = self.notify_file_by_index_byte_burst_mode(notify_index, offset, curr_notify_dt)
+				else:
+					pending_data_dt = self.notify_file_by_index_burst_mode(notify_index, curr_notify_dt)
+				self.set_pending_data_dt(notify_index, pending_data_dt)
+				wfile_state['prev_notify_dt'] = curr_notify_dt
 		else:
-			notify_file(wfile)
-		wfile_state['prev_notify_dt'] = curr_notify_dt
+			self.notify(notify_index, offset)
+			if wfile_state['burst_mode']:
+				# Only burst mode uses the notify times
+				wfile_state['prev_notify_dt'] = datetime.now()
 
-	def notify_file_by_index_burst_mode(self, notify_index):
-		curr_notify_dt = datetime.now()
-		wfile = self._watch_files[notify_index]
+	def set_pending_data_dt(self, notify_index, pending_data_dt):
+		# Schedule (or cancel) the automatic flush of pending data at its deadline, O(log n) per change
+		wfile_state = self._watch_files_state[notify_index]
+		if pending_data_dt == wfile_state['pending_data_dt']:
+			return
+		wfile_state['pending_data_dt'] = pending_data_dt
+		pending_job = wfile_state['pending_job']
+		if pending_job:
+			pending_job.cancelled = True  # lazy deletion from the heap
+			wfile_state['pending_job'] = None
+		if not pending_data_dt or not defaults.burst_mode.auto_flush:
+			return
+
+		if not self._deadline_timer:
+			# Daemon, pending data at exit is left to the next start's residual upload
+			self._deadline_timer = Scheduler(self.baselogger, 'BurstDeadlines', daemon=True)
+			self._deadline_timer.start()
+		delay = (pending_data_dt - datetime.now()).total_seconds()
+		wfile_state['pending_job'] = self._deadline_timer.call_later(max(0, delay), self._flush_pending, notify_index)
+
+	def _flush_pending(self, notify_index):
+		# Deadline timer thread: pending data expired
+		with self._burst_lock:
+			wfile_state = self._watch_files_state[notify_index]
+			if not wfile_state['pending_data_dt'] or wfile_state['pending_data_dt'] > datetime.now():
+				return
+			self.baselogger.info('Pending data deadline expired. Notifying!')
+			self.flush_pending(notify_index)
+
+	def flush_pending(self, notify_index):
+		wfile_state = self._watch_files_state[notify_index]
+		if wfile_state['burst_mode'] and wfile_state['burst_mode']['bytes_per_sec'] > 0:
+			self.burst_release(notify_index)
+		else:
+			self.notify(notify_index)
+		self.set_pending_data_dt(notify_index, None)  # Clear pending flag
+
+	def notify(self, notify_index, offset=-1):
+		# Notify over the channel if enabled (never blocks), else / on failure touch the .notify file
+		if self._tracer:
+			self.notify_traced(notify_index, offset)
+			return
+		if self._notify_sender and self._notify_sender.send(notify_index, offset):
+			return
+		touch_notify(self._notify_files[notify_index])
+
+	def notify_traced(self, notify_index, offset=-1):
+		# notify(), passing the trace id of a sampled notify (channel message, else .notify file content)
+		trace = self._watch_files_state[notify_index].pop('trace', None)
+		trace_id = trace[0] if trace else 0
+		if self._notify_sender and self._notify_sender.send(notify_index, offset, trace_id=trace_id):
+			via = 'channel'
+		elif trace_id:
+			write_notify_trace(self._notify_files[notify_index], trace_id)
+			via = 'file'
+		else:
+			touch_notify(self._notify_files[notify_index])
+		if trace:
+			self._tracer.record(
+				'master.notify', trace_id, trace[1], time.time(),
+				file=os.path.basename(self._watch_files[notify_index]), via=via)
+
+	def notify_file_by_index_burst_mode(self, notify_index, curr_notify_dt=None):
+		if curr_notify_dt is None:
+			curr_notify_dt = datetime.now()
 		wfile_state = self._watch_files_state[notify_index]
 		burst_mode = wfile_state['burst_mode']
 
@@ -408,7 +743,7 @@ class BaseTaskMaster():
 					# Y: Burst buffer expired. Time to release it / notify.
 					self.baselogger.info("Burst (previous) expired. Notifying! [{}]".format(
 						burst_expire_milli))
-					notify_file(wfile)
+					self.notify(notify_index)
 					burst_mode['start_dt'] = None
 					burst_mode['count'] = 0
 				else:
@@ -424,7 +759,7 @@ class BaseTaskMaster():
 						# N: Release it / notify it.
 						self.baselogger.info("Burst (existing) ended. Notifying! [{}] elapsed.".format(
 							notify_delta_milli))
-						notify_file(wfile)
+						self.notify(notify_index)
 						burst_mode['start_dt'] = None
 						burst_mode['count'] = 0
 			else:
@@ -439,8 +774,9 @@ class BaseTaskMaster():
 						return_pending_dt =	\
 							prev_notify_dt + \
 							timedelta(milliseconds=burst_start_trigger_milli)
-						self.baselogger.info("Burst detected *BUT* waiting for [{}] in a row.".format(
-							burst_start_trigger_count))
+						if defaults.burst_mode.log_notifies:
+							self.baselogger.info("Burst detected *BUT* waiting for [{}] in a row.".format(
+								burst_start_trigger_count))
 					else:
 						# Y: Detected a Burst! Start a new Burst window.
 						# Return regular Burst expiration time
@@ -452,28 +788,96 @@ class BaseTaskMaster():
 					burst_mode['count'] += 1
 				else:
 					# N: Data coming in slow enough... just release it / notify immediately.
-					self.baselogger.info("Regular rate (not a Burst). Notifying! [{}]".format(
-						notify_delta_milli))
-					notify_file(wfile)
+					if defaults.burst_mode.log_notifies:
+						self.baselogger.info("Regular rate (not a Burst). Notifying! [{}]".format(
+							notify_delta_milli))
+					self.notify(notify_index)
 					burst_mode['count'] = 0
 		else:
 			self.baselogger.info("Initial notify (Burst mode)")
-			notify_file(wfile)
+			self.notify(notify_index)
 
 		return return_pending_dt
 
+	def notify_file_by_index_byte_burst_mode(self, notify_index, offset=-1, curr_notify_dt=None):
+		# Burst = data file growing faster than bytes_per_sec (EWMA of its growth rate).
+		# While bursting, hold notifies until max_buffered_bytes are unnotified or expire_milli elapsed.
+		if curr_notify_dt is None:
+			curr_notify_dt = datetime.now()
+		burst_mode = self._watch_files_state[notify_index]['burst_mode']
+
+		if offset >= 0:
+			size = offset
+		else:
+			try:
+				size = os.stat(self._watch_files[notify_index]).st_size
+			except OSError:
+				size = 0
+
+		last_size = burst_mode['last_size']
+		last_sample_dt = burst_mode['last_sample_dt']
+		burst_mode['last_size'] = size
+		burst_mode['last_sample_dt'] = curr_notify_dt
+
+		if last_size is None or size < last_size:
+			# Initial notify, or file shrunk (rotated / rewritten)
+			self.baselogger.info("Initial notify or data file reset (Burst mode)")
+			burst_mode['rate'] = 0.0
+			self.burst_release(notify_index, size, offset)
+			return None
+
+		# Irregularly sampled EWMA: weight of the new sample grows with the time since the last one
+		elapsed_secs = max(timedelta_milliseconds(curr_notify_dt - last_sample_dt), 1) / 1000.0
+		alpha = 1.0 - math.exp(-elapsed_secs * math.log(2) / (burst_mode['rate_halflife_milli'] / 1000.0))
+		burst_mode['rate'] += alpha * ((size - last_size) / elapsed_secs - burst_mode['rate'])
+
+		buffered = size - burst_mode['notified_size']
+		if burst_mode['rate'] < burst_mode['bytes_per_sec']:
+			if burst_mode['start_dt']:
+				self.baselogger.info("Burst ended. Notifying! [{:.0f}] bytes/sec.".format(burst_mode['rate']))
+			self.burst_release(notify_index, size, offset)
+			return None
+
+		if not burst_mode['start_dt']:
+			self.baselogger.info("Burst detected. Starting Burst mode! [{:.0f}] bytes/sec.".format(burst_mode['rate']))
+			burst_mode['start_dt'] = curr_notify_dt
+
+		expire_dt = burst_mode['start_dt'] + timedelta(milliseconds=burst_mode['expire_milli'])
+		if buffered >= burst_mode['max_buffered_bytes'] or curr_notify_dt >= expire_dt:
+			self.baselogger.info("Burst buffer full or expired. Notifying! [{}] bytes buffered.".format(buffered))
+			self.burst_release(notify_index, size, offset)
+			# Still bursting, next window starts now
+			burst_mode['start_dt'] = curr_notify_dt
+			return curr_notify_dt + timedelta(milliseconds=burst_mode['expire_milli'])
+
+		burst_mode['count'] += 1
+		return expire_dt
+
+	def burst_release(self, notify_index, size=None, offset=-1):
+		# Notify (byte rate burst mode), everything up to size is no longer buffered
+		burst_mode = self._watch_files_state[notify_index]['burst_mode']
+		self.notify(notify_index, offset)
+		if size is None:
+			try:
+				size = os.stat(self._watch_files[notify_index]).st_size
+			except OSError:
+				size = 0
+		burst_mode['notified_size'] = size
+		burst_mode['start_dt'] = None
+		burst_mode['count'] = 0
+
 	def check_pending_notifications(self):
 		# Check for pending data from ending on a Burst
+		# (not needed with burst_mode.auto_flush, pending data is notified at its deadline)
 		now_dt = datetime.now()
-		for notify_index, wfile in enumerate(self._watch_files):
-			wfile_state = self._watch_files_state[notify_index]
+		for notify_index, wfile_state in enumerate(self._watch_files_state):
 			pending_data_dt = wfile_state['pending_data_dt']
 			if pending_data_dt:
 				if pending_data_dt <= now_dt:
 					self.baselogger.info('Pending AND expired data detected. Notifying!')
-					notify_file(wfile)
-					wfile_state['pending_data_dt'] = None  # Clear pending flag
-				else:
+					with self._burst_lock:
+						self.flush_pending(notify_index)
+				elif defaults.burst_mode.log_notifies:
 					self.baselogger.info('Pending data detected. *BUT*, has NOT expired yet. [{}] secs to go.'.format(
 						pending_data_dt - now_dt))
 			else:
@@ -515,10 +919,37 @@ class BaseSubtask():
 
 		self.init_subtask_args(args)
 		self.init_subtask_files()
+		self.init_metrics()
+		self.init_tracing()
+		self.init_profiling(LogFileName)
 
 		self._Timer = None
 		self._SubtaskStopNow = False
+		self._stopped = threading.Event()
 		self._IgnoreTimer = False
+		self._process_lock = threading.RLock()
+		self._notify_queue = CoalescingQueue()  # Detected changes waiting for (or in) transfer
+
+		# Extension connections, primary slot unless a pooled slot is bound to the current thread
+		self._primary_conns = {}
+		self._bound_conns = {}
+		self._conn_pool = None
+
+		# Residual backlog upload (see start_backlog)
+		self._backlog_lock = threading.Lock()
+		self._backlog_thread = None
+		self._backlog_superseded = set()  # names notified live while the backlog drains
+		self._backlog_progress = None
+		self._upload_locks = {}  # name -> Lock, one upload of a name at a time (live vs backlog)
+
+		self._watcher = PollingWatcher(None)
+		self._watch_rescan_needed = True
+		self._last_rescan_time = 0
+
+		self._notify_receiver = None
+		self._notify_channel_lock = threading.Lock()
+		self._notify_channel_pending = {}
+		self._notify_offsets = {}  # Latest write offset per watch file, received over the notify channel
 
 		self._last_notify_dt = datetime.now()  # Start of app is first notify dt
 		self._last_heartbeat_dt = datetime.now()
@@ -531,6 +962,12 @@ class BaseSubtask():
 			_SIGNAL_STOP_subtask_INTERACTIVELY,
 			lambda signal_number, current_stack_frame: self.stop())
 
+		if _SIGNAL_PROFILE_subtask:
+			# Only flagged here, toggled by the profile job (cProfile: on the scheduler thread)
+			signal.signal(
+				_SIGNAL_PROFILE_subtask,
+				lambda signal_number, current_stack_frame: setattr(self, '_profile_toggle', True))
+
 	def __del__(self):
 		self.stop()
 
@@ -549,6 +986,47 @@ class BaseSubtask():
 			dest='watch_dirs',
 			help='Delimited list of directories to watch all of the files inside and upload on notify')
 
+		parser.add_argument(
+			'-wfa', '--watch-append-only-list',
+			dest='watch_files_append_only',
+			help='Delimited list of watch files that are only appended to (upload only new bytes)')
+
+		parser.add_argument(
+			'-nodedup', '--no-dedup-uploads',
+			dest='no_dedup_uploads',
+			action='store_true',
+			help='Upload unchanged content again (no upload cache)')
+
+		parser.add_argument(
+			'-wfdelta', '--watch-delta-list',
+			dest='watch_files_delta',
+			help='Delimited list of watch files rewritten in place (upload only changed blocks)')
+
+		parser.add_argument(
+			'-dblock', '--delta-block-size',
+			dest='delta_block_size',
+			default=defaults.base.DeltaBlockSize,
+			type=int,
+			help='Block size of delta watch files manifests')
+
+		parser.add_argument(
+			'-wft', '--watch-transform-list',
+			dest='watch_files_transform',
+			help="Delimited list of 'file=transform' watch files transformed before upload (i.e.: gzip)")
+
+		parser.add_argument(
+			'-tworkers', '--transform-workers',
+			dest='transform_workers',
+			default=defaults.base.TransformWorkers,
+			type=int,
+			help='Process pool workers for transforms, 0 = transform in the upload thread')
+
+		parser.add_argument(
+			'-sock', '--notify-channel',
+			dest='notify_channel',
+			default=None,
+			help='Unix datagram socket path to receive notifies on (in addition to .notify files)')
+
 		parser.add_argument(
 			'-i', '--interval-secs',
 			dest='interval_secs',
@@ -556,12 +1034,156 @@ class BaseSubtask():
 			type=int,
 			help='Timer interval in seconds')
 
+		parser.add_argument(
+			'-fixeddelay', '--timer-fixed-delay',
+			dest='timer_fixed_delay',
+			action='store_true',
+			default=False,
+			help='Timer interval measured from the end of each run, else (if not included) fixed rate')
+
+		parser.add_argument(
+			'-watch', '--watch-backend',
+			dest='watch_backend',
+			default=defaults.base.WatchBackend,
+			choices=['poll', 'inotify', 'auto'],
+			help='Change detection: poll (portable), inotify (Linux, event driven) or auto')
+
+		parser.add_argument(
+			'-rescan', '--watch-rescan-secs',
+			dest='watch_rescan_secs',
+			default=defaults.base.WatchRescanSecs,
+			type=int,
+			help='Safety full rescan interval in seconds for event driven watch backends')
+
+		parser.add_argument(
+			'-runtime', '--runtime-mode',
+			dest='runtime_mode',
+			default=defaults.base.RuntimeMode,
+			choices=['thread', 'asyncio'],
+			help='Runtime: thread (one scheduler thread) or asyncio (concurrent transfers)')
+
+		parser.add_argument(
+			'-tconc', '--transfer-concurrency',
+			dest='transfer_concurrency',
+			default=defaults.base.TransferConcurrency,
+			type=int,
+			help='Max concurrent transfers (connections) in asyncio runtime mode')
+
+		parser.add_argument(
+			'-sconc', '--snapshot-concurrency',
+			dest='snapshot_concurrency',
+			default=defaults.base.SnapshotConcurrency,
+			type=int,
+			help='Max concurrent detection / snapshot copy workers in asyncio runtime mode')
+
+		parser.add_argument(
+			'-btx', '--budget-transactions',
+			dest='budget_transactions',
+			default=defaults.base.BudgetTransactions,
+			type=int,
+			help='Max uploads per budget window, 0 = unlimited')
+
+		parser.add_argument(
+			'-bbytes', '--budget-bytes',
+			dest='budget_bytes',
+			default=defaults.base.BudgetBytes,
+			type=int,
+			help='Max bytes uploaded per budget window, 0 = unlimited')
+
+		parser.add_argument(
+			'-bwindow', '--budget-window-secs',
+			dest='budget_window_secs',
+			default=defaults.base.BudgetWindowSecs,
+			type=int,
+			help='Budget window in seconds, budget is spent evenly across it')
+
+		parser.add_argument(
+			'-bburst', '--budget-burst-secs',
+			dest='budget_burst_secs',
+			default=defaults.base.BudgetBurstSecs,
+			type=int,
+			help='Max budget available at once, in seconds worth of budget')
+
+		parser.add_argument(
+			'-border', '--backlog-order',
+			dest='backlog_order',
+			default=defaults.base.BacklogOrder,
+			choices=['newest', 'oldest'],
+			help='Residual backlog upload order: newest or oldest (modified) files first')
+
+		parser.add_argument(
+			'-bconn', '--backlog-connections',
+			dest='backlog_connections',
+			default=defaults.base.BacklogConnections,
+			type=int,
+			help='Background connections uploading the residual backlog, 0 = upload backlog before starting')
+
 		parser.add_argument(
 			'-bakto', '--bak-to-folder',
 			dest='bak_to_folder',
 			default=defaults.base.BakToFolder,
 			help='Folder where to stage a copy of notified files to')
 
+		parser.add_argument(
+			'-snapshot', '--snapshot-mode',
+			dest='snapshot_mode',
+			default=defaults.base.SnapshotMode,
+			choices=('auto',) + SNAPSHOT_MODES,
+			help='How to copy notified files to the bakTo folder, auto = probe the filesystem')
+
+		parser.add_argument(
+			'-nofence', '--no-snapshot-fence',
+			dest='no_snapshot_fence',
+			action='store_true',
+			default=False,
+			help='If specified, append-only files are copied too, else uploaded length-fenced from the live file')
+
+		parser.add_argument(
+			'-stateto', '--state-to-folder',
+			dest='state_to_folder',
+			default=defaults.base.StateFolder,
+			help='Folder where to persist upload state (i.e.: append offsets) to')
+
+		parser.add_argument(
+			'-metrics', '--metrics-interval-secs',
+			dest='metrics_interval_secs',
+			default=defaults.base.MetricsIntervalSecs,
+			type=int,
+			help='Write metrics (Prometheus text) every N secs, 0 = no metrics export')
+
+		parser.add_argument(
+			'-metricsfile', '--metrics-file',
+			dest='metrics_file',
+			default=defaults.base.MetricsFile,
+			help='Metrics file, relative to the state folder')
+
+		parser.add_argument(
+			'-metricsport', '--metrics-port',
+			dest='metrics_port',
+			default=defaults.base.MetricsPort,
+			type=int,
+			help='Also serve metrics on http://127.0.0.1:port/metrics, 0 = no HTTP endpoint')
+
+		parser.add_argument(
+			'-trace', '--trace-sample-rate',
+			dest='trace_sample_rate',
+			default=defaults.base.TraceSampleRate,
+			type=float,
+			help='Trace the spans of sampled notifies (set by the master), 0 = no tracing')
+
+		parser.add_argument(
+			'-tracefile', '--trace-file',
+			dest='trace_file',
+			default=defaults.base.TraceFile,
+			help='Chrome trace event file, shared with the master')
+
+		parser.add_argument(
+			'-profile', '--profile-mode',
+			dest='profile_mode',
+			default=defaults.base.ProfileMode,
+			choices=PROFILE_MODES,
+			help='On demand profiling (SIGUSR1 / control file): cprofile (scheduler thread) or sample (all threads)')
+
 		parser.add_argument(
 			'-hb', '--heartbeat-interval-secs',
 			dest='hb_interval_secs',
@@ -591,17 +1213,59 @@ class BaseSubtask():
 	def init_subtask_args(self, args):
 		self._TimerIntervalSecs = args.interval_secs  # secs
 		self._HeartbeatIntervalSecs = args.hb_interval_secs
-
-		watch_files = args.watch_files[1:-1]  # dequote
-		watch_files_list = watch_files.split(',')
-		self._watch_files = watch_files_list
-
-		watch_dirs = args.watch_dirs[1:-1]  # dequote
-		watch_dirs_list = watch_dirs.split(',')
-		self._watch_dirs = watch_dirs_list
+		self._TimerFixedRate = not args.timer_fixed_delay
+		self._WatchBackend = args.watch_backend
+		self._WatchRescanSecs = args.watch_rescan_secs
+		self._notify_channel_path = args.notify_channel
+		self._RuntimeMode = args.runtime_mode
+		self._TransferConcurrency = max(1, args.transfer_concurrency)
+		self._SnapshotConcurrency = max(1, args.snapshot_concurrency)
+		self._BacklogOrder = args.backlog_order
+		self._budget = TransferBudget(
+			args.budget_transactions,
+			args.budget_bytes,
+			args.budget_window_secs,
+			args.budget_burst_secs)
+		self._budget_deferred = set()  # Watch files waiting on the budget (one deferred run each)
+		self._budget_lock = threading.Lock()
+		self._BacklogConnections = max(0, args.backlog_connections)
+
+		self._watch_files = split_list_arg(args.watch_files)
+		self._watch_dirs = split_list_arg(args.watch_dirs)
+
+		self._append_only_names = set()
+		for wfile in split_list_arg(args.watch_files_append_only):
+			self._append_only_names.add(os.path.basename(wfile))
+
+		self._DedupUploads = not args.no_dedup_uploads
+		self._delta_names = set(os.path.basename(wfile) for wfile in split_list_arg(args.watch_files_delta))
+		self._DeltaBlockSize = max(512, args.delta_block_size)
+
+		self._transforms = {}  # Watch file name -> Transform
+		for wfileTransform in split_list_arg(args.watch_files_transform):
+			wfile, _, spec = wfileTransform.rpartition('=')
+			try:
+				self._transforms[os.path.basename(wfile)] = load_transform(spec)
+			except (ImportError, ValueError, AttributeError) as e:
+				self.baselogger.error("Transform: [{}] for [{}] failed [{}], uploading untransformed.".format(
+					spec, wfile, e))
+		self._TransformWorkers = max(0, args.transform_workers)
+		self._transform_pool = None
+		self._transform_pool_lock = threading.Lock()
 
 		self._bakToFolder = args.bak_to_folder
 		self._bakToFullPath = None
+		self._SnapshotMode = args.snapshot_mode
+		self._SnapshotFenceAppendOnly = not args.no_snapshot_fence
+		self._snapshot_fences = {}  # Live append-only file -> length to upload (size at notify time)
+		self._stateToFolder = args.state_to_folder
+		self._stateToFullPath = None
+		self._MetricsIntervalSecs = max(0, args.metrics_interval_secs)
+		self._MetricsFile = args.metrics_file
+		self._MetricsPort = args.metrics_port
+		self._TraceSampleRate = args.trace_sample_rate
+		self._TraceFile = args.trace_file
+		self._ProfileMode = args.profile_mode
 
 		if not args.hb_name:
 			self.hb_basename = socket.gethostname()
@@ -614,10 +1278,15 @@ class BaseSubtask():
 		# Derive notify files list
 		# remove any residuals
 		self._notify_files = []
-		self._notify_dir_files = []
+		# Per watch dir state: {'mtime', 'scan_time', 'files': {name: cached_notify_stamp}, 'notifies': set(names)}
+		self._watch_dir_states = {}
+		# Lookups by normalized path, for event driven watchers
+		self._notify_files_index = {}
+		self._watch_dirs_index = {}
 		cached_notify_stamp = 0
 		for wfile in self._watch_files:
 			nfile = '{}.notify'.format(wfile)
+			self._notify_files_index[os.path.normpath(wfile)] = len(self._notify_files)
 			self._notify_files.append((nfile, cached_notify_stamp))
 			if os.path.exists(nfile):
 				os.remove(nfile)
@@ -625,18 +1294,16 @@ class BaseSubtask():
 			if not hb_path:
 				hb_path = os.path.split(nfile)[0]
 
+		for watchDir in self._watch_dirs:
+			self._watch_dirs_index[os.path.normpath(watchDir)] = watchDir
+
 		# Create bakTo folder if it does not exist
-		self._bakToFullPath = self._bakToFolder
-		if self._bakToFolder:
-			watchFolder = os.path.dirname(self._watch_files[0])
+		self._bakToFullPath = self.init_subtask_folder(self._bakToFolder)
+		if self._bakToFullPath and self._SnapshotMode == 'auto':
+			self._SnapshotMode = probe_snapshot_mode(self._bakToFullPath, self.baselogger)
+			self.baselogger.info("Snapshot: Mode [{}] probed in [{}]".format(self._SnapshotMode, self._bakToFullPath))
 
-			if watchFolder and len(watchFolder) > 0:
-				bakFilePath = os.path.join(watchFolder, self._bakToFolder)
-			else:
-				bakFilePath = self._bakToFolder
-			if not os.path.exists(bakFilePath):
-				os.makedirs(bakFilePath)
-			self._bakToFullPath = bakFilePath
+		self.init_state_files()
 
 		# If hb path not derived from first watchfile folder,
 		# default to upload folder (parent of bakTo folder)
@@ -654,129 +1321,799 @@ class BaseSubtask():
 			with open(self.hb_file, 'w') as out_hbf:
 				out_hbf.write('{}\n'.format(self._HeartbeatIntervalSecs + _HeartbeatFudgeFactorSecs))
 
+	def init_state_files(self):
+		# Create state folder if it does not exist, and load persisted upload offsets
+		self._stateToFullPath = self.init_subtask_folder(self._stateToFolder)
+		offsets_filename = None
+		if self._stateToFullPath:
+			offsets_filename = os.path.join(self._stateToFullPath, 'offsets.json')
+		self._upload_offsets = StateFile(offsets_filename)
+		self._journal = None
+		self._backlog_notify_file = None
+		if self._stateToFullPath:
+			# Touched by the master when its background housekeeping copied new residual files
+			self._backlog_notify_file = os.path.join(self._stateToFullPath, 'backlog.notify')
+			self._journal = UploadJournal(os.path.join(self._stateToFullPath, 'journal.jsonl'))
+			self.baselogger.info("Journal: Compacted to [{}] files.".format(self._journal.compact()))
+		self._upload_cache = None
+		if self._DedupUploads and self._stateToFullPath:
+			self._upload_cache = UploadCache(os.path.join(self._stateToFullPath, 'uploads.json'))
+
+	def init_tracing(self):
+		# Spans of the notifies the master sampled (trace id in the notify), see tracing.py
+		self._tracer = None
+		self._notify_traces = {}  # Watch file -> (trace id, detect time) of its oldest traced notify not yet snapshot
+		self._upload_traces = {}  # Watch file -> trace id of the snapshot being uploaded
+		self._notify_file_traces = {}  # .notify file -> last trace id read from it
+		if self._TraceSampleRate > 0:
+			self._tracer = Tracer(self._TraceFile, self._TraceSampleRate, 'subtask')
+			self.baselogger.info("Tracing: Sampled notifies [{}] to [{}].".format(self._TraceSampleRate, self._TraceFile))
+
+	def init_profiling(self, LogFileName):
+		# On demand profiling: SIGUSR1 toggles it, else while <Subtask class>.profile exists next to the .notify files
+		if self._ProfileMode == 'cprofile' and self._RuntimeMode == 'asyncio':
+			self._ProfileMode = 'sample'  # cProfile only sees one thread, transfers run in the executors
+		self._profiler = Profiler(self._ProfileMode)
+		self._profile_folder = os.path.dirname(LogFileName) or '.'
+		self._profile_toggle = False
+		if len(self._watch_files) > 0:
+			controlFolder = os.path.dirname(self._watch_files[0])
+		else:
+			controlFolder = self._watch_dirs[0]
+		self._profile_control_file = os.path.join(controlFolder, '{}.profile'.format(type(self).__name__))
+		self._profile_control_exists = os.path.exists(self._profile_control_file)
+		if self._profile_control_exists:
+			self._profile_toggle = True  # Profile from start
+
+	def init_metrics(self):
+		# Metrics registry (extensions update the connection metrics), exported if MetricsIntervalSecs / MetricsPort
+		self.metrics = MetricsRegistry()
+		self._metrics_server = None
+		self._metrics_filename = None
+		if self._MetricsIntervalSecs > 0 and self._stateToFullPath:
+			self._metrics_filename = os.path.join(self._stateToFullPath, self._MetricsFile)
+		self._metrics_names = set(os.path.basename(wfile) for wfile in self._watch_files)
+		self._notify_times = {}  # Watch file -> time of its oldest notify not yet snapshot
+		self._upload_notify_times = {}  # Watch file -> notify time of the snapshot being uploaded
+		self._snapshot_sources = {}  # bakTo snapshot copy -> watch file (journal key)
+
+		m = self.metrics
+		self.metric_notifies = m.counter('pysubtask_notifies_total', 'Notifies detected', ('file',))
+		self.metric_uploads = m.counter('pysubtask_uploads_total', 'Uploads completed', ('file',))
+		self.metric_upload_bytes = m.counter('pysubtask_upload_bytes_total', 'Bytes of uploaded file content', ('file',))
+		self.metric_uploads_skipped = m.counter('pysubtask_uploads_skipped_total', 'Uploads skipped, content unchanged', ('file',))
+		self.metric_upload_failures = m.counter('pysubtask_upload_failures_total', 'Uploads failed', ('file',))
+		self.metric_connects = m.counter('pysubtask_connects_total', 'Connections established')
+		self.metric_connect_failures = m.counter('pysubtask_connect_failures_total', 'Connection attempts failed')
+		self.metric_snapshot_secs = m.histogram('pysubtask_snapshot_seconds', 'Snapshot copy time', ('file',))
+		self.metric_transfer_secs = m.histogram('pysubtask_transfer_seconds', 'Upload time, including reconnects', ('file',))
+		self.metric_notify_lag_secs = m.histogram('pysubtask_notify_lag_seconds', 'Oldest notify to upload completed', ('file',))
+		self.metric_last_upload = m.gauge('pysubtask_last_upload_timestamp_seconds', 'Time of the last completed upload', ('file',))
+		self.metric_pending_notify_secs = m.gauge('pysubtask_oldest_pending_notify_seconds', 'Age of the oldest notify not yet uploaded')
+		self.metric_backlog_files = m.gauge('pysubtask_backlog_files', 'Files in the bakTo (upload) folder')
+		self.metric_backlog_bytes = m.gauge('pysubtask_backlog_bytes', 'Bytes in the bakTo (upload) folder')
+		self.metric_backlog_active = m.gauge('pysubtask_backlog_uploading', '1 while a residual backlog is uploading')
+		self.metric_connected = m.gauge('pysubtask_connected', '1 if connected (primary connection)')
+
+	def metrics_file_label(self, upFile):
+		# Watch files by name, watch dir files as one '*' series (bounded label values)
+		name = os.path.basename(upFile)
+		return name if name in self._metrics_names else '*'
+
+	def init_subtask_folder(self, relFolder):
+		# Create folder relative to first watchfile folder, if it does not exist
+		if not relFolder:
+			return relFolder
+		watchFolder = self.watch_root()
+		if watchFolder and len(watchFolder) > 0:
+			fullPath = os.path.join(watchFolder, relFolder)
+		else:
+			fullPath = relFolder
+		if not os.path.exists(fullPath):
+			os.makedirs(fullPath)
+		return fullPath
+
+	def watch_root(self):
+		# First watch file folder (else first watch dir): subtask folders, journal keys
+		if len(self._watch_files) > 0:
+			return os.path.dirname(self._watch_files[0])
+		return self._watch_dirs[0]
+
 	def start(self):
 		self.baselogger.info("START! Polling every [{}] secs".format(self._TimerIntervalSecs))
 		self._InitialHeartbeatSent = False
 
-		self._Timer = InfiniteTimer(
+		if self._RuntimeMode == 'asyncio':
+			self.start_async()
+			return
+
+		# One scheduler thread runs all named jobs (and watcher events), in order
+		self._Timer = Scheduler(self.baselogger, self._Description)
+
+		self.start_notify_channel()
+		self.start_watcher()
+
+		self._Timer.add_job(
+			'interval',
+			self._TimerIntervalSecs,
+			self._process_job,
+			self._TimerFixedRate,
+			args=(self._process_interval,))
+		self._Timer.add_job(
+			'poll',
 			self._TimerIntervalSecs,
-			self._process)
+			self._process,
+			self._TimerFixedRate)
+		if self._HeartbeatIntervalSecs > 0:
+			self._Timer.add_job(
+				'heartbeat',
+				self._TimerIntervalSecs,
+				self._process_job,
+				self._TimerFixedRate,
+				args=(self._process_heartbeat,))
+		self.start_metrics()
+		self.start_profiling()
 		self._Timer.start()
 
-	def _process(self):
-		# Not meant to be Overridden.
-		if self._IgnoreTimer:
-			return
-		self._process_interval()
-		if self._SubtaskStopNow:
+	def start_async(self):
+		# Event loop runs detection (io executor) and transfers (transfer executor, one pooled connection each)
+		self.baselogger.info("Runtime: asyncio, [{}] concurrent transfers.".format(self._TransferConcurrency))
+		self._conn_pool = ConnectionPool(self._TransferConcurrency, self._primary_conns)
+		self._Timer = AsyncRuntime(
+			self,
+			self._TransferConcurrency,
+			self._SnapshotConcurrency,
+			self.baselogger,
+			self._Description)
+
+		self.start_notify_channel()
+		self.start_watcher()
+
+		# Dead time checks only touch idle connections
+		self._Timer.add_job(
+			'interval',
+			self._TimerIntervalSecs,
+			self._conn_pool.each_idle,
+			self._TimerFixedRate,
+			args=(self, self._process_job, self._process_interval))
+		self._Timer.add_job(
+			'poll',
+			self._TimerIntervalSecs,
+			self._process,
+			self._TimerFixedRate)
+		if self._HeartbeatIntervalSecs > 0:
+			self._Timer.add_job(
+				'heartbeat',
+				self._TimerIntervalSecs,
+				self._process_pooled,
+				self._TimerFixedRate,
+				args=(self._process_job, self._process_heartbeat),
+				executor='transfer')
+		self.start_metrics()
+		self.start_profiling()
+		self._Timer.start()
+
+	def start_metrics(self):
+		# Gauges are updated (and the metrics file written) every MetricsIntervalSecs, else every interval if served
+		if not self._metrics_filename and self._MetricsPort <= 0:
 			return
+		if self._metrics_filename:
+			self.baselogger.info("Metrics: [{}] every [{}] secs.".format(self._metrics_filename, self._MetricsIntervalSecs))
+		self._Timer.add_job(
+			'metrics',
+			self._MetricsIntervalSecs or self._TimerIntervalSecs,
+			self._process_metrics)
+		if self._MetricsPort > 0 and not self._metrics_server:
+			try:
+				self._metrics_server = self.metrics.serve(self._MetricsPort)
+			except OSError as e:
+				self.baselogger.error("Metrics: HTTP port [{}] failed [{}]".format(self._MetricsPort, e))
+			else:
+				self.baselogger.info("Metrics: Serving http://127.0.0.1:{}/metrics".format(self._MetricsPort))
 
-		self._process_check_static_file_list()
-		if self._SubtaskStopNow:
+	def start_profiling(self):
+		self._Timer.add_job(
+			'profile',
+			self._TimerIntervalSecs,
+			self._process_profile_control,
+			first_delay=0)
+
+	def _process_profile_control(self):
+		# SIGUSR1 toggles, control file created = start, removed = stop
+		toggle = self._profile_toggle
+		self._profile_toggle = False
+		exists = os.path.exists(self._profile_control_file)
+		if exists != self._profile_control_exists:
+			self._profile_control_exists = exists
+			if exists != self._profiler.active:
+				toggle = True
+		if toggle:
+			self.profile_toggle()
+
+	def profile_toggle(self):
+		if self._profiler.active:
+			self.profile_dump()
 			return
-		self._process_check_dynamic_dir_list()
+		self._profiler.start()
+		self.baselogger.info("Profiling: Started [{}], stop with SIGUSR1 or by removing [{}].".format(
+			self._ProfileMode, self._profile_control_file))
+
+	def profile_dump(self):
+		try:
+			files = self._profiler.stop(self._profile_folder, 'profile_{}'.format(type(self).__name__))
+		except Exception as e:
+			self.baselogger.error("Profiling: Dump failed [{}]".format(e))
+		else:
+			self.baselogger.info("Profiling: Stopped, stats in [{}].".format(', '.join(files)))
 
-		if self._HeartbeatIntervalSecs > 0:
-			self._process_heartbeat()
+	def profile_dump_on_timer(self):
+		# cProfile profiles the thread that started it (a timer job): dump from there, before the timer stops
+		if not self._profiler.active or self._Timer.thread is threading.current_thread():
+			return  # stop_diagnostics() dumps
+		dumped = threading.Event()
+
+		def dump():
+			try:
+				self.profile_dump()
+			finally:
+				dumped.set()
+
+		self._Timer.call_soon(dump)
+		if not dumped.wait(_StopJoinTimeoutSecs):
+			self.baselogger.error("Profiling: Timer busy, dumping from the stopping thread.")
 
+	def _process_job(self, process_func):
+		# Not meant to be Overridden.
+		with self._process_lock:
+			if self._IgnoreTimer or self._SubtaskStopNow:
+				return
+			process_func()
+
+	@profiled_phase('poll')
+	def _process(self):
+		# Not meant to be Overridden.
+		with self._process_lock:
+			if self._IgnoreTimer or self._SubtaskStopNow:
+				return
+
+			# Thread runtime: left queued while ignoring (i.e.: connecting).
+			# asyncio runtime: notifies go to its transfer queue, never this one
+			if not isinstance(self._Timer, AsyncRuntime):
+				self._process_notify_queue()
+
+			self._process_notify_channel()
+			if self._SubtaskStopNow:
+				return
+
+			# Event driven watchers only need a periodic (safety) rescan
+			if self.watch_rescan_due():
+				self._process_check_static_file_list()
+				if self._SubtaskStopNow:
+					return
+				self._process_check_dynamic_dir_list()
+
+	def watch_rescan_due(self):
+		if not self._watcher.event_driven:
+			return True
+		now = time.time()
+		if self._watch_rescan_needed or now - self._last_rescan_time >= self._WatchRescanSecs:
+			self._watch_rescan_needed = False
+			self._last_rescan_time = now
+			return True
+		return False
+
+	@profiled_phase('check_files')
 	def _process_check_static_file_list(self):
 		# Check File list for files ready to be notified
 		i = 0
 		for (nfile, cached_notify_stamp) in self._notify_files:
 			if self._SubtaskStopNow:
 				return
-			wfile = nfile.strip('.notify')
+			wfile = self._watch_files[i]
 			self._notify_files[i] = self._process_check_file(
 				wfile,
 				nfile,
 				self._notify_files[i])
 			i += 1
 
+	@profiled_phase('check_dirs')
 	def _process_check_dynamic_dir_list(self):
 		# Dynamically check Dir list for dirs with files ready to be notified
 		for watchDir in self._watch_dirs:
 			if self._SubtaskStopNow:
 				return
-			if os.path.exists(watchDir):
-				for watchDirFile in os.listdir(watchDir):
-					if watchDirFile.endswith(".notify"):
-						pass
-					else:
-						# Check to see if each dir file has a .notify list entry,
-						# if not, add one and set it for ready to be notified
-						ndirfile = os.path.join(watchDir, watchDirFile)
-						ndirfile_already_cached = False
-						i = 0
-						for (cachedndirfile, cached_notify_stamp) in self._notify_dir_files:
-							if ndirfile == cachedndirfile:
-								ndirfile_already_cached = True
-								break
-							i += 1
-
-						if not ndirfile_already_cached:
-							# New file to start monitoring
-							self._notify_dir_files.append((ndirfile, 0))
-							notify_file(ndirfile)
-							self._process_notify(ndirfile)
-						else:
-							# Existing file already being monitored
-							ndirnotifyfile = '{}.notify'.format(ndirfile)
-							self._notify_dir_files[i] = self._process_check_file(
-								ndirfile,
-								ndirnotifyfile,
-								self._notify_dir_files[i])
+			self._process_check_dir(watchDir)
+
+	def _watch_dir_state(self, watchDir):
+		state = self._watch_dir_states.get(watchDir)
+		if state is None:
+			state = {
+				'mtime': None,
+				'scan_time': 0,
+				'files': {},
+				'notifies': set()
+			}
+			self._watch_dir_states[watchDir] = state
+		return state
+
+	def _process_check_dir(self, watchDir):
+		try:
+			dir_mtime = os.stat(watchDir).st_mtime
+		except OSError:
+			return
+		state = self._watch_dir_state(watchDir)
+
+		# A dir mtime only changes when files are added / removed / renamed (not when an existing
+		# .notify is touched). So, if unchanged, only re-check its known .notify files.
+		# Rescan anyway if dir changed too close to the last scan (mtime granularity).
+		if dir_mtime == state['mtime'] and state['scan_time'] - dir_mtime > _DirMtimeGranularitySecs:
+			for name in list(state['notifies']):
+				if self._SubtaskStopNow:
+					return
+				try:
+					stamp = os.stat(os.path.join(watchDir, '{}.notify'.format(name))).st_mtime
+				except OSError:
+					continue  # removed, dir mtime changed, rescanned next time
+				self._process_check_dir_stamp(watchDir, state, name, stamp)
+			return
+
+		self._process_scan_dir(watchDir, state, dir_mtime)
+
+	def _process_scan_dir(self, watchDir, state, dir_mtime):
+		scan_time = time.time()
+		datanames = []
+		stamps = {}
+		with os.scandir(watchDir) as entries:
+			for entry in entries:
+				if not entry.is_file():
+					continue
+				if entry.name.endswith('.notify'):
+					stamps[entry.name[:-len('.notify')]] = entry.stat().st_mtime
+				else:
+					datanames.append(entry.name)
+
+		# Evict deleted files
+		files = state['files']
+		current = set(datanames)
+		for name in [name for name in files if name not in current]:
+			del files[name]
+		state['notifies'] = set(name for name in stamps if name in current)
+		state['mtime'] = dir_mtime
+		state['scan_time'] = scan_time
+
+		for name in datanames:
+			if self._SubtaskStopNow:
+				return
+			if name not in files:
+				self._process_new_dir_file(watchDir, state, name)
+			elif name in stamps:
+				self._process_check_dir_stamp(watchDir, state, name, stamps[name])
+
+	def _process_new_dir_file(self, watchDir, state, name):
+		# New file to start monitoring, add a .notify for it and set it for ready to be notified
+		ndirfile = os.path.join(watchDir, name)
+		notify_file(ndirfile)
+		state['files'][name] = os.stat('{}.notify'.format(ndirfile)).st_mtime
+		state['notifies'].add(name)
+		self._dispatch_touch_notify(ndirfile)
+
+	def _process_check_dir_stamp(self, watchDir, state, name, stamp):
+		if stamp != state['files'][name]:
+			state['files'][name] = stamp
+			# File has changed, so do something...
+			self._dispatch_touch_notify(os.path.join(watchDir, name), stamp)
+
+	def _process_check_dir_file(self, watchDir, watchDirFile):
+		# Check a single file in a watch dir (i.e.: on a watcher event)
+		if watchDirFile.endswith('.notify'):
+			return
+		state = self._watch_dir_state(watchDir)
+		ndirfile = os.path.join(watchDir, watchDirFile)
+		if not os.path.isfile(ndirfile):
+			state['files'].pop(watchDirFile, None)
+			state['notifies'].discard(watchDirFile)
+			return
+
+		if watchDirFile not in state['files']:
+			self._process_new_dir_file(watchDir, state, watchDirFile)
+		else:
+			try:
+				stamp = os.stat('{}.notify'.format(ndirfile)).st_mtime
+			except OSError:
+				return
+			state['notifies'].add(watchDirFile)
+			self._process_check_dir_stamp(watchDir, state, watchDirFile, stamp)
+
+	def _process_watch_event(self, path):
+		# Event driven (i.e.: inotify) change detected, check only the affected file
+		with self._process_lock:
+			if self._SubtaskStopNow:
+				return
+			if path is None or self._IgnoreTimer:
+				# Events lost or ignored (i.e.: while connecting), rescan everything on next interval
+				self._watch_rescan_needed = True
+				return
+
+			path = os.path.normpath(path)
+			watchFile = path
+			if watchFile.endswith('.notify'):
+				watchFile = watchFile[:-len('.notify')]
+
+			i = self._notify_files_index.get(watchFile)
+			if i is not None:
+				if path != watchFile:
+					(nfile, cached_notify_stamp) = self._notify_files[i]
+					self._notify_files[i] = self._process_check_file(
+						self._watch_files[i],
+						nfile,
+						self._notify_files[i])
+				return
+
+			watchDir = self._watch_dirs_index.get(os.path.dirname(watchFile))
+			if watchDir is not None:
+				self._process_check_dir_file(watchDir, os.path.basename(watchFile))
 
 	def _process_check_file(self, datafile, datanotifyfile, updatenotifylist):
 		cachedndirfile = updatenotifylist[0]
 		cached_notify_stamp = updatenotifylist[1]
 
 		if os.path.exists(datanotifyfile):
-			stamp = os.stat(datanotifyfile).st_mtime
+			stat = os.stat(datanotifyfile)
+			stamp = stat.st_mtime
 			if stamp != cached_notify_stamp:
 				# Replace notify file tuple stamp
 				cached_notify_stamp = stamp
 				# File has changed, so do something...
-				self._process_notify(datafile)
+				trace_id = 0
+				if self._tracer and stat.st_size > 0:
+					trace_id = self.notify_file_trace(datanotifyfile)
+				self._dispatch_touch_notify(datafile, stamp, trace_id)
 
 		return (cachedndirfile, cached_notify_stamp)
 
+	def start_watcher(self):
+		# Watcher thread only detects, processing is handed to the scheduler thread
+		self._watcher = create_watcher(
+			self._WatchBackend,
+			lambda path: self._Timer.call_soon(self._process_watch_event, path),
+			self.baselogger)
+		if not self._watcher.event_driven:
+			return
+
+		if self._notify_receiver:
+			self._watcher.add_fd(
+				self._notify_receiver.fileno(),
+				lambda fd: self._receive_notify_channel() and self._Timer.call_soon(self._process_notify_channel))
+
+		# Watch folders of watch files (and their .notify files), and each watch dir
+		for wfile in self._watch_files:
+			self._watcher.add_dir(os.path.dirname(wfile) or os.curdir)
+		for watchDir in self._watch_dirs:
+			self._watcher.add_dir(watchDir)
+		self._watch_rescan_needed = True
+		self._watcher.start()
+		self.baselogger.info("Watching for changes with [{}], rescan every [{}] secs".format(
+			self._watcher.name,
+			self._WatchRescanSecs))
+
+	def start_notify_channel(self):
+		if not self._notify_channel_path or self._notify_receiver:
+			return
+		if not channel_available():
+			self.baselogger.error("Notify channel not available on [{}], using notify files.".format(sys.platform))
+			return
+		try:
+			self._notify_receiver = NotifyReceiver(self._notify_channel_path)
+		except OSError as e:
+			self.baselogger.error("Notify channel [{}] failed [{}], using notify files.".format(
+				self._notify_channel_path, e))
+			return
+		self.baselogger.info("Notify channel: Listening on [{}]".format(self._notify_channel_path))
+
+	def _receive_notify_channel(self):
+		# Drain notify channel without blocking, latest offset per file stays pending until processed
+		messages = self._notify_receiver.receive_all()
+		with self._notify_channel_lock:
+			for (file_id, offset, timestamp, trace_id) in messages:
+				# Latest offset, oldest notify time, first trace id
+				pending = self._notify_channel_pending.get(file_id)
+				if pending:
+					timestamp = pending[1]
+					trace_id = pending[2] or trace_id
+				self._notify_channel_pending[file_id] = (offset, timestamp, trace_id)
+		return len(messages) > 0
+
+	def _process_notify_channel(self):
+		# Process pending notify channel messages, unless ignoring (i.e.: connecting), then they stay pending
+		if not self._notify_receiver:
+			return
+		self._receive_notify_channel()
+		with self._process_lock:
+			if self._IgnoreTimer or self._SubtaskStopNow:
+				return
+
+			with self._notify_channel_lock:
+				pending = self._notify_channel_pending
+				self._notify_channel_pending = {}
+			for file_id, (offset, timestamp, trace_id) in pending.items():
+				if self._SubtaskStopNow:
+					return
+				if file_id < 0 or file_id >= len(self._watch_files):
+					self.baselogger.error("Notify channel file id [{}] out of range!".format(file_id))
+					continue
+				wfile = self._watch_files[file_id]
+				if offset >= 0:
+					self._notify_offsets[wfile] = offset
+				else:
+					self._notify_offsets.pop(wfile, None)
+				self._dispatch_notify(wfile, timestamp, trace_id)
+
 	def _process_interval(self):
 		if self._SubtaskStopNow:
 			return
+		self._process_backlog_notify()
 		self.process_interval()
 
 	def process_interval(self):
 		# Override
 		self.baselogger.info("Subtask Timer: do something every interval.")
 
+	def _process_metrics(self):
+		try:
+			self.update_metrics()
+			self.process_metrics()
+			if self._metrics_filename:
+				self.metrics.write(self._metrics_filename)
+		except Exception as e:
+			self.baselogger.error("Metrics: Export failed [{}]".format(e))
+
+	def update_metrics(self):
+		# Gauges sampled at export time
+		notify_times = list(self._notify_times.values()) + list(self._upload_notify_times.values())
+		notify_times = [t for t in notify_times if t]
+		self.metric_pending_notify_secs.set(round(time.time() - min(notify_times), 3) if notify_times else 0)
+		files = 0
+		size = 0
+		if self._bakToFullPath and os.path.isdir(self._bakToFullPath):
+			with os.scandir(self._bakToFullPath) as it:
+				for entry in it:
+					if entry.is_file():
+						files += 1
+						size += entry.stat().st_size
+		self.metric_backlog_files.set(files)
+		self.metric_backlog_bytes.set(size)
+		self.metric_backlog_active.set(1 if self.backlog_active() else 0)
+
+	def process_metrics(self):
+		# Override: update extension metrics (i.e.: connection state) before each export
+		pass
+
+	def _process_backlog_notify(self):
+		# New residual files from the master (kept notified while a backlog is still uploading)
+		if not self._backlog_notify_file or self.backlog_active() or not os.path.exists(self._backlog_notify_file):
+			return
+		os.remove(self._backlog_notify_file)
+		self.process_backlog()
+
+	def process_backlog(self):
+		# Override: upload the residual backlog (i.e.: start_backlog)
+		self.baselogger.info("Subtask Backlog: upload residual files.")
+
+	def _dispatch_touch_notify(self, psWatchFile, notify_time=None, trace_id=0):
+		# Notify without a write offset: a channel offset received earlier is stale now
+		self._notify_offsets.pop(psWatchFile, None)
+		self._dispatch_notify(psWatchFile, notify_time, trace_id)
+
+	def _dispatch_notify(self, psWatchFile, notify_time=None, trace_id=0):
+		# Detected change: queue for transfer, once per file (a file queued or in flight is only marked dirty)
+		self.metric_notifies.inc(1, self.metrics_file_label(psWatchFile))
+		# Oldest notify since the last snapshot (notify -> upload lag)
+		self._notify_times.setdefault(psWatchFile, notify_time or time.time())
+		if trace_id and self._tracer and psWatchFile not in self._notify_traces:
+			self.trace_detected(psWatchFile, trace_id, notify_time)
+		if isinstance(self._Timer, AsyncRuntime):
+			self._Timer.submit_notify(psWatchFile)
+		elif self._notify_queue.put(psWatchFile):
+			if self._Timer:
+				# After the current detection run, so all its notifies coalesce first
+				self._Timer.call_soon(self._process_notify_queue)
+			else:
+				self._process_notify_queue()
+
+	def _process_notify_queue(self):
+		# Thread runtime: drain queued notifies on the scheduler thread
+		with self._process_lock:
+			while not self._IgnoreTimer and not self._SubtaskStopNow:
+				wfile = self._notify_queue.pop()
+				if wfile is None:
+					return
+				try:
+					self._process_notify(wfile)
+				finally:
+					self._notify_queue.done(wfile)
+
 	def _process_notify(self, psWatchFile):
+		if not self._process_budget(psWatchFile):
+			return
+		upFile = self._process_snapshot(psWatchFile)
+		if self._SubtaskStopNow or not upFile:
+			return
+
+		self._process_upload(upFile, psWatchFile)
+
+	@profiled_phase('upload')
+	def _process_upload(self, upFile, psWatchFile=None):
+		# Live upload, never concurrent with a backlog upload of the same name
+		held_until = self._budget.held_until
+		notify_time = self._upload_notify_times.pop(psWatchFile, None)
+		trace_id = self._upload_traces.pop(psWatchFile, 0)
+		start = time.monotonic()
+		if trace_id:
+			uploaded = self._process_upload_traced(upFile, trace_id)
+		else:
+			with self.upload_lock(upFile):
+				uploaded = self.process_notify(upFile)
+		self.upload_metrics(upFile, uploaded, time.monotonic() - start, notify_time)
+		if psWatchFile and self._budget.held_until != held_until:
+			# Rate limited during this upload, upload again once the server allows
+			self._process_budget(psWatchFile)
+
+	def _process_upload_traced(self, upFile, trace_id):
+		# process_notify() of a traced notify, extensions' spans (i.e.: connect) nest in its upload span
+		self._tracer.set_current(trace_id)
+		span = self._tracer.begin('subtask.upload', file=os.path.basename(upFile))
+		try:
+			with self.upload_lock(upFile):
+				uploaded = self.process_notify(upFile)
+			span.args['uploaded'] = uploaded
+			return uploaded
+		finally:
+			self._tracer.end(span)
+			self._tracer.set_current(0)
+
+	def upload_metrics(self, upFile, uploaded, secs, notify_time=None):
+		# uploaded: extensions' process_notify() result, None = unknown
+		label = self.metrics_file_label(upFile)
+		if uploaded is False:
+			self.metric_upload_failures.inc(1, label)
+		elif uploaded:
+			self.metric_transfer_secs.observe(secs, label)
+			if notify_time:
+				self.metric_notify_lag_secs.observe(max(0.0, time.time() - notify_time), label)
+
+	def _process_budget(self, psWatchFile):
+		# Return True if psWatchFile may be transferred now, else re-notify it when the budget allows
+		delay = self._budget.delay(os.path.basename(psWatchFile))
+		if delay <= 0:
+			return True
+		with self._budget_lock:
+			if psWatchFile in self._budget_deferred:
+				return False  # Deferred run picks up the latest data
+			self._budget_deferred.add(psWatchFile)
+		self.baselogger.info("Budget: [{}] deferred [{:.1f}] secs.".format(psWatchFile, delay))
+		if self._Timer:
+			self._Timer.call_later(delay, self._process_budget_deferred, psWatchFile)
+		return False
+
+	def _process_budget_deferred(self, psWatchFile):
+		with self._budget_lock:
+			self._budget_deferred.discard(psWatchFile)
+		self._dispatch_notify(psWatchFile)
+
+	def budget_wait(self, upFile):
+		# Backlog / final uploads: block until upFile may be transferred, False if stopped meanwhile
+		name = os.path.basename(upFile)
+		delay = self._budget.delay(name)
+		if delay > 0:
+			self.baselogger.info("Budget: [{}] waiting [{:.1f}] secs.".format(name, delay))
+		while delay > 0:
+			if self._stopped.wait(delay):
+				return False
+			delay = self._budget.delay(name)
+		return True
+
+	def budget_hold(self, seconds):
+		# Extensions: server rate limited us (i.e.: HTTP 429 Retry-After), hold all uploads
+		self.baselogger.error("Budget: Rate limited, holding uploads [{}] secs.".format(seconds))
+		self._budget.hold(seconds)
+
+	def budget_held(self):
+		return self._budget.is_held()
+
+	def _process_snapshot(self, psWatchFile):
+		# Return file to upload (snapshot copy if bakTo folder), None if nothing to upload
 		upFile = psWatchFile
 		if not os.path.exists(upFile):
 			self.baselogger.error("File [{}] notified but does not exist!".format(upFile))
-			return
+			return None
 
 		if self._SubtaskStopNow:
-			return
+			return None
 		self._last_notify_dt = datetime.now()
+		self._upload_notify_times[psWatchFile] = self._notify_times.pop(psWatchFile, None)
+		span = self.trace_snapshot(psWatchFile) if self._notify_traces else None
+		self.journal('notify', upFile)
+
+		# Append-only files: no copy, upload exactly the notified length from the live file
+		if self._SnapshotFenceAppendOnly and self.is_append_only(upFile):
+			self.set_snapshot_fence(upFile)
+			self.journal('snapshot', upFile, self.upload_size(upFile))
+			if span:
+				self._tracer.end(span)
+			return upFile
 
 		# If bakTo folder specified, copy file to it and
 		# use the copy as the upload file
 		if self._bakToFullPath:
+			self.backlog_supersede(upFile)
+			start = time.monotonic()
 			upFile = self.copy_file_to_dir(upFile, self._bakToFullPath)  # returns new copied file name
-		if self._SubtaskStopNow or not upFile:
-			return
-
-		self.process_notify(upFile)
+			if upFile is None:
+				if span:
+					self._tracer.end(span)
+				return None
+			self._snapshot_sources[upFile] = psWatchFile
+			self.metric_snapshot_secs.observe(time.monotonic() - start, self.metrics_file_label(psWatchFile))
+		self.journal('snapshot', upFile)
+		if span:
+			self._tracer.end(span)
+		return upFile
+
+	def _process_pooled(self, process_func, *args):
+		# Run with a pooled connection slot bound to this thread (asyncio runtime transfers)
+		if self._SubtaskStopNow:
+			return None
+		with self._conn_pool.checkout(self):
+			return process_func(*args)
 
 	def process_notify(self, psWatchFile):
-		# Override
+		# Override, return True if uploaded, False if failed (upload metrics)
 		self.baselogger.info("Subtask Notified!: File [{}] changed.".format(psWatchFile))
 
+	def notify_file_trace(self, datanotifyfile):
+		# Trace id written in a .notify file, 0 if none or already seen (content kept by later untraced touches)
+		trace_id = read_notify_trace(datanotifyfile)
+		if trace_id == self._notify_file_traces.get(datanotifyfile):
+			return 0
+		self._notify_file_traces[datanotifyfile] = trace_id
+		return trace_id
+
+	def trace_detected(self, psWatchFile, trace_id, notify_time=None):
+		# Master notify -> detected (poll interval / watcher latency)
+		detect_time = time.time()
+		self._notify_traces[psWatchFile] = (trace_id, detect_time)
+		self._tracer.record(
+			'subtask.detect', trace_id, notify_time or detect_time, detect_time, file=os.path.basename(psWatchFile))
+
+	def trace_snapshot(self, psWatchFile):
+		# Detected -> snapshot (queued behind transfers / budget), returns the snapshot span
+		trace = self._notify_traces.pop(psWatchFile, None)
+		if not trace:
+			return None
+		trace_id, detect_time = trace
+		name = os.path.basename(psWatchFile)
+		self._upload_traces[psWatchFile] = trace_id
+		self._tracer.record('subtask.queue', trace_id, detect_time, time.time(), file=name)
+		return self._tracer.begin('subtask.snapshot', trace_id, file=name)
+
+	@contextmanager
+	def trace_span(self, name, **args):
+		# Extensions: span of the traced notify being uploaded by this thread (i.e.: connect), else no-op
+		span = self._tracer.begin(name, **args) if self._tracer else None
+		try:
+			yield span
+		finally:
+			if span is not None:
+				self._tracer.end(span)
+
+	@profiled_phase('heartbeat')
 	def _process_heartbeat(self):
 		if self._SubtaskStopNow:
 			return
 		if not self._InitialHeartbeatSent or self.heartbeat_time() > self._HeartbeatIntervalSecs * 1000:
 			# Heartbeat due!
+			if self._budget.delay(os.path.basename(self.hb_file)) > 0:
+				return  # Over budget (or rate limited), retried next interval
 			self._InitialHeartbeatSent = True
 			self._last_heartbeat_dt = datetime.now()  # reset hb time
 			touch(self.hb_file)
@@ -786,16 +2123,192 @@ class BaseSubtask():
 		# Override
 		self.baselogger.info("Subtask Heartbeat: do something every Heartbeat interval.")
 
+	def start_backlog(self, upDir, upload_func, disconnect_func, clearFiles=False):
+		# Upload residual files in upDir (i.e.: after an outage), newest or oldest first.
+		# BacklogConnections > 0: drained in the background by a pool of that many connections,
+		# while live notifies keep using the primary connection. 0: uploaded now, on this connection.
+		files = self.backlog_files(upDir)
+		if len(files) < 1:
+			return
+		if self._backlog_thread and self._backlog_thread.is_alive():
+			self.baselogger.info("Backlog: Already uploading, [{}] skipped.".format(upDir))
+			return
+
+		self._backlog_superseded = set()
+		self._backlog_progress = {
+			'total': len(files),
+			'done': 0,
+			'skipped': 0,
+			'failed': 0,
+			'bytes': 0,
+			'start': time.monotonic(),
+			'logged': time.monotonic()}
+		self.baselogger.info("Backlog: Uploading [{}] files in [{}], [{}] first, [{}] connections...".format(
+			len(files), upDir, self._BacklogOrder, self._BacklogConnections or 'primary'))
+
+		if self._BacklogConnections < 1:
+			for upFile in files:
+				self._backlog_upload(upFile, upload_func, clearFiles)
+			self._backlog_done()
+			return
+
+		self._backlog_thread = threading.Thread(
+			target=self._run_backlog,
+			args=(files, upload_func, disconnect_func, clearFiles),
+			name='Backlog')
+		self._backlog_thread.start()
+
+	def backlog_files(self, upDir):
+		if not upDir or not os.path.exists(upDir):
+			return []
+		entries = []
+		with os.scandir(upDir) as it:
+			for entry in it:
+				if entry.is_file():
+					entries.append((entry.stat().st_mtime, entry.path))
+		entries.sort(reverse=(self._BacklogOrder == 'newest'))
+		return [path for mtime, path in entries]
+
+	def _run_backlog(self, files, upload_func, disconnect_func, clearFiles):
+		pool = ConnectionPool(self._BacklogConnections)
+
+		def upload(upFile):
+			with pool.checkout(self):
+				self._backlog_upload(upFile, upload_func, clearFiles)
+
+		try:
+			with ThreadPoolExecutor(pool.size) as executor:
+				for future in [executor.submit(upload, upFile) for upFile in files]:
+					future.result()
+		except Exception as e:
+			self.baselogger.exception("Backlog: Upload failed [{}]".format(e))
+		finally:
+			pool.each(self, disconnect_func)
+			self._backlog_done()
+
+	@profiled_phase('backlog_upload')
+	def _backlog_upload(self, upFile, upload_func, clearFiles):
+		if self._SubtaskStopNow:
+			return
+		name = os.path.basename(upFile)
+		size = 0
+		with self._backlog_lock:
+			superseded = name in self._backlog_superseded
+		if superseded:
+			# Notified live since the backlog started, the live upload sends the latest data
+			outcome = 'skipped'
+		else:
+			with self.upload_lock(upFile):
+				if not os.path.exists(upFile):
+					outcome = 'skipped'
+				elif not self.budget_wait(upFile):
+					return  # Stopped, left for the next start
+				else:
+					size = os.path.getsize(upFile)
+					if upload_func(upFile):
+						outcome = 'done'
+						with self._backlog_lock:
+							if clearFiles and name not in self._backlog_superseded:
+								os.remove(upFile)
+					else:
+						outcome = 'failed'
+						self.metric_upload_failures.inc(1, self.metrics_file_label(upFile))
+
+		progress = self._backlog_progress
+		with self._backlog_lock:
+			progress[outcome] += 1
+			if outcome == 'done':
+				progress['bytes'] += size
+			now = time.monotonic()
+			if now - progress['logged'] < _BacklogProgressSecs:
+				return
+			progress['logged'] = now
+		self.baselogger.info("Backlog: [{}/{}] files, [{}] bytes, [{:.1f}] secs.".format(
+			progress['done'] + progress['skipped'] + progress['failed'],
+			progress['total'],
+			progress['bytes'],
+			now - progress['start']))
+
+	def _backlog_done(self):
+		progress = self._backlog_progress
+		secs = time.monotonic() - progress['start']
+		self.baselogger.info(
+			"Backlog: DONE [{}] uploaded, [{}] superseded, [{}] failed of [{}] files, [{}] bytes in [{:.1f}] secs.".format(
+				progress['done'],
+				progress['skipped'],
+				progress['failed'],
+				progress['total'],
+				progress['bytes'],
+				secs))
+		with self._backlog_lock:
+			self._backlog_superseded = set()
+
+	def backlog_active(self):
+		return self._backlog_thread is not None and self._backlog_thread.is_alive()
+
+	def backlog_supersede(self, upFile):
+		# Called before a live snapshot overwrites a backlog file of the same name
+		if self.backlog_active():
+			with self._backlog_lock:
+				self._backlog_superseded.add(os.path.basename(upFile))
+
+	def upload_lock(self, upFile):
+		name = os.path.basename(upFile)
+		with self._backlog_lock:
+			lock = self._upload_locks.get(name)
+			if lock is None:
+				lock = self._upload_locks[name] = threading.Lock()
+		return lock
+
+	def wait(self):
+		# Block the (main) thread until stopped. Keeps it alive for the thread / process
+		# pools started later (backlog, transforms, asyncio runtime): once the main thread
+		# has exited, they no longer accept work (Python 3.9+)
+		while not self._stopped.wait(1):
+			pass
+
 	def stop(self):
 		self._SubtaskStopNow = True
+		self._stopped.set()
+		if self._watcher:
+			self._watcher.stop()
+			self._watcher = PollingWatcher(None)
+		if self._notify_receiver:
+			self._notify_receiver.close()
+			self._notify_receiver = None
 		if self._Timer:
 			self.baselogger.info("STOP!")
+			self.profile_dump_on_timer()
 			self._Timer.stop()
+			if isinstance(self._Timer, AsyncRuntime):
+				# Let in progress transfers finish before extensions close their connections
+				self._Timer.join(_StopJoinTimeoutSecs)
 			self._Timer = None
+		if self._backlog_thread and self._backlog_thread is not threading.current_thread():
+			self._backlog_thread.join(_StopJoinTimeoutSecs)
+		with self._transform_pool_lock:
+			if self._transform_pool:
+				# Final uploads (extensions) transform in the upload thread
+				self._transform_pool.shutdown()
+				self._transform_pool = None
+		self.stop_diagnostics()
+
+	def stop_diagnostics(self):
+		# Final metrics, close the trace file, dump an active profile
+		if self._metrics_filename:
+			self._process_metrics()  # Latest state
+		if self._metrics_server:
+			self._metrics_server.shutdown()
+			self._metrics_server.server_close()
+			self._metrics_server = None
+		if self._tracer:
+			self._tracer.close()
+		if self._profiler.active:
+			self.profile_dump()  # Profiled until stopped, no timer (or it was busy)
 
 	def copy_file_to_dir(self, fromFile, toDir):
 		if not os.path.exists(fromFile):
-			self.baselogger.error("File [{}] does not exist to copy [{}]".format(fromFile))
+			self.baselogger.error("File [{}] does not exist to copy [{}]".format(fromFile, toDir))
 			return None
 
 		fileBaseName = os.path.basename(fromFile)
@@ -804,10 +2317,90 @@ class BaseSubtask():
 		toFileName = os.path.join(toDir, fileBaseName)
 		self.baselogger.info("Copying [{}] to [{}]".format(fromFile, toDir))
 
-		shutil.copy2(fromFile, toDir)
+		try:
+			snapshot_file(self._SnapshotMode, fromFile, toFileName)
+		except OSError as e:
+			if self._SnapshotMode == 'copy':
+				raise
+			self.baselogger.error("Snapshot: [{}] failed [{}], using copy from now on.".format(self._SnapshotMode, e))
+			self._SnapshotMode = 'copy'
+			shutil.copy2(fromFile, toDir)
 
 		return toFileName
 
+	def set_snapshot_fence(self, upFile):
+		# Length fence = write offset from the notify channel if known, else current size
+		size = os.path.getsize(upFile)
+		offset = self._notify_offsets.pop(upFile, -1)
+		if 0 <= offset <= size:
+			size = offset
+		self._snapshot_fences[upFile] = size
+
+	def upload_size(self, upFile):
+		# Bytes of upFile to upload (length fence for live append-only files)
+		size = self._snapshot_fences.get(upFile)
+		if size is None:
+			return os.path.getsize(upFile)
+		return size
+
+	def transform_for(self, upFile):
+		return self._transforms.get(os.path.basename(upFile))
+
+	def upload_name(self, upFile):
+		# Remote name of upFile (+ transform extension, i.e.: '.gz')
+		name = os.path.basename(upFile)
+		transform = self.transform_for(upFile)
+		if transform:
+			name += transform.extension
+		return name
+
+	def upload_reader(self, f, upFile, size):
+		# Stream of the size bytes of open upFile f to upload (transformed, if set for upFile)
+		reader = LimitedReader(f, size)
+		transform = self.transform_for(upFile)
+		if not transform:
+			return reader
+		return TransformReader(reader, transform, self.transform_pool(), self._TransformWorkers)
+
+	def transform_pool(self):
+		# Process pool shared by all transfers, None = transform in the upload thread
+		if self._TransformWorkers < 1 or self._SubtaskStopNow:
+			return None
+		with self._transform_pool_lock:
+			if not self._transform_pool:
+				self._transform_pool = ProcessPoolExecutor(self._TransformWorkers)
+			return self._transform_pool
+
+	def get_conn(self, key):
+		# Extension connection object for the current thread (pooled slot if bound, else primary)
+		return self._bound_conns.get(threading.get_ident(), self._primary_conns).get(key)
+
+	def set_conn(self, key, value):
+		self._bound_conns.get(threading.get_ident(), self._primary_conns)[key] = value
+
+	def touch_conn(self):
+		# Record connection activity (successful transfer or keepalive)
+		self.set_conn('active', time.monotonic())
+
+	def conn_idle_secs(self):
+		return time.monotonic() - (self.get_conn('active') or 0)
+
+	def bind_conns(self, slot):
+		self._bound_conns[threading.get_ident()] = slot
+
+	def unbind_conns(self):
+		self._bound_conns.pop(threading.get_ident(), None)
+
+	def is_pooled_thread(self):
+		return threading.get_ident() in self._bound_conns
+
+	def each_conn_slot(self, func, *args):
+		# Call func with every connection slot bound in turn (i.e.: disconnect all on stop)
+		if self._conn_pool:
+			self._conn_pool.each(self, func, *args)
+		else:
+			func(*args)
+
 	def heartbeat_time(self):
 		# Return millisecs since last heartbeat
 		if not self._last_heartbeat_dt or self._HeartbeatIntervalSecs <= 0:
@@ -829,6 +2422,132 @@ class BaseSubtask():
 
 		return timedelta_milliseconds(datetime.now() - dtime)
 
+	def is_append_only(self, upFile):
+		return os.path.basename(upFile) in self._append_only_names
+
+	def get_append_offset(self, upFile, remoteSize=None):
+		# Return byte offset of upFile already transferred (append-only files),
+		# or None if a full upload is required (unknown, file shrunk or remote size disagrees)
+		if not self.is_append_only(upFile) or self.transform_for(upFile):
+			return None  # Transformed (i.e.: compressed) files are always uploaded in full
+		upname = os.path.basename(upFile)
+		offset = self._upload_offsets.get(upname)
+		if offset is None:
+			return None
+
+		size = self.upload_size(upFile)
+		if size < offset:
+			self.baselogger.info("Append: File [{}] shrunk [{}] < [{}] bytes, full upload.".format(
+				upname, size, offset))
+			return None
+		if remoteSize != offset:
+			self.baselogger.info("Append: Remote [{}] size [{}] != [{}] bytes sent, full upload.".format(
+				upname, remoteSize, offset))
+			return None
+		return offset
+
+	def set_append_offset(self, upFile, offset):
+		if self.is_append_only(upFile):
+			self._upload_offsets.set(os.path.basename(upFile), offset)
+
+	def upload_remote(self, upFile):
+		# Override: remote destination of upFile (upload cache key)
+		return self.upload_name(upFile)
+
+	def upload_unchanged(self, upFile, remote, size):
+		# True if upFile content was already uploaded to remote (skip the upload).
+		# Not heartbeats, their upload (remote mtime) is the signal
+		if not self._upload_cache or upFile == self.hb_file:
+			return False
+		offset = self._upload_offsets.get(os.path.basename(upFile)) if self.is_append_only(upFile) else None
+		if not self._upload_cache.unchanged(upFile, remote, size, offset):
+			return False
+		self.upload_skipped(upFile, size)
+		return True
+
+	def upload_skipped(self, upFile, size):
+		# Record upFile (size bytes) as uploaded without a transfer
+		self.journal('done', upFile, size)
+		label = self.metrics_file_label(upFile)
+		self.metric_uploads_skipped.inc(1, label)
+		self.metric_last_upload.set(round(time.time(), 3), label)
+
+	def upload_started(self, upFile):
+		# Upload cache stamp of upFile before an upload (mtime)
+		try:
+			return os.stat(upFile).st_mtime_ns
+		except OSError:
+			return None
+
+	def upload_recorded(self, upFile, remote, size, stamp):
+		# Extensions: upFile (size bytes, stamp before the upload) was uploaded to remote
+		if self._budget.enabled:
+			self._budget.record(os.path.basename(upFile), size)  # Only bytes actually sent
+		if upFile == self.hb_file:
+			return
+		self.journal('done', upFile, size, stamp)
+		label = self.metrics_file_label(upFile)
+		self.metric_uploads.inc(1, label)
+		self.metric_upload_bytes.inc(size, label)
+		self.metric_last_upload.set(round(time.time(), 3), label)
+		if self._upload_cache:
+			self._upload_cache.record(upFile, remote, size, stamp, self.is_append_only(upFile))
+
+	def journal(self, event, upFile, size=None, mtime_ns=None):
+		# Upload journal event for upFile (current size / mtime if not given)
+		if not self._journal or upFile == self.hb_file:
+			return
+		if size is None or mtime_ns is None:
+			try:
+				stat = os.stat(upFile)
+			except OSError:
+				return
+			size = stat.st_size if size is None else size
+			mtime_ns = stat.st_mtime_ns if mtime_ns is None else mtime_ns
+		# Snapshot copies are journaled as their watch file, 'done' is durable (fsync)
+		name = journal_key(self._snapshot_sources.get(upFile, upFile), self.watch_root())
+		self._journal.append(event, name, size, mtime_ns, fsync=(event == 'done'))
+
+	def is_delta(self, upFile):
+		# Changed blocks only, not for transformed files (see is_append_only for appends)
+		return os.path.basename(upFile) in self._delta_names and not self.transform_for(upFile)
+
+	def delta_manifest_filename(self, upFile):
+		if not self._stateToFullPath:
+			return None
+		return os.path.join(self._stateToFullPath, '{}.delta.json'.format(os.path.basename(upFile)))
+
+	def get_delta_manifest(self, upFile, remoteSize=None):
+		# Manifest of the last upload of upFile, or None if a full upload is required
+		# (unknown, or remote size disagrees)
+		filename = self.delta_manifest_filename(upFile)
+		if not filename or not self.is_delta(upFile):
+			return None
+		manifest = load_manifest(filename, self._DeltaBlockSize)
+		if manifest is None:
+			return None
+		if remoteSize is not None and remoteSize != manifest.size:
+			self.baselogger.info("Delta: Remote [{}] size [{}] != [{}] bytes uploaded, full upload.".format(
+				os.path.basename(upFile), remoteSize, manifest.size))
+			return None
+		return manifest
+
+	def new_delta_manifest(self, upFile):
+		# Empty manifest to sign an upload of upFile into, None if not a delta file
+		if not self.is_delta(upFile) or not self.delta_manifest_filename(upFile):
+			return None
+		return BlockManifest(self._DeltaBlockSize)
+
+	def set_delta_manifest(self, upFile, manifest):
+		# manifest = uploaded, None = remote changing (no delta until the next full upload)
+		filename = self.delta_manifest_filename(upFile)
+		if not filename or not self.is_delta(upFile):
+			return
+		if manifest is not None:
+			save_manifest(filename, manifest)
+		elif os.path.exists(filename):
+			os.remove(filename)
+
 	def sleep(self, seconds):
 		# Politely sleep
 		if self._SubtaskStopNow:
@@ -863,9 +2582,67 @@ def timedelta_milliseconds(td):
 	return td.days * 86400000 + td.seconds * 1000 + td.microseconds / 1000
 
 
+class LimitedReader():
+	"""Read-only file wrapper returning at most length bytes (i.e.: from a growing file)."""
+
+	def __init__(self, f, length):
+		self._f = f
+		self._remaining = length
+
+	def read(self, size=-1):
+		if self._remaining <= 0:
+			return b''
+		if size is None or size < 0 or size > self._remaining:
+			size = self._remaining
+		data = self._f.read(size)
+		self._remaining -= len(data)
+		return data
+
+
+def config_args(config, default, value_args=(), off_flags=()):
+	# Subtask args for config settings: value_args (key, arg) when the value differs from
+	# the default section's, off_flags (key, flag) when the setting is off
+	args = []
+	for key, arg in value_args:
+		value = getattr(config, key)
+		if value != getattr(default, key):
+			args += [arg, str(value)]
+	for key, flag in off_flags:
+		if not getattr(config, key):
+			args.append(flag)
+	return args
+
+
+def split_list_arg(arg):
+	# Dequote and split a delimited list arg, None or empty = empty list
+	if not arg:
+		return []
+	if len(arg) > 1 and arg[0] == '"' and arg[-1] == '"':
+		arg = arg[1:-1]
+	return [item for item in arg.split(',') if item]
+
+
 def notify_file(wfile):
-	nfile = '{}.notify'.format(wfile)
-	touch(nfile)
+	touch_notify('{}.notify'.format(wfile))
+
+
+def touch_notify(nfile):
+	# Existing .notify file (the usual case): one utime() syscall, else create it
+	try:
+		os.utime(nfile)
+	except FileNotFoundError:
+		touch(nfile)
+
+
+def lower_thread_priority():
+	# Lowest CPU priority for the calling thread (Linux: per thread nice, which
+	# the default I/O priority of the CFQ / BFQ schedulers also follows)
+	if not sys.platform.startswith('linux') or not hasattr(threading, 'get_native_id'):
+		return
+	try:
+		os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+	except OSError:
+		pass
 
 
 def touch(fname, mode=0o666, dir_fd=None, **kwargs):
@@ -923,6 +2700,7 @@ def spawn_subtask():
 	subtask = BaseSubtask(pargs)
 	subtask.baselogger.info("***** HELLO!: [{}] *****".format(subtask._Description))
 	subtask.start()
+	subtask.wait()
 
 
 def main():
@@ -0,0 +1,142 @@
+#
+# Script: pysubtask.budget.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Subtask side transfer budget (i.e.: host transaction / upload quotas per day).
+#
+# Transactions and bytes are metered by token buckets refilled evenly over the
+# budget window (budget / window per sec), holding at most BurstSecs worth of budget,
+# so the budget is spent evenly across the window rather than burned at the start.
+# A rolling window of past transfers is the hard limit.
+#
+# As the buckets run down, the gap between uploads of the same file is stretched
+# exponentially (1x, 2x, 4x, ... of the even pace gap). Server rate limits
+# (i.e.: HTTP 429 / Retry-After) hold all uploads for the time asked.
+
+import math
+import time
+import threading
+from collections import deque
+
+_MaxBackoffExponent = 6  # max 64x the even pace gap
+
+
+class TransferBudget():
+
+	def __init__(self, transactions=0, nbytes=0, window_secs=86400, burst_secs=3600):
+		self.transactions = transactions  # per window, 0 = unlimited
+		self.nbytes = nbytes  # per window, 0 = unlimited
+		self.window_secs = max(1, window_secs)
+		burst_secs = min(max(1, burst_secs), self.window_secs)
+
+		self._lock = threading.Lock()
+		self._history = deque()  # (time, bytes) per transfer in the rolling window
+		self._history_bytes = 0
+		self._last_transfer = {}  # key -> time of last transfer
+		self.held_until = 0
+
+		now = time.monotonic()
+		self._tx_rate = transactions / float(self.window_secs)
+		self._tx_capacity = max(1.0, self._tx_rate * burst_secs)
+		self._tx_tokens = self._tx_capacity
+		self._bytes_rate = nbytes / float(self.window_secs)
+		self._bytes_capacity = self._bytes_rate * burst_secs
+		self._bytes_tokens = self._bytes_capacity
+		self._refilled = now
+
+	@property
+	def enabled(self):
+		return self.transactions > 0 or self.nbytes > 0
+
+	def hold(self, seconds):
+		# Server asked to back off (rate limited), no uploads for seconds
+		with self._lock:
+			self.held_until = max(self.held_until, time.monotonic() + seconds)
+
+	def is_held(self):
+		return time.monotonic() < self.held_until
+
+	def delay(self, key):
+		# Seconds until key may be transferred (0 = now)
+		now = time.monotonic()
+		with self._lock:
+			if now < self.held_until:
+				return self.held_until - now
+			if not self.enabled:
+				return 0
+			self._refill(now)
+
+			waits = [0]
+			# Hard limit: rolling window
+			if self.transactions > 0 and len(self._history) >= self.transactions:
+				waits.append(self._history[0][0] + self.window_secs - now)
+			if self.nbytes > 0 and self._history_bytes >= self.nbytes and self._history:
+				waits.append(self._history[0][0] + self.window_secs - now)
+			# Even pace: a whole transaction token, no bytes debt
+			if self.transactions > 0 and self._tx_tokens < 1:
+				waits.append((1 - self._tx_tokens) / self._tx_rate)
+			if self.nbytes > 0 and self._bytes_tokens < 0:
+				waits.append(-self._bytes_tokens / self._bytes_rate)
+
+			# Back off: stretch the gap per file as the buckets run down
+			last = self._last_transfer.get(key)
+			factor = self._backoff_factor()
+			if last is not None and factor > 1:
+				waits.append(last + self._pace_gap() * factor / 2 - now)
+			return max(waits)
+
+	def record(self, key, nbytes=0):
+		now = time.monotonic()
+		with self._lock:
+			self._refill(now)
+			self._tx_tokens -= 1
+			self._bytes_tokens -= nbytes
+			self._history.append((now, nbytes))
+			self._history_bytes += nbytes
+			self._last_transfer[key] = now
+
+	def usage(self):
+		# (transactions, bytes) in the rolling window
+		with self._lock:
+			self._refill(time.monotonic())
+			return (len(self._history), self._history_bytes)
+
+	def _refill(self, now):
+		elapsed = now - self._refilled
+		self._refilled = now
+		self._tx_tokens = min(self._tx_capacity, self._tx_tokens + elapsed * self._tx_rate)
+		self._bytes_tokens = min(self._bytes_capacity, self._bytes_tokens + elapsed * self._bytes_rate)
+		while self._history and self._history[0][0] <= now - self.window_secs:
+			self._history_bytes -= self._history.popleft()[1]
+		for key in [k for k, t in self._last_transfer.items() if t <= now - self.window_secs]:
+			del self._last_transfer[key]
+
+	def _fill(self):
+		# Fraction of budget left in the buckets (lowest of transactions and bytes)
+		fills = []
+		if self.transactions > 0:
+			fills.append(self._tx_tokens / self._tx_capacity)
+		if self.nbytes > 0 and self._bytes_capacity > 0:
+			fills.append(self._bytes_tokens / self._bytes_capacity)
+		return max(0.0, min(fills)) if fills else 1.0
+
+	def _backoff_factor(self):
+		# 1 while at least half full, then doubles each time the fill halves
+		fill = self._fill()
+		if fill >= 0.5:
+			return 1
+		if fill <= 0:
+			return 2 ** _MaxBackoffExponent
+		return 2 ** min(_MaxBackoffExponent, int(math.ceil(math.log(0.5 / fill, 2))) + 1)
+
+	def _pace_gap(self):
+		# Gap per file if the budget is spread evenly over the files transferred in the window
+		files = max(1, len(self._last_transfer))
+		gaps = [0]
+		if self.transactions > 0:
+			gaps.append(files / self._tx_rate)
+		if self.nbytes > 0 and self._history:
+			avg_bytes = self._history_bytes / float(len(self._history))
+			gaps.append(files * avg_bytes / self._bytes_rate)
+		return max(gaps)
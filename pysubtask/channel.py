@@ -0,0 +1,89 @@
+#
+# Script: pysubtask.channel.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Optional notify channel between BaseTaskMaster and BaseSubtask:
+# a non-blocking Unix datagram socket carrying (file id, write offset, timestamp, trace id).
+#
+# The master never blocks on a send. Any send failure (subtask not listening,
+# socket buffer full, etc.) returns False, and the master falls back to the
+# regular touch() .notify file, which the subtask always still checks.
+
+import os
+import time
+import errno
+import struct
+import socket
+
+# file id (watch file index), write offset (-1 = unknown), timestamp, trace id (0 = not traced)
+_MESSAGE = struct.Struct('!iqdQ')
+
+
+def channel_available():
+	return hasattr(socket, 'AF_UNIX')
+
+
+class NotifySender():
+	"""Master side, non-blocking sends, never raises."""
+
+	def __init__(self, path):
+		self.path = path
+		self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		self._sock.setblocking(False)
+
+	def send(self, file_id, offset=-1, timestamp=None, trace_id=0):
+		if timestamp is None:
+			timestamp = time.time()
+		try:
+			self._sock.sendto(_MESSAGE.pack(file_id, offset, timestamp, trace_id), self.path)
+		except OSError:
+			# i.e.: ENOENT / ECONNREFUSED (subtask not listening), EAGAIN (buffer full)
+			return False
+		return True
+
+	def close(self):
+		self._sock.close()
+
+
+class NotifyReceiver():
+	"""Subtask side, bound datagram socket, drained without blocking."""
+
+	def __init__(self, path):
+		self.path = path
+		if os.path.exists(path):
+			os.remove(path)  # stale socket from a previous (killed) subtask
+		self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		self._sock.setblocking(False)
+		self._sock.bind(path)
+
+	def fileno(self):
+		return self._sock.fileno()
+
+	def receive_all(self):
+		# Return list of (file_id, offset, timestamp, trace_id) per file id: latest offset,
+		# oldest timestamp and trace id (first traced) of the messages drained
+		messages = {}
+		while True:
+			try:
+				data = self._sock.recv(_MESSAGE.size)
+			except OSError as e:
+				if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+					break
+				raise
+			if len(data) != _MESSAGE.size:
+				continue
+			file_id, offset, timestamp, trace_id = _MESSAGE.unpack(data)
+			prev = messages.get(file_id)
+			if prev:
+				timestamp = prev[2]
+				trace_id = prev[3] or trace_id
+			messages[file_id] = (file_id, offset, timestamp, trace_id)
+		return list(messages.values())
+
+	def close(self):
+		self._sock.close()
+		try:
+			os.remove(self.path)
+		except OSError:
+			pass
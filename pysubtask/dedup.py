@@ -0,0 +1,81 @@
+#
+# Script: pysubtask.dedup.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Persisted cache of the last successful upload per (local file, remote destination):
+# content hash, size and mtime. An upload of unchanged content is skipped; the quick
+# check is one stat (same size + mtime), the content hash is only computed when the
+# size matches but the mtime changed (i.e.: rewritten with the same data).
+#
+# Append-only files are never hashed (that would re-read the whole file per upload):
+# their content is unchanged while the size equals the append offset last uploaded.
+# Not fsync'ed, a cache lost in a crash only costs a re-upload.
+
+import os
+import hashlib
+
+from .state import StateFile
+
+_HashBlockSize = 1048576  # 1 MB
+
+
+def file_digest(filename, size):
+	# sha1 of the first size bytes of filename
+	digest = hashlib.sha1()
+	with open(filename, 'rb') as f:
+		remaining = size
+		while remaining > 0:
+			data = f.read(min(_HashBlockSize, remaining))
+			if not data:
+				break
+			digest.update(data)
+			remaining -= len(data)
+	return digest.hexdigest()
+
+
+class UploadCache():
+
+	def __init__(self, filename):
+		self._state = StateFile(filename, fsync=False)
+		self.skipped = 0
+
+	@staticmethod
+	def key(filename, remote):
+		return '{}|{}'.format(os.path.abspath(filename), remote)
+
+	def unchanged(self, filename, remote, size, offset=None):
+		# True if the first size bytes of filename are what was last uploaded to remote
+		# (append-only files: offset = append offset uploaded)
+		entry = self._state.get(self.key(filename, remote))
+		if not entry or entry['size'] != size:
+			return False
+		if entry['sha1'] is None:
+			if offset != size:
+				return False
+			self.skipped += 1
+			return True
+		try:
+			mtime_ns = os.stat(filename).st_mtime_ns
+		except OSError:
+			return False
+		if mtime_ns != entry['mtime_ns']:
+			if file_digest(filename, size) != entry['sha1']:
+				return False
+			entry['mtime_ns'] = mtime_ns  # same content, quick check next time
+			self._state.set(self.key(filename, remote), entry)
+		self.skipped += 1
+		return True
+
+	def record(self, filename, remote, size, mtime_ns, append_only=False):
+		# filename (first size bytes, mtime_ns when the upload started) was uploaded to remote
+		try:
+			changed = os.stat(filename).st_mtime_ns != mtime_ns
+		except OSError:
+			changed = True
+		if changed:
+			# Gone or changed while uploading, upload next time
+			self._state.pop(self.key(filename, remote))
+			return
+		digest = None if append_only else file_digest(filename, size)
+		self._state.set(self.key(filename, remote), {'size': size, 'mtime_ns': mtime_ns, 'sha1': digest})
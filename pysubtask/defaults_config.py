@@ -12,19 +12,51 @@ base = Section('Base TaskMaster-Subtask defaults')
 
 base.SubtaskDescription = "BaseSubtask Scheduler"
 base.TimerIntervalSecs = 2
+base.TimerFixedRate = True  # True = fixed rate (no drift), False = interval measured from end of each run
 base.BakToFolder = 'upload'  # Relative path, None = does not make a copy of file
+base.SnapshotMode = 'auto'  # BakToFolder copies: 'auto' (probed), 'reflink', 'copy_file_range' or 'copy'
+base.TransformWorkers = 0  # Process pool workers for watch file 'transform's (i.e.: gzip), 0 = transform in the upload thread
+base.SnapshotFenceAppendOnly = True  # True = append-only files are not copied, upload the notified length from the live file
+base.BudgetTransactions = 0  # Max uploads per BudgetWindowSecs (i.e.: host quota), 0 = unlimited
+base.BudgetBytes = 0  # Max bytes uploaded per BudgetWindowSecs, 0 = unlimited
+base.BudgetWindowSecs = 86400  # 1 day, budget is spent evenly across this window
+base.BudgetBurstSecs = 3600  # Max budget available at once = this many secs worth
+base.DeltaBlockSize = 16384  # 'delta' watch files: block size of the uploaded blocks manifest
+base.DedupUploads = True  # True = skip uploads of content unchanged since its last upload (i.e.: after reconnects)
+base.StateFolder = 'state'  # Relative path, where the subtask persists upload state (i.e.: append offsets)
 base.ArchiveToFolder = 'archive'  # Relative path, None = does not archive expired files
 base.ArchiveAfterDaysOld = 3
+base.HousekeepingBackground = True  # True = start() pre-copies residual files in a background thread, after the subtask starts (archival before)
+base.MetricsIntervalSecs = 0  # Subtask writes its metrics (Prometheus text) every N secs, 0 = no metrics export
+base.MetricsFile = 'metrics.prom'  # Relative to the subtask StateFolder (or absolute, i.e.: a node_exporter textfile dir)
+base.MetricsPort = 0  # Also serve metrics on http://127.0.0.1:port/metrics, 0 = no HTTP endpoint
+base.TraceSampleRate = 0.0  # Fraction (0.0 - 1.0) of notifies traced master -> upload (span timings), 0 = no tracing
+base.TraceFile = './logs/trace.json'  # Chrome trace event file, shared by master and subtask (chrome://tracing, Perfetto)
+base.ProfileMode = 'cprofile'  # On demand subtask profiling (SIGUSR1 / <Subtask class>.profile file): 'cprofile' or 'sample' (all threads)
 base.Master_Log_FileName = './logs/base_taskmaster.log.txt'
 base.Subtask_Log_FileName = './logs/base_subtask.log.txt'
 base.HeartbeatIntervalSecs = 0  # Heartbeat file expected every N secs, 0 = Do not use Heartbeat
 base.HeartbeatName = None  # Name for .heartbeat file, default None = hostname
+base.WatchBackend = 'poll'  # 'poll' = portable stat() polling, 'inotify' = Linux event driven, 'auto'
+base.WatchRescanSecs = 60  # Safety full rescan interval for event driven watch backends
+base.NotifyChannel = False  # True = also notify over a non-blocking Unix datagram socket (touch files = fallback)
+base.RuntimeMode = 'thread'  # 'thread' = one scheduler thread, 'asyncio' = event loop with concurrent transfers
+base.TransferConcurrency = 1  # Max concurrent transfers (connections) in 'asyncio' runtime mode
+base.SnapshotConcurrency = 2  # Max concurrent detection / snapshot copy workers in 'asyncio' runtime mode
+base.BacklogOrder = 'newest'  # Residual backlog upload order on (re)start: 'newest' or 'oldest' first
+base.BacklogConnections = 0  # Background backlog upload connections, 0 = upload backlog before starting
 
 burst_mode = Section('Base TaskMaster Burst Mode defaults')
 
 burst_mode.start_trigger_milli = 1000  # 1 sec
 burst_mode.start_trigger_count = 2  # n times in a row required for burst mode to be triggered
 burst_mode.expire_milli = 5000  # 5 secs
+burst_mode.auto_flush = True  # True = master notifies pending (end of burst) data itself when it expires
+burst_mode.log_notifies = False  # True = log every burst mode notify (i.e.: regular rate), not only burst start / end
+# Byte rate burst detection (per file: 'burstmode': {'bytes_per_sec': N, ...}), 0 = notify timing only
+burst_mode.bytes_per_sec = 0  # Burst while the data file grows faster than N bytes/sec (EWMA)
+burst_mode.max_buffered_bytes = 1048576  # 1 MB, notify when this much data is buffered, even mid-burst
+burst_mode.rate_halflife_milli = 1000  # EWMA half-life of the growth rate
 
 ftp = Section('S/FTP TaskMaster-Subtask defaults')
 
@@ -32,9 +64,16 @@ ftp.SubtaskDescription = "S/FTP Uploader"
 ftp.HostPort = -1  # Default -1 = Use standard ports for either S/FTP
 ftp.HostPath = ""
 ftp.DeadTimeMilli = 180000  # 180000 millisecs = 3 mins, Time of no notifies before RESTing
+ftp.ConnectionMode = 'deadtime'  # 'deadtime' = disconnect after DeadTimeMilli, 'persistent' = keepalive, stay connected
+ftp.KeepAliveSecs = 30  # 'persistent' mode: SSH keepalive / FTP NOOP after N secs idle
 ftp.UseSFTP = True  # False = Use regular FTP, Must be True to use SFTP
 ftp.BakToFolder = 'upload/ftp'  # Relative path, None = does not make a copy of file
+ftp.StateFolder = 'state/ftp'  # Relative path, where the subtask persists upload state
 ftp.TimerIntervalSecs = 2  # Time to wake up and check for data notifies
+ftp.TransferConcurrency = 2  # Max concurrent S/FTP connections in 'asyncio' runtime mode
+ftp.BudgetTransactions = 0  # Max S/FTP uploads per base.BudgetWindowSecs, 0 = unlimited
+ftp.BudgetBytes = 0  # Max S/FTP bytes per base.BudgetWindowSecs, 0 = unlimited
+ftp.BacklogConnections = 4  # S/FTP connections draining the residual backlog, while live data uses its own
 ftp.Master_Log_FileName = './logs/ftp_taskmaster.log.txt'
 ftp.Subtask_Log_FileName = './logs/ftp_subtask.log.txt'
 
@@ -43,7 +82,15 @@ dropbox = Section('Dropbox TaskMaster-Subtask defaults')
 dropbox.SubtaskDescription = "Dropbox Uploader"
 dropbox.AccessToken = "*************************************************"
 dropbox.DeadTimeMilli = 180000  # 180000 millisecs = 3 mins, Time of no notifies before RESTing
+dropbox.ConnectionMode = 'deadtime'  # 'deadtime' = disconnect after DeadTimeMilli, 'persistent' = keepalive, stay connected
+dropbox.KeepAliveSecs = 30  # 'persistent' mode: validate session after N secs idle
 dropbox.BakToFolder = 'upload/dropbox'  # Relative path, None = does not make a copy of file
+dropbox.StateFolder = 'state/dropbox'  # Relative path, where the subtask persists upload state
 dropbox.TimerIntervalSecs = 2  # Time to wake up and check for data notifies
+dropbox.TransferConcurrency = 4  # Max concurrent Dropbox uploads in 'asyncio' runtime mode
+dropbox.BudgetTransactions = 0  # Max Dropbox uploads per base.BudgetWindowSecs, 0 = unlimited
+dropbox.BudgetBytes = 0  # Max Dropbox bytes per base.BudgetWindowSecs, 0 = unlimited
+dropbox.BacklogConnections = 4  # Dropbox sessions draining the residual backlog, while live data uses its own
+dropbox.UploadChunkSize = 4194304  # 4 MB, Files larger are streamed in chunks via an upload session
 dropbox.Master_Log_FileName = './logs/dropbox_taskmaster.log.txt'
 dropbox.Subtask_Log_FileName = './logs/dropbox_subtask.log.txt'
@@ -0,0 +1,96 @@
+#
+# Script: pysubtask.delta.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Client-side block delta for watch files rewritten in place (i.e.: 'delta': True).
+#
+# A manifest of what was last uploaded (per block: weak adler32 + strong sha1 hash)
+# is kept in the subtask state folder. On the next upload only the blocks whose
+# hashes changed are written, at their offsets (SFTP random-access writes); the
+# weak hash is compared first, the strong hash confirms a match.
+#
+# Without a server-side process, remote data can not be moved, so blocks are
+# matched at the same offset only: an insertion / deletion rewrites the rest of the file.
+
+import zlib
+import hashlib
+
+from .state import StateFile
+
+
+class BlockManifest():
+
+	def __init__(self, block_size, size=0, weak=None, strong=None):
+		self.block_size = block_size
+		self.size = size
+		self.weak = weak or []
+		self.strong = strong or []
+
+	def add(self, data):
+		# Sign the next block, return (weak, strong)
+		weak = zlib.adler32(data)
+		strong = hashlib.sha1(data).hexdigest()
+		self.weak.append(weak)
+		self.strong.append(strong)
+		self.size += len(data)
+		return weak, strong
+
+	def matches(self, index, data, weak, strong):
+		# Block index of this manifest holds data
+		if index >= len(self.weak) or self.weak[index] != weak:
+			return False
+		if min(self.block_size, self.size - index * self.block_size) != len(data):
+			return False
+		return self.strong[index] == strong
+
+
+def changed_blocks(reader, old, new):
+	# Yield (offset, data) of blocks of reader not in old, signing all into new
+	offset = 0
+	while True:
+		data = reader.read(new.block_size)
+		if not data:
+			return
+		weak, strong = new.add(data)
+		if not old.matches(len(new.weak) - 1, data, weak, strong):
+			yield offset, data
+		offset += len(data)
+
+
+def load_manifest(filename, block_size):
+	# Manifest saved in filename, None if missing or of another block size
+	state = StateFile(filename)
+	if state.get('block_size') != block_size:
+		return None
+	return BlockManifest(block_size, state.get('size', 0), state.get('weak'), state.get('strong'))
+
+
+def save_manifest(filename, manifest):
+	state = StateFile(filename)
+	state.set('block_size', manifest.block_size, save=False)
+	state.set('size', manifest.size, save=False)
+	state.set('weak', manifest.weak, save=False)
+	state.set('strong', manifest.strong, save=False)
+	state.save()
+
+
+class SignatureReader():
+	"""Read-only file wrapper signing the bytes read (i.e.: a full upload) into a BlockManifest."""
+
+	def __init__(self, reader, manifest):
+		self._reader = reader
+		self._pending = b''
+		self.manifest = manifest
+
+	def read(self, size=-1):
+		data = self._reader.read(size)
+		block_size = self.manifest.block_size
+		if data:
+			self._pending += data
+		pos = 0
+		while len(self._pending) - pos >= block_size or (not data and pos < len(self._pending)):
+			self.manifest.add(self._pending[pos:pos + block_size])
+			pos += block_size
+		self._pending = self._pending[pos:]
+		return data
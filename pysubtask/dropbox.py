@@ -15,9 +15,23 @@
 
 import os
 import dropbox
+import requests
 
 from . import defaults_config as defaults
-from .base import BaseTaskMaster, BaseSubtask
+from .base import BaseTaskMaster, BaseSubtask, config_args
+
+_RateLimitBackoffSecs = 60  # Rate limited (HTTP 429) without a Retry-After
+
+# Subtask args for dropbox_config settings, only passed when they differ from the defaults
+_DropboxConfigArgs = (
+	('TransferConcurrency', '-tconc'),
+	('BudgetTransactions', '-btx'),
+	('BudgetBytes', '-bbytes'),
+	('BacklogConnections', '-bconn'),
+	('DeadTimeMilli', '-x'),
+	('ConnectionMode', '-conn'),
+	('KeepAliveSecs', '-keepalive'),
+	('UploadChunkSize', '-chunk'))
 
 
 ##################
@@ -57,21 +71,24 @@ class DropboxTaskMaster(BaseTaskMaster):
 		# Add specific args for Dropbox Client to SubProc args
 		self._subtaskArgs += [
 			'-dtoken', self.dropbox_config.AccessToken,
-			'-bakto', defaults.dropbox.BakToFolder
+			'-bakto', defaults.dropbox.BakToFolder,
+			'-stateto', self.dropbox_config.StateFolder
 		]
+		self._state_folder = self.dropbox_config.StateFolder
 		# Only add these args if they differ from default config
-		if self.dropbox_config.DeadTimeMilli != defaults.dropbox.DeadTimeMilli:
-			self._subtaskArgs += ['-x', str(self.dropbox_config.DeadTimeMilli)]
+		self._subtaskArgs += config_args(self.dropbox_config, defaults.dropbox, _DropboxConfigArgs)
 
-	def start(self, precleanup_old_files=False):
+	def start(self, precleanup_old_files=False, housekeeping_done=None):
 		if precleanup_old_files:
 			# Pre-archive old data & pre-copy and upload previous residual data, then Start
-			super().start(
+			# (base.HousekeepingBackground: Archive, Start, while pre-copying in the background)
+			return super().start(
 				prearchive_expired_files_to_folder=defaults.base.ArchiveToFolder,
-				precopy_files_to_folder=self.dropbox_config.BakToFolder)
+				precopy_files_to_folder=self.dropbox_config.BakToFolder,
+				housekeeping_done=housekeeping_done)
 		else:
 			# Just Start
-			super().start()
+			return super().start()
 
 	def stop(self, **kwargs):
 		super().stop(defaults.dropbox.SubtaskDescription, **kwargs)
@@ -86,6 +103,11 @@ class DropboxSubtask(BaseSubtask):
 	_Description = defaults.dropbox.SubtaskDescription
 	dropboxlogger = None
 
+	# Connections are per connection slot (primary, or pooled in asyncio runtime mode)
+	_dropbox = property(
+		lambda self: self.get_conn('dropbox'),
+		lambda self, value: self.set_conn('dropbox', value))
+
 	def __init__(
 		self,
 		args,
@@ -105,6 +127,9 @@ class DropboxSubtask(BaseSubtask):
 		self._dropbox = None
 		self._accessToken = args.dropbox_token
 		self.DeadTimeMilli = args.dropbox_dead_time_milli
+		self.ConnectionMode = args.dropbox_connection_mode
+		self.KeepAliveSecs = args.dropbox_keepalive_secs
+		self.UploadChunkSize = args.dropbox_chunk_size
 
 	def start(self):
 		self.connect(True)  # connect before starting timers ( super().start() )
@@ -115,6 +140,10 @@ class DropboxSubtask(BaseSubtask):
 			return
 
 		# Dropbox Subtask Timer: called every interval.
+		if self.ConnectionMode == 'persistent':
+			self.keepalive()
+			return
+
 		deadTime = self.dead_time()
 		if deadTime and deadTime > self.DeadTimeMilli:
 			if self.is_connected():
@@ -122,38 +151,48 @@ class DropboxSubtask(BaseSubtask):
 					self.DeadTimeMilli / 1000))
 				self.disconnect()
 
+	def process_backlog(self):
+		if not self.Enabled:
+			return
+		self.start_backlog(self._bakToFullPath, self.upload_file, self.disconnect)
+
+	def process_metrics(self):
+		self.metric_connected.set(1 if self.is_connected() else 0)
+
 	def process_notify(self, psWatchFile):
 		if not self.Enabled:
 			return
 
 		# Dropbox Subtask Notified!: New data ready
-		if not self.is_connected():
+		if not self.connection_alive():
 			self.connect()
 
 		if not self.upload_file(psWatchFile):
-			if self._SubtaskStopNow:
-				return
+			if self._SubtaskStopNow or self.budget_held():
+				return False  # Rate limited, upload is retried once the server allows
 			self.dropboxlogger.error("Upload, attempting reconnect.")
 
 			# Attempt reconnect loop process ONCE
 			if not self.is_connected():
 				self.connect()
 				if not self.is_connected():
-					self.ftplogger.error("Upload FAIL'ed to reconnect!")
-					return
+					self.dropboxlogger.error("Upload FAIL'ed to reconnect!")
+					return False
 				else:
 					# Successfully reconnected!
 					# Try to upload one more time
 					if self._SubtaskStopNow:
-						return
-					self.upload_file(psWatchFile)
+						return False
+					return self.upload_file(psWatchFile)
+			return False
+		return True
 
 	def process_heartbeat(self, hb_filename):
 		if not self.Enabled:
 			return
 
 		# Subtask Heartbeat due!
-		if not self.is_connected():
+		if not self.connection_alive():
 			self.connect()
 
 		self.upload_file(hb_filename, False)  # heartbeat does not need retry or logging
@@ -162,7 +201,10 @@ class DropboxSubtask(BaseSubtask):
 		# Cycle infinitely until connected
 
 		# make sure BaseSubtask timer is STOP'ed until connected
-		self._IgnoreTimer = True
+		# (pooled connections reconnect without stopping detection)
+		pooled = self.is_pooled_thread()
+		if not pooled:
+			self._IgnoreTimer = True
 
 		num_retries = 5
 		short_wait = 3  # secs
@@ -170,21 +212,7 @@ class DropboxSubtask(BaseSubtask):
 		connectSuccess = False
 
 		while not connectSuccess and not self._SubtaskStopNow:
-			for i in range(num_retries):
-				if self._SubtaskStopNow:
-					break
-
-				connectSuccess = self.connect_once()
-
-				if connectSuccess:
-					break
-				else:
-					self.dropboxlogger.error("CONNECT attempt FAILED! Try # [{}] of [{}] retries".format(
-						i + 1, num_retries))
-					if (i + 1) < num_retries:
-						self.dropboxlogger.info("Waiting [{}] secs before next try...".format(short_wait))
-						self.sleep(short_wait)
-
+			connectSuccess = self.connect_round(num_retries, short_wait)
 			if not connectSuccess:
 				self.dropboxlogger.error("Repeated CONNECT FAILURE!")
 				self.dropboxlogger.info("LONGER Wait [{}] secs before next try...".format(long_wait))
@@ -192,9 +220,30 @@ class DropboxSubtask(BaseSubtask):
 
 		if connectSuccess and not self._SubtaskStopNow:
 			if uploadAllFilesFirst:
-				self.upload_all_in_dir(self._bakToFullPath)
+				self.start_backlog(self._bakToFullPath, self.upload_file, self.disconnect)
 
-		self._IgnoreTimer = False
+		if not pooled:
+			self._IgnoreTimer = False
+
+	def connect_round(self, num_retries, short_wait):
+		# Up to num_retries connect attempts, short_wait secs apart, True if connected
+		for i in range(num_retries):
+			if self._SubtaskStopNow:
+				return False
+
+			with self.trace_span('dropbox.connect', attempt=i + 1):
+				connectSuccess = self.connect_once()
+			if connectSuccess:
+				self.metric_connects.inc()
+				return True
+
+			self.metric_connect_failures.inc()
+			self.dropboxlogger.error("CONNECT attempt FAILED! Try # [{}] of [{}] retries".format(
+				i + 1, num_retries))
+			if (i + 1) < num_retries:
+				self.dropboxlogger.info("Waiting [{}] secs before next try...".format(short_wait))
+				self.sleep(short_wait)
+		return False
 
 	def connect_once(self):
 		if self.is_connected():
@@ -216,6 +265,7 @@ class DropboxSubtask(BaseSubtask):
 			self._dropbox = None
 			return False
 
+		self.touch_conn()
 		return True
 
 	def is_connected(self):
@@ -224,12 +274,39 @@ class DropboxSubtask(BaseSubtask):
 		else:
 			return False
 
+	def connection_alive(self):
+		# Persistent mode: validate an idle session before use, else (dead time mode) same as is_connected()
+		if not self.is_connected():
+			return False
+		if self.ConnectionMode != 'persistent' or self.conn_idle_secs() < self.KeepAliveSecs:
+			return True
+		if not self.send_keepalive():
+			self.dropboxlogger.error("Session lost while idle, reconnecting.")
+			self.disconnect()
+			return False
+		return True
+
+	def keepalive(self):
+		# Persistent mode, every interval: cheap API call once idle for KeepAliveSecs (keeps HTTPS connection warm)
+		if self.is_connected() and self.conn_idle_secs() >= self.KeepAliveSecs:
+			if not self.send_keepalive():
+				self.dropboxlogger.error("Keepalive failed, reconnect on next upload.")
+				self.disconnect()
+
+	def send_keepalive(self):
+		try:
+			self._dropbox.users_get_current_account()
+		except Exception:
+			return False
+		self.touch_conn()
+		return True
+
 	def disconnect(self):
 		if self._dropbox:
 			self.dropboxlogger.info("Dropbox DISCONNECT!")
 			try:
 				self._dropbox.close()
-			except Exception as e:
+			except Exception:
 				pass
 			self._dropbox = None
 
@@ -238,7 +315,7 @@ class DropboxSubtask(BaseSubtask):
 		# Upload all files one final time
 		if self.is_connected():
 			self.upload_all_in_dir(self._bakToFullPath)
-		self.disconnect()
+		self.each_conn_slot(self.disconnect)
 
 	def upload_file(self, upFile, logSuccess=True):
 		# Check if upFile exists first
@@ -246,28 +323,53 @@ class DropboxSubtask(BaseSubtask):
 			self.dropboxlogger.error("Upload file [{}] does not exist!".format(upFile))
 			return False
 
+		# Skip content Dropbox already has (no reconnect needed)
+		size = self.upload_size(upFile)
+		remote = self.upload_remote(upFile)
+		if self.upload_unchanged(upFile, remote, size):
+			if logSuccess:
+				self.dropboxlogger.info("Upload Data File: [{}] unchanged, skipped.".format(upFile))
+			return True
+
+		# Dropbox has no append to an existing file, so append-only files are
+		# always uploaded in full, but only if new bytes exist since the last transfer
+		if self.is_append_only(upFile) and self._upload_offsets.get(os.path.basename(upFile)) == size:
+			self.upload_skipped(upFile, size)
+			return True
+		stamp = self.upload_started(upFile)
+
 		# Check if we need to reconnect
 		if not self.is_connected():
 			self.connect()
 			if not self.is_connected():
 				return False
 
-		upname = os.path.basename(upFile)
-
 		if self._dropbox:
-			try:
-				self.upload_file_dropbox(
+			return self.upload_transfer(upFile, remote, size, stamp, logSuccess)
+		return False
+
+	def upload_transfer(self, upFile, remote, size, stamp, logSuccess=True):
+		# Connected: upload upFile (size bytes) to remote, record it if uploaded
+		try:
+			with self.trace_span('dropbox.transfer', bytes=size):
+				uploaded = self.upload_file_dropbox(
 					upFile,
-					"/" + upname,
+					remote,
 					True,
 					logSuccess)
-			except Exception as e:
-				self.dropboxlogger.error("Upload Data File: [{}]".format(e))
-				self.disconnect()
-				return False
-			else:
-				# self.dropboxlogger.info("Upload Data File: [{}]".format(upname))
-				return True
+		except Exception as e:
+			self.dropboxlogger.error("Upload Data File: [{}]".format(e))
+			self.disconnect()
+			return False
+		else:
+			if uploaded:
+				self.set_append_offset(upFile, size)
+				self.upload_recorded(upFile, remote, size, stamp)
+				self.touch_conn()
+			return uploaded
+
+	def upload_remote(self, upFile):
+		return "/" + self.upload_name(upFile)
 
 	def upload_file_dropbox(self, file_from, file_to, overwrite=False, logSuccess=True):
 		"""upload a file to Dropbox using API v2
@@ -280,23 +382,90 @@ class DropboxSubtask(BaseSubtask):
 
 		mode = (dropbox.files.WriteMode.overwrite if overwrite else dropbox.files.WriteMode.add)
 		# mtime = os.path.getmtime(file_from)
+		file_size = self.upload_size(file_from)
 		with open(file_from, 'rb') as f:
+			# Upload stream (transformed size is only known at its end)
+			reader = self.upload_reader(f, file_from, file_size)
 			try:
-				res = self._dropbox.files_upload(
-					f.read(),
-					file_to,
-					mode,
-					# client_modified=datetime.datetime(*time.gmtime(mtime)[:6]),
-					mute=True)
+				chunk = reader.read(self.UploadChunkSize)
+				next_chunk = reader.read(self.UploadChunkSize)
+				if not next_chunk:
+					# Small file, single call
+					res = self._dropbox.files_upload(
+						chunk,
+						file_to,
+						mode,
+						# client_modified=datetime.datetime(*time.gmtime(mtime)[:6]),
+						mute=True)
+				else:
+					res = self.upload_file_dropbox_session(reader, chunk, next_chunk, file_to, mode)
 			except dropbox.exceptions.ApiError as err:
-				self.dropboxlogger.error('Dropbox API error:', err)
+				self.dropboxlogger.error('Dropbox API error: [{}]'.format(err))
 				return False
+			except dropbox.exceptions.RateLimitError as err:
+				# HTTP 429, backoff = Retry-After secs (if sent)
+				self.budget_hold(err.backoff or _RateLimitBackoffSecs)
+				return False
+		if not res:
+			return False
 
 		if logSuccess:
 			self.dropboxlogger.info("Uploaded as [{}]".format(
 				res.name.encode('utf8')))
 		return True
 
+	def upload_file_dropbox_session(self, reader, chunk, next_chunk, file_to, mode):
+		# Stream reader in chunks through an upload session (memory stays at two chunks),
+		# resuming from the last committed chunk offset if the connection drops
+		num_retries = 5
+		short_wait = 3  # secs
+		retries = 0
+		session_id = None
+		offset = 0
+
+		while not self._SubtaskStopNow:
+			try:
+				if not session_id:
+					session_id = self._dropbox.files_upload_session_start(chunk).session_id
+				else:
+					cursor = dropbox.files.UploadSessionCursor(session_id=session_id, offset=offset)
+					if not next_chunk:
+						commit = dropbox.files.CommitInfo(path=file_to, mode=mode, mute=True)
+						return self._dropbox.files_upload_session_finish(chunk, cursor, commit)
+					self._dropbox.files_upload_session_append_v2(chunk, cursor)
+			except dropbox.exceptions.ApiError as err:
+				# i.e.: chunk was committed but its response was lost, continue from the server's offset
+				correct_offset = self.session_correct_offset(err)
+				if correct_offset is None or not offset <= correct_offset <= offset + len(chunk):
+					raise
+				self.dropboxlogger.info("Upload session offset [{}] corrected to [{}]".format(
+					offset, correct_offset))
+				chunk = chunk[correct_offset - offset:]
+				offset = correct_offset
+				continue
+			except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+				retries += 1
+				if retries > num_retries:
+					raise
+				self.dropboxlogger.error("Upload session chunk at [{}] FAILED! Try # [{}] of [{}] retries [{}]".format(
+					offset, retries, num_retries, err))
+				self.sleep(short_wait)
+				continue
+
+			offset += len(chunk)
+			chunk, next_chunk = next_chunk, reader.read(self.UploadChunkSize)
+			retries = 0
+
+		return None
+
+	def session_correct_offset(self, err):
+		lookup = err.error
+		if hasattr(lookup, 'is_lookup_failed') and lookup.is_lookup_failed():
+			lookup = lookup.get_lookup_failed()
+		if hasattr(lookup, 'is_incorrect_offset') and lookup.is_incorrect_offset():
+			return lookup.get_incorrect_offset().correct_offset
+		return None
+
 	def upload_all_in_dir(self, upDir):
 		if not upDir or not os.path.exists(upDir):
 			return
@@ -323,6 +492,33 @@ class DropboxSubtask(BaseSubtask):
 			type=int,
 			help="Elapsed 'dead' time in milliseconds with NO Data before rest'ing Dropbox")
 
+		parser.add_argument(
+			'-conn', '--connection-mode',
+			dest='dropbox_connection_mode',
+			default=defaults.dropbox.ConnectionMode,
+			choices=['deadtime', 'persistent'],
+			help="deadtime = disconnect after dead time, persistent = stay connected with keepalives")
+
+		parser.add_argument(
+			'-keepalive', '--keepalive-secs',
+			dest='dropbox_keepalive_secs',
+			default=defaults.dropbox.KeepAliveSecs,
+			type=int,
+			help='Persistent mode: validate session after idle seconds')
+
+		parser.add_argument(
+			'-chunk', '--chunk-size',
+			dest='dropbox_chunk_size',
+			default=defaults.dropbox.UploadChunkSize,
+			type=int,
+			help='Files larger than chunk size (bytes) are streamed in chunks via an upload session')
+
+		parser.set_defaults(
+			transfer_concurrency=defaults.dropbox.TransferConcurrency,
+			budget_transactions=defaults.dropbox.BudgetTransactions,
+			budget_bytes=defaults.dropbox.BudgetBytes,
+			backlog_connections=defaults.dropbox.BacklogConnections)
+
 		return parser
 
 
@@ -331,6 +527,7 @@ def spawn_subtask():
 	subtask = DropboxSubtask(parser.parse_args())
 	subtask.dropboxlogger.info("***** HELLO!: [{}] *****".format(subtask._Description))
 	subtask.start()
+	subtask.wait()
 
 
 def main():
@@ -5,13 +5,27 @@
 # https://github.com/djacobson/pysubtask
 
 import os
+import shutil
+import posixpath
 import socket
 
 from . import defaults_config as defaults
-from .base import BaseTaskMaster, BaseSubtask
+from .base import BaseTaskMaster, BaseSubtask, LimitedReader, config_args
+from .delta import BlockManifest, SignatureReader, changed_blocks
 
 _SecretKey = '0987654321123456'
 
+# Subtask args for ftp_config settings, only passed when they differ from the defaults
+_FTPConfigArgs = (
+	('HostPort', '-port'),
+	('TransferConcurrency', '-tconc'),
+	('BudgetTransactions', '-btx'),
+	('BudgetBytes', '-bbytes'),
+	('BacklogConnections', '-bconn'),
+	('DeadTimeMilli', '-x'),
+	('ConnectionMode', '-conn'),
+	('KeepAliveSecs', '-keepalive'))
+
 
 ##############
 # FTP Master #
@@ -58,25 +72,26 @@ class FTPTaskMaster(BaseTaskMaster):
 			'-p', passwordEncrypted,
 			'-host', self.ftp_config.Host,
 			'-path', hostPath,
-			'-bakto', defaults.ftp.BakToFolder
+			'-bakto', defaults.ftp.BakToFolder,
+			'-stateto', self.ftp_config.StateFolder
 		]
+		self._state_folder = self.ftp_config.StateFolder
 		if self.ftp_config.UseSFTP:
 			self._subtaskArgs += ['-sftp']
 		# Only add these args if they differ from default config
-		if self.ftp_config.HostPort != defaults.ftp.HostPort:
-			self._subtaskArgs += ['-port', str(self.ftp_config.HostPort)]
-		if self.ftp_config.DeadTimeMilli != defaults.ftp.DeadTimeMilli:
-			self._subtaskArgs += ['-x', str(self.ftp_config.DeadTimeMilli)]
+		self._subtaskArgs += config_args(self.ftp_config, defaults.ftp, _FTPConfigArgs)
 
-	def start(self, precleanup_old_files=False):
+	def start(self, precleanup_old_files=False, housekeeping_done=None):
 		if precleanup_old_files:
 			# Pre-archive old data & pre-copy and upload previous residual data, then Start
-			super().start(
+			# (base.HousekeepingBackground: Archive, Start, while pre-copying in the background)
+			return super().start(
 				prearchive_expired_files_to_folder=defaults.base.ArchiveToFolder,
-				precopy_files_to_folder=self.ftp_config.BakToFolder)
+				precopy_files_to_folder=self.ftp_config.BakToFolder,
+				housekeeping_done=housekeeping_done)
 		else:
 			# Just Start
-			super().start()
+			return super().start()
 
 	def stop(self, **kwargs):
 		super().stop(defaults.ftp.SubtaskDescription, **kwargs)
@@ -91,6 +106,14 @@ class FTPSubtask(BaseSubtask):
 	_Description = defaults.ftp.SubtaskDescription
 	ftplogger = None
 
+	# Connections are per connection slot (primary, or pooled in asyncio runtime mode)
+	_sftp = property(
+		lambda self: self.get_conn('sftp'),
+		lambda self, value: self.set_conn('sftp', value))
+	_ftp = property(
+		lambda self: self.get_conn('ftp'),
+		lambda self, value: self.set_conn('ftp', value))
+
 	def __init__(
 		self,
 		args,
@@ -122,6 +145,8 @@ class FTPSubtask(BaseSubtask):
 				self._HostPort = 21
 		self._HostPath = args.ftp_path
 		self.DeadTimeMilli = args.ftp_dead_time_milli
+		self.ConnectionMode = args.ftp_connection_mode
+		self.KeepAliveSecs = args.ftp_keepalive_secs
 
 	def start(self):
 		self.connect(True)  # connect before starting timers ( super().start() )
@@ -132,6 +157,10 @@ class FTPSubtask(BaseSubtask):
 			return
 
 		# S/FTP Subtask Timer: called every interval.
+		if self.ConnectionMode == 'persistent':
+			self.keepalive()
+			return
+
 		deadTime = self.dead_time()
 		if deadTime and deadTime > self.DeadTimeMilli:
 			if self.is_connected():
@@ -139,17 +168,25 @@ class FTPSubtask(BaseSubtask):
 					self.DeadTimeMilli / 1000))
 				self.disconnect()
 
+	def process_backlog(self):
+		if not self.Enabled:
+			return
+		self.start_backlog(self._bakToFullPath, self.upload_file, self.disconnect, clearFiles=True)
+
+	def process_metrics(self):
+		self.metric_connected.set(1 if self.is_connected() else 0)
+
 	def process_notify(self, psWatchFile):
 		if not self.Enabled:
 			return
 
 		# S/FTP Subtask Notified!: New data ready
-		if not self.is_connected():
+		if not self.connection_alive():
 			self.connect()
 
 		if not self.upload_file(psWatchFile):
 			if self._SubtaskStopNow:
-				return
+				return False
 			self.ftplogger.error("Upload, attempting reconnect.")
 
 			# Attempt reconnect loop process ONCE
@@ -157,20 +194,22 @@ class FTPSubtask(BaseSubtask):
 				self.connect()
 				if not self.is_connected():
 					self.ftplogger.error("Upload FAIL'ed to reconnect!")
-					return
+					return False
 				else:
 					# Successfully reconnected!
 					# Try to upload one more time
 					if self._SubtaskStopNow:
-						return
-					self.upload_file(psWatchFile)
+						return False
+					return self.upload_file(psWatchFile)
+			return False
+		return True
 
 	def process_heartbeat(self, hb_filename):
 		if not self.Enabled:
 			return
 
 		# Subtask Heartbeat due!
-		if not self.is_connected():
+		if not self.connection_alive():
 			self.connect()
 
 		self.upload_file(hb_filename, False)  # heartbeat does not need retry or logging
@@ -179,7 +218,10 @@ class FTPSubtask(BaseSubtask):
 		# Cycle infinitely until connected
 
 		# make sure BaseSubtask timer is STOP'ed until connected
-		self._IgnoreTimer = True
+		# (pooled connections reconnect without stopping detection)
+		pooled = self.is_pooled_thread()
+		if not pooled:
+			self._IgnoreTimer = True
 
 		num_retries = 5
 		short_wait = 3  # secs
@@ -187,20 +229,7 @@ class FTPSubtask(BaseSubtask):
 		connectSuccess = False
 
 		while not connectSuccess and not self._SubtaskStopNow:
-			for i in range(num_retries):
-				if self._SubtaskStopNow:
-					break
-
-				connectSuccess = self.connect_once(retries=num_retries)
-
-				if connectSuccess:
-					break
-				else:
-					self.ftplogger.error("CONNECT attempt FAILED! Try # [{}] of [{}] retries".format(i + 1, num_retries))
-					if (i + 1) < num_retries:
-						self.ftplogger.info("Waiting [{}] secs before next try...".format(short_wait))
-						self.sleep(short_wait)
-
+			connectSuccess = self.connect_round(num_retries, short_wait)
 			if not connectSuccess:
 				self.ftplogger.error("Repeated CONNECT FAILURE!")
 				self.ftplogger.info("LONGER Wait [{}] secs before next try...".format(long_wait))
@@ -208,9 +237,29 @@ class FTPSubtask(BaseSubtask):
 
 		if connectSuccess and not self._SubtaskStopNow:
 			if uploadAllFilesFirst:
-				self.upload_all_in_dir(self._bakToFullPath, clearFiles=True)
+				self.start_backlog(self._bakToFullPath, self.upload_file, self.disconnect, clearFiles=True)
 
-		self._IgnoreTimer = False
+		if not pooled:
+			self._IgnoreTimer = False
+
+	def connect_round(self, num_retries, short_wait):
+		# Up to num_retries connect attempts, short_wait secs apart, True if connected
+		for i in range(num_retries):
+			if self._SubtaskStopNow:
+				return False
+
+			with self.trace_span('ftp.connect', attempt=i + 1):
+				connectSuccess = self.connect_once(retries=num_retries)
+			if connectSuccess:
+				self.metric_connects.inc()
+				return True
+
+			self.metric_connect_failures.inc()
+			self.ftplogger.error("CONNECT attempt FAILED! Try # [{}] of [{}] retries".format(i + 1, num_retries))
+			if (i + 1) < num_retries:
+				self.ftplogger.info("Waiting [{}] secs before next try...".format(short_wait))
+				self.sleep(short_wait)
+		return False
 
 	def connect_once(self, retries=0):
 		if self.is_connected():
@@ -257,7 +306,8 @@ class FTPSubtask(BaseSubtask):
 				# private_key_pass=private_key_password,
 				cnopts=cnopts)
 			# sftp.timeout = SOCKET_TIMEOUT
-			# srv._transport.set_keepalive(30)
+			if self.ConnectionMode == 'persistent':
+				self.sftp_transport().set_keepalive(self.KeepAliveSecs)
 
 		except Exception as e:
 			self.ftplogger.error("SFTP: Host or Authentication [{}]".format(e))
@@ -265,6 +315,7 @@ class FTPSubtask(BaseSubtask):
 			return False
 		else:
 			self.ftplogger.info("SFTP: Success! Connected to [{}]".format(self._Host))
+			self.touch_conn()
 
 		if self._sftp:
 			if self._HostPath and len(self._HostPath.strip()) > 0:
@@ -286,7 +337,8 @@ class FTPSubtask(BaseSubtask):
 		try:
 			if self._HostPort != 21:
 				ftptimeout = 15  # secs
-				self._ftp = FTP.connect(self._Host, self._HostPort, ftptimeout)
+				self._ftp = FTP()
+				self._ftp.connect(self._Host, self._HostPort, ftptimeout)
 			else:
 				self._ftp = FTP(self._Host)
 		except Exception:
@@ -303,6 +355,7 @@ class FTPSubtask(BaseSubtask):
 			return False
 		else:
 			self.ftplogger.info("FTP: Success! Connected to [{}]".format(self._Host))
+			self.touch_conn()
 
 		if self._ftp:
 			if self._HostPath and len(self._HostPath.strip()) > 0:
@@ -330,6 +383,48 @@ class FTPSubtask(BaseSubtask):
 			else:
 				return False
 
+	def sftp_transport(self):
+		return self._sftp.sftp_client.get_channel().get_transport()
+
+	def connection_alive(self):
+		# Persistent mode: validate an idle connection before use, else (dead time mode) same as is_connected()
+		if not self.is_connected():
+			return False
+		if self.ConnectionMode != 'persistent':
+			return True
+		if self._useSFTP:
+			# SSH transport keepalives run in the background, a dead transport is no longer active
+			alive = self.sftp_transport().is_active()
+		elif self.conn_idle_secs() < self.KeepAliveSecs:
+			return True
+		else:
+			alive = self.send_noop()
+		if not alive:
+			self.ftplogger.error("Connection lost while idle, reconnecting.")
+			self.disconnect()
+		return alive
+
+	def keepalive(self):
+		# Persistent mode, every interval: FTP NOOP once idle for KeepAliveSecs
+		if not self.is_connected():
+			return
+		if self._useSFTP:
+			if not self.sftp_transport().is_active():
+				self.ftplogger.error("SFTP: Keepalive, transport closed, reconnect on next upload.")
+				self.disconnect()
+		elif self.conn_idle_secs() >= self.KeepAliveSecs:
+			if not self.send_noop():
+				self.ftplogger.error("FTP: Keepalive NOOP failed, reconnect on next upload.")
+				self.disconnect()
+
+	def send_noop(self):
+		try:
+			self._ftp.voidcmd('NOOP')
+		except Exception:
+			return False
+		self.touch_conn()
+		return True
+
 	def isHostOpen(self, iphost, port, retries=0):
 		for i in range(retries + 1):
 			connectSuccess = False
@@ -359,7 +454,7 @@ class FTPSubtask(BaseSubtask):
 			self.ftplogger.info("SFTP DISCONNECT!")
 			try:
 				self._sftp.close()
-			except Exception as e:
+			except Exception:
 				pass
 			self._sftp = None
 
@@ -367,7 +462,7 @@ class FTPSubtask(BaseSubtask):
 			self.ftplogger.info("FTP DISCONNECT!")
 			try:
 				self._ftp.quit()
-			except Exception as e:
+			except Exception:
 				pass
 			self._ftp = None
 
@@ -376,7 +471,7 @@ class FTPSubtask(BaseSubtask):
 		# Upload all files one final time
 		if self.is_connected():
 			self.upload_all_in_dir(self._bakToFullPath)
-		self.disconnect()
+		self.each_conn_slot(self.disconnect)
 
 	def upload_file(self, upFile, logSuccess=True):
 		# Check if upFile exists first
@@ -384,40 +479,136 @@ class FTPSubtask(BaseSubtask):
 			self.ftplogger.error("Upload file [{}] does not exist!".format(upFile))
 			return False
 
+		# Skip content the server already has (no reconnect needed)
+		size = self.upload_size(upFile)
+		remote = self.upload_remote(upFile)
+		if self.upload_unchanged(upFile, remote, size):
+			if logSuccess:
+				self.ftplogger.info("Upload Data File: [{}] unchanged, skipped.".format(upFile))
+			return True
+		stamp = self.upload_started(upFile)
+
 		# Check if we need to reconnect
 		if not self.is_connected():
 			self.connect()
 			if not self.is_connected():
 				return False
 
-		upname = os.path.basename(upFile)
-		logmsg = "FTP Upload Data File: [{}]".format(os.path.join(self._HostPath, upname))
-
+		upname = self.upload_name(upFile)
 		if self._useSFTP and self._sftp:
-			try:
-				# ** Transfer the file using SFTP
-				self._sftp.put(upFile, preserve_mtime=True)
-			except Exception as e:
-				self.ftplogger.error("SFTP Upload Data File: [{}]".format(e))
-				self.disconnect()
-				return False
-			else:
-				logmsg = 'S' + logmsg
-				self.log_upload_success(logmsg, logSuccess)
-				return True
+			protocol, transfer = 'SFTP', self.upload_file_sftp
 		elif self._ftp:
-			try:
-				# ** Transfer the file using FTP
-				self._ftp.storbinary('STOR ' + upname, open(upFile, 'rb'))
-			except Exception as e:
-				self.ftplogger.error("FTP Upload Data File: [{}]".format(e))
-				self.disconnect()
-				return False
-			else:
-				self.log_upload_success(logmsg, logSuccess)
-				return True
+			protocol, transfer = 'FTP', self.upload_file_ftp
+		else:
+			return False
+
+		try:
+			# ** Transfer the file using SFTP / FTP
+			with self.trace_span('{}.transfer'.format(protocol.lower()), bytes=size):
+				transfer(upFile, upname)
+		except Exception as e:
+			self.ftplogger.error("{} Upload Data File: [{}]".format(protocol, e))
+			self.disconnect()
+			return False
+		logmsg = "{} Upload Data File: [{}]".format(protocol, os.path.join(self._HostPath, upname))
+		self.log_upload_success(logmsg, logSuccess)
+		self.upload_recorded(upFile, remote, size, stamp)
+		return True
+
+	def upload_remote(self, upFile):
+		return '{}://{}:{}/{}'.format(
+			'sftp' if self._useSFTP else 'ftp',
+			self._Host,
+			self._HostPort,
+			posixpath.join(self._HostPath, self.upload_name(upFile)).lstrip('/'))
+
+	def upload_file_sftp(self, upFile, upname):
+		size = self.upload_size(upFile)
+		if self.is_append_only(upFile):
+			offset = self.get_append_offset(upFile, self.remote_size_sftp(upname))
+			if offset is not None:
+				# Append only the new bytes since the last transfer
+				if size > offset:
+					with open(upFile, 'rb') as f:
+						f.seek(offset)
+						with self._sftp.open(upname, 'ab') as rf:
+							rf.seek(offset)  # in case server ignores the append flag
+							shutil.copyfileobj(LimitedReader(f, size - offset), rf)
+					stat = os.stat(upFile)
+					self._sftp.sftp_client.utime(upname, (stat.st_atime, stat.st_mtime))
+				self.set_append_offset(upFile, size)
+				return
+		elif self.is_delta(upFile):
+			manifest = self.get_delta_manifest(upFile, self.remote_size_sftp(upname))
+			if manifest is not None:
+				self.upload_delta_sftp(upFile, upname, size, manifest)
+				return
+
+		# Full upload, signed into a new manifest for delta files
+		manifest = self.new_delta_manifest(upFile)
+		self.set_delta_manifest(upFile, None)
+		with open(upFile, 'rb') as f:
+			reader = self.upload_reader(f, upFile, size)
+			if manifest:
+				reader = SignatureReader(reader, manifest)
+			self._sftp.putfo(reader, upname, file_size=size)
+		stat = os.stat(upFile)
+		self._sftp.sftp_client.utime(upname, (stat.st_atime, stat.st_mtime))
+		self.set_append_offset(upFile, size)
+		self.set_delta_manifest(upFile, manifest)
+
+	def upload_delta_sftp(self, upFile, upname, size, manifest):
+		# Write only the blocks changed since the last upload, at their offsets
+		newManifest = BlockManifest(manifest.block_size)
+		sent = 0
+		self.set_delta_manifest(upFile, None)  # remote is mixed until done, full upload if interrupted
+		with open(upFile, 'rb') as f:
+			with self._sftp.open(upname, 'r+b') as rf:
+				rf.set_pipelined(True)
+				for offset, data in changed_blocks(LimitedReader(f, size), manifest, newManifest):
+					rf.seek(offset)
+					rf.write(data)
+					sent += len(data)
+				if size < manifest.size:
+					rf.truncate(size)
+		stat = os.stat(upFile)
+		self._sftp.sftp_client.utime(upname, (stat.st_atime, stat.st_mtime))
+		self.set_delta_manifest(upFile, newManifest)
+		self.ftplogger.info("SFTP Delta: [{}] sent [{}] of [{}] bytes.".format(upname, sent, size))
+
+	def remote_size_sftp(self, upname):
+		try:
+			return self._sftp.stat(upname).st_size
+		except IOError:
+			return None
+
+	def upload_file_ftp(self, upFile, upname):
+		size = self.upload_size(upFile)
+		with open(upFile, 'rb') as f:
+			if self.is_append_only(upFile):
+				offset = self.get_append_offset(upFile, self.remote_size_ftp(upname))
+				if offset is not None:
+					# Append only the new bytes since the last transfer
+					if size > offset:
+						f.seek(offset)
+						self._ftp.storbinary('APPE ' + upname, LimitedReader(f, size - offset))
+					self.set_append_offset(upFile, size)
+					return
+
+			self._ftp.storbinary('STOR ' + upname, self.upload_reader(f, upFile, size))
+		self.set_append_offset(upFile, size)
+
+	def remote_size_ftp(self, upname):
+		from ftplib import error_perm
+
+		try:
+			self._ftp.voidcmd('TYPE I')  # SIZE requires binary mode on most servers
+			return self._ftp.size(upname)
+		except error_perm:
+			return None
 
 	def log_upload_success(self, logmsg, logSuccess=True):
+		self.touch_conn()
 		if logSuccess:
 			self.ftplogger.info(logmsg)
 
@@ -475,12 +666,32 @@ class FTPSubtask(BaseSubtask):
 			type=int,
 			help="Elapsed 'dead' time in milliseconds with NO Data before rest'ing FTP")
 
+		parser.add_argument(
+			'-conn', '--connection-mode',
+			dest='ftp_connection_mode',
+			default=defaults.ftp.ConnectionMode,
+			choices=['deadtime', 'persistent'],
+			help="deadtime = disconnect after dead time, persistent = stay connected with keepalives")
+
+		parser.add_argument(
+			'-keepalive', '--keepalive-secs',
+			dest='ftp_keepalive_secs',
+			default=defaults.ftp.KeepAliveSecs,
+			type=int,
+			help='Persistent mode: SSH keepalive / FTP NOOP interval in seconds')
+
 		parser.add_argument(
 			'-sftp', '--sftp',
 			dest='use_sftp',
 			action='store_true',
 			help='Use SFTP, else (if not included), use regular FTP')
 
+		parser.set_defaults(
+			transfer_concurrency=defaults.ftp.TransferConcurrency,
+			budget_transactions=defaults.ftp.BudgetTransactions,
+			budget_bytes=defaults.ftp.BudgetBytes,
+			backlog_connections=defaults.ftp.BacklogConnections)
+
 		return parser
 
 
@@ -489,6 +700,7 @@ def spawn_subtask():
 	subtask = FTPSubtask(parser.parse_args())
 	subtask.ftplogger.info("***** HELLO!: [{}] *****".format(subtask._Description))
 	subtask.start()
+	subtask.wait()
 
 
 def main():
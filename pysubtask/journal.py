@@ -0,0 +1,95 @@
+#
+# Script: pysubtask.journal.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Upload journal: append-only JSON lines of the subtask's upload events per file, keyed by
+# its path relative to the first watch file folder (journal_key), 'notify' -> 'snapshot' ->
+# 'done', with the file size (offset) and mtime of each. 'done' events are fsynced.
+#
+# On start, the master only re-copies (residual) files whose last event is not a 'done'
+# of their current size + mtime, so recovery scales with the unsent data. A lost or torn
+# last line (i.e.: crash) only costs a re-upload. Compacted (last event per key) on
+# subtask start and every _CompactEveryEvents appended events.
+
+import os
+import json
+import time
+import threading
+
+_CompactEveryEvents = 10000
+
+
+class UploadJournal():
+
+	def __init__(self, filename, compact_every=_CompactEveryEvents):
+		self.filename = filename
+		self.compact_every = compact_every
+		self._lock = threading.Lock()
+		self._file = None
+		self._appended = 0  # Events since the last compact
+
+	def append(self, event, name, size, mtime_ns=None, fsync=False):
+		line = json.dumps({'e': event, 'n': name, 's': size, 'm': mtime_ns, 't': round(time.time(), 3)})
+		with self._lock:
+			if not self._file:
+				self._file = open(self.filename, 'a')
+			self._file.write(line + '\n')
+			self._file.flush()
+			if fsync:
+				os.fsync(self._file.fileno())
+			self._appended += 1
+			due = self.compact_every and self._appended >= self.compact_every
+		if due:
+			self.compact()
+
+	def compact(self):
+		# Rewrite the journal as the last event per name (write temp + rename)
+		with self._lock:
+			self.close_file()
+			self._appended = 0
+			entries = load_journal(self.filename)
+			tmpname = '{}.tmp'.format(self.filename)
+			with open(tmpname, 'w') as f:
+				for entry in entries.values():
+					f.write(json.dumps(entry) + '\n')
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmpname, self.filename)
+		return len(entries)
+
+	def close(self):
+		with self._lock:
+			self.close_file()
+
+	def close_file(self):
+		if self._file:
+			self._file.close()
+			self._file = None
+
+
+def load_journal(filename):
+	# Last event per name, {} if no journal
+	entries = {}
+	if not filename or not os.path.exists(filename):
+		return entries
+	with open(filename, 'r') as f:
+		for line in f:
+			try:
+				entry = json.loads(line)
+				entries[entry['n']] = entry
+			except (ValueError, KeyError, TypeError):
+				continue  # torn / corrupt line (i.e.: crash mid write)
+	return entries
+
+
+def journal_key(path, root):
+	# Journal name of path: relative to root (first watch file folder), '/' separated
+	return os.path.relpath(path, root or os.curdir).replace(os.sep, '/')
+
+
+def is_uploaded(entry, stat):
+	# Journal entry records an upload of the file's current content (size + mtime)
+	if entry is None or entry['e'] != 'done':
+		return False
+	return entry['s'] == stat.st_size and entry['m'] == stat.st_mtime_ns
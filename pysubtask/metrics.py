@@ -0,0 +1,190 @@
+#
+# Script: pysubtask.metrics.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Subtask metrics registry: counters, gauges and histograms (optionally labelled, i.e.:
+# per watch file), rendered in the Prometheus text exposition format. Exported by the
+# subtask every base.MetricsIntervalSecs to an atomically replaced file (i.e.: for the
+# node_exporter textfile collector), and optionally served on a local HTTP endpoint.
+
+import os
+import bisect
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+# Secs, notify -> upload lag up to minutes (i.e.: burst mode, reconnects)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def format_labels(labelnames, labelvalues, extra=None):
+	pairs = list(zip(labelnames, labelvalues))
+	if extra:
+		pairs.append(extra)
+	if not pairs:
+		return ''
+	return '{{{}}}'.format(','.join('{}="{}"'.format(name, escape_label(value)) for name, value in pairs))
+
+
+def escape_label(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+	if value == float('inf'):
+		return '+Inf'
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	return repr(value)
+
+
+class Metric():
+
+	kind = 'untyped'
+
+	def __init__(self, name, help, labelnames=()):
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self._lock = threading.Lock()
+		self._values = {}  # label values tuple -> value
+
+	def render(self):
+		lines = [
+			'# HELP {} {}'.format(self.name, self.help),
+			'# TYPE {} {}'.format(self.name, self.kind)]
+		with self._lock:
+			values = sorted(self._values.items())
+		for labelvalues, value in values:
+			lines.append('{}{} {}'.format(self.name, format_labels(self.labelnames, labelvalues), format_value(value)))
+		return lines
+
+
+class Counter(Metric):
+
+	kind = 'counter'
+
+	def inc(self, amount=1, *labelvalues):
+		with self._lock:
+			self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+	def value(self, *labelvalues):
+		with self._lock:
+			return self._values.get(labelvalues, 0)
+
+
+class Gauge(Metric):
+
+	kind = 'gauge'
+
+	def set(self, value, *labelvalues):
+		with self._lock:
+			self._values[labelvalues] = value
+
+	def value(self, *labelvalues):
+		with self._lock:
+			return self._values.get(labelvalues)
+
+	def remove(self, *labelvalues):
+		with self._lock:
+			self._values.pop(labelvalues, None)
+
+
+class Histogram(Metric):
+
+	kind = 'histogram'
+
+	def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+		super().__init__(name, help, labelnames)
+		self.buckets = tuple(sorted(buckets))
+
+	def observe(self, value, *labelvalues):
+		with self._lock:
+			series = self._values.get(labelvalues)
+			if series is None:
+				# Per bucket (non-cumulative) counts, + Inf, sum
+				series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+			series[0][bisect.bisect_left(self.buckets, value)] += 1
+			series[1] += value
+
+	def count(self, *labelvalues):
+		with self._lock:
+			series = self._values.get(labelvalues)
+			return sum(series[0]) if series else 0
+
+	def render(self):
+		lines = [
+			'# HELP {} {}'.format(self.name, self.help),
+			'# TYPE {} {}'.format(self.name, self.kind)]
+		with self._lock:
+			values = sorted((labelvalues, (list(counts), total)) for labelvalues, (counts, total) in self._values.items())
+		for labelvalues, (counts, total) in values:
+			cumulative = 0
+			for bound, count in zip(self.buckets + (float('inf'),), counts):
+				cumulative += count
+				lines.append('{}_bucket{} {}'.format(
+					self.name, format_labels(self.labelnames, labelvalues, ('le', format_value(float(bound)))), cumulative))
+			labels = format_labels(self.labelnames, labelvalues)
+			lines.append('{}_sum{} {}'.format(self.name, labels, format_value(total)))
+			lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+		return lines
+
+
+class MetricsRegistry():
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._metrics = {}  # name -> Metric, in registration order
+
+	def register(self, metric):
+		# Registered metric of the same name if any (i.e.: base + extension), else metric
+		with self._lock:
+			return self._metrics.setdefault(metric.name, metric)
+
+	def counter(self, name, help, labelnames=()):
+		return self.register(Counter(name, help, labelnames))
+
+	def gauge(self, name, help, labelnames=()):
+		return self.register(Gauge(name, help, labelnames))
+
+	def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+		return self.register(Histogram(name, help, labelnames, buckets))
+
+	def render(self):
+		with self._lock:
+			metrics = list(self._metrics.values())
+		lines = []
+		for metric in metrics:
+			lines.extend(metric.render())
+		return '\n'.join(lines) + '\n'
+
+	def write(self, filename):
+		# Atomically replace filename (write temp + rename), readers never see a partial file
+		tmpname = '{}.tmp'.format(filename)
+		with open(tmpname, 'w') as f:
+			f.write(self.render())
+		os.replace(tmpname, filename)
+
+	def serve(self, port, host='127.0.0.1'):
+		# Serve GET /metrics on a daemon thread, return the server (shutdown() to stop)
+		registry = self
+
+		class MetricsHandler(BaseHTTPRequestHandler):
+
+			def do_GET(self):
+				if self.path.split('?')[0] not in ('/', '/metrics'):
+					self.send_error(404)
+					return
+				content = registry.render().encode('utf8')
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+				self.send_header('Content-Length', str(len(content)))
+				self.end_headers()
+				self.wfile.write(content)
+
+			def log_message(self, format, *args):
+				pass
+
+		server = HTTPServer((host, port), MetricsHandler)
+		threading.Thread(target=server.serve_forever, name='Metrics', daemon=True).start()
+		return server
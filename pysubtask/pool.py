@@ -0,0 +1,68 @@
+#
+# Script: pysubtask.pool.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Connection slots for BaseSubtask extensions doing concurrent transfers.
+#
+# A slot is a dict of connection objects (i.e.: {'ftp': FTP(), 'sftp': None}).
+# While a slot is checked out, it is bound to the current thread, so the extension's
+# connection attributes (BaseSubtask.get_conn / set_conn) resolve to that slot.
+# Threads without a bound slot use the primary connection slot (slot 0).
+
+import queue
+from contextlib import contextmanager
+
+
+class ConnectionPool():
+
+	def __init__(self, size, primary_slot=None):
+		self.size = max(1, size)
+		self._slots = []
+		self._idle = queue.Queue()
+		for i in range(self.size):
+			if i == 0 and primary_slot is not None:
+				slot = primary_slot
+			else:
+				slot = {}
+			self._slots.append(slot)
+			self._idle.put(slot)
+
+	@contextmanager
+	def checkout(self, subtask, timeout=None):
+		# Blocks until a slot is idle
+		slot = self._idle.get(timeout=timeout)
+		subtask.bind_conns(slot)
+		try:
+			yield slot
+		finally:
+			subtask.unbind_conns()
+			self._idle.put(slot)
+
+	def each_idle(self, subtask, func, *args):
+		# Call func for each currently idle slot (i.e.: dead time checks), skip busy ones
+		taken = []
+		try:
+			while True:
+				taken.append(self._idle.get_nowait())
+		except queue.Empty:
+			pass
+		try:
+			for slot in taken:
+				subtask.bind_conns(slot)
+				try:
+					func(*args)
+				finally:
+					subtask.unbind_conns()
+		finally:
+			for slot in taken:
+				self._idle.put(slot)
+
+	def each(self, subtask, func, *args):
+		# Call func for every slot, busy or not (i.e.: final disconnect once workers have stopped)
+		for slot in self._slots:
+			subtask.bind_conns(slot)
+			try:
+				func(*args)
+			finally:
+				subtask.unbind_conns()
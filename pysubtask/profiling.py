@@ -0,0 +1,162 @@
+#
+# Script: pysubtask.profiling.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# On-demand subtask profiling (SIGUSR1 or the subtask's .profile control file), without
+# restarting it. While on, per-phase timers (poll, file / dir checks, heartbeat, uploads)
+# and one of:
+#
+# 'cprofile' = cProfile of the scheduler thread (detection + uploads, 'thread' runtime),
+#              dumped as a .prof file (pstats, snakeviz, etc.) + top functions in the .txt
+# 'sample'   = stack sampler of all threads every _SampleIntervalSecs (low overhead,
+#              'asyncio' runtime transfers, backlog threads), dumped as collapsed stacks
+#              (.folded: flamegraph.pl, speedscope)
+#
+# Dumped to the log folder when turned off (or on subtask stop).
+
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import functools
+import threading
+from collections import Counter
+from datetime import datetime
+
+PROFILE_MODES = ('cprofile', 'sample')
+_SampleIntervalSecs = 0.01
+_TopFunctions = 40
+
+
+def profiled_phase(name):
+	# Decorator: time the method as phase name while profiling (instance ._profiler)
+	def decorate(func):
+		@functools.wraps(func)
+		def wrapper(self, *args, **kwargs):
+			profiler = self._profiler
+			if not profiler.active:
+				return func(self, *args, **kwargs)
+			start = time.perf_counter()
+			try:
+				return func(self, *args, **kwargs)
+			finally:
+				profiler.add_phase(name, time.perf_counter() - start)
+		return wrapper
+	return decorate
+
+
+class StackSampler():
+
+	def __init__(self, interval=_SampleIntervalSecs):
+		self.interval = interval
+		self.samples = 0
+		self._stacks = Counter()  # 'thread;outer;...;inner' -> samples
+		self._stop = threading.Event()
+		self._thread = None
+
+	def start(self):
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._run, name='ProfileSampler', daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stop.set()
+		if self._thread and self._thread is not threading.current_thread():
+			self._thread.join()
+
+	def _run(self):
+		own = threading.get_ident()
+		while not self._stop.wait(self.interval):
+			names = dict((t.ident, t.name) for t in threading.enumerate())
+			for ident, frame in sys._current_frames().items():
+				if ident == own:
+					continue
+				stack = []
+				while frame is not None:
+					code = frame.f_code
+					stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+					frame = frame.f_back
+				stack.append(names.get(ident, str(ident)))
+				self._stacks[';'.join(reversed(stack))] += 1
+			self.samples += 1
+
+	def dump(self, filename):
+		with open(filename, 'w') as f:
+			for stack, count in self._stacks.most_common():
+				f.write('{} {}\n'.format(stack, count))
+
+
+class Profiler():
+
+	def __init__(self, mode='cprofile'):
+		self.mode = mode
+		self.active = False
+		self._lock = threading.Lock()
+		self._phases = {}  # name -> [calls, total secs, max secs]
+		self._profile = None
+		self._sampler = None
+		self._start_time = None
+
+	def start(self):
+		# cProfile mode: call from the thread to profile
+		self._phases = {}
+		self._start_time = time.time()
+		if self.mode == 'sample':
+			self._sampler = StackSampler()
+			self._sampler.start()
+		else:
+			self._profile = cProfile.Profile()
+			self._profile.enable()
+		self.active = True
+
+	def stop(self, folder, prefix):
+		# Dump stats to folder, return the files written
+		self.active = False
+		stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+		basename = os.path.join(folder, '{}_{}_{}'.format(prefix, os.getpid(), stamp))
+		if not os.path.exists(folder):
+			os.makedirs(folder, exist_ok=True)
+		files = []
+		report = self.phase_report()
+		if self._profile:
+			self._profile.disable()
+			self._profile.dump_stats(basename + '.prof')
+			files.append(basename + '.prof')
+			out = io.StringIO()
+			pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(_TopFunctions)
+			report += '\n' + out.getvalue()
+			self._profile = None
+		if self._sampler:
+			self._sampler.stop()
+			self._sampler.dump(basename + '.folded')
+			files.append(basename + '.folded')
+			report += '\n{} samples every [{}] secs\n'.format(self._sampler.samples, self._sampler.interval)
+			self._sampler = None
+		with open(basename + '.txt', 'w') as f:
+			f.write(report)
+		files.append(basename + '.txt')
+		return files
+
+	def add_phase(self, name, secs):
+		with self._lock:
+			phase = self._phases.get(name)
+			if phase is None:
+				phase = self._phases[name] = [0, 0.0, 0.0]
+			phase[0] += 1
+			phase[1] += secs
+			phase[2] = max(phase[2], secs)
+
+	def phase_report(self):
+		with self._lock:
+			phases = sorted(self._phases.items(), key=lambda item: -item[1][1])
+		lines = [
+			'Profiled [{:.1f}] secs, mode [{}]'.format(time.time() - (self._start_time or time.time()), self.mode),
+			'',
+			'{:<16} {:>8} {:>12} {:>10} {:>10}'.format('phase', 'calls', 'total secs', 'mean ms', 'max ms')]
+		for name, (calls, total, longest) in phases:
+			lines.append('{:<16} {:>8} {:>12.3f} {:>10.3f} {:>10.3f}'.format(
+				name, calls, total, total * 1000.0 / calls, longest * 1000.0))
+		return '\n'.join(lines) + '\n'
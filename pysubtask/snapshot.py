@@ -0,0 +1,90 @@
+#
+# Script: pysubtask.snapshot.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Snapshot strategies for BaseSubtask BakToFolder staging copies:
+#
+# 'reflink'         = FICLONE ioctl, copy-on-write clone, no data written (i.e.: btrfs, xfs)
+# 'copy_file_range' = in-kernel copy, no user space buffers (Linux, Python 3.8+)
+# 'copy'            = shutil.copy2 (portable)
+# 'auto'            = best of the above, probed on the BakToFolder filesystem at startup
+
+import os
+import errno
+import shutil
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None  # Windows
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int)
+
+SNAPSHOT_MODES = ('reflink', 'copy_file_range', 'copy')
+
+
+def reflink_file(fromFile, toFile):
+	with open(fromFile, 'rb') as src, open(toFile, 'wb') as dst:
+		fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def copy_file_range_file(fromFile, toFile):
+	with open(fromFile, 'rb') as src, open(toFile, 'wb') as dst:
+		remaining = os.fstat(src.fileno()).st_size
+		while remaining > 0:
+			copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+			if copied == 0:
+				break  # file shrunk while copying
+			remaining -= copied
+		# File grew while copying, copy the rest too (same result as copy2)
+		while os.copy_file_range(src.fileno(), dst.fileno(), 1 << 20) > 0:
+			pass
+
+
+def snapshot_file(mode, fromFile, toFile):
+	# Copy fromFile to toFile with mode, keeping copy2 metadata (mtime, etc.)
+	if mode == 'reflink':
+		reflink_file(fromFile, toFile)
+	elif mode == 'copy_file_range':
+		copy_file_range_file(fromFile, toFile)
+	else:
+		shutil.copy2(fromFile, toFile)
+		return
+	shutil.copystat(fromFile, toFile)
+
+
+def probe_snapshot_mode(folder, logger=None):
+	# Return the best snapshot mode supported between files in folder
+	probeFrom = os.path.join(folder, '.snapshot_probe')
+	probeTo = os.path.join(folder, '.snapshot_probe.to')
+	candidates = []
+	if fcntl is not None:
+		candidates.append('reflink')
+	if hasattr(os, 'copy_file_range'):
+		candidates.append('copy_file_range')
+
+	mode = 'copy'
+	try:
+		with open(probeFrom, 'wb') as f:
+			f.write(b'pysubtask snapshot probe\n' * 16)
+		for candidate in candidates:
+			try:
+				snapshot_file(candidate, probeFrom, probeTo)
+				with open(probeFrom, 'rb') as a, open(probeTo, 'rb') as b:
+					if a.read() != b.read():
+						continue
+			except OSError as e:
+				# i.e.: EOPNOTSUPP / EINVAL (no reflink support), EXDEV, ENOSYS
+				if logger and e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.EXDEV, errno.ENOSYS, errno.ENOTTY):
+					logger.error("Snapshot: Probe [{}] failed [{}]".format(candidate, e))
+				continue
+			mode = candidate
+			break
+	finally:
+		for probe in (probeFrom, probeTo):
+			try:
+				os.remove(probe)
+			except OSError:
+				pass
+	return mode
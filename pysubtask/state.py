@@ -0,0 +1,71 @@
+#
+# Script: pysubtask.state.py Module
+#
+# https://github.com/djacobson/pysubtask
+
+import os
+import json
+import threading
+
+
+class StateFile():
+	"""A small JSON backed dict, persisted atomically (write temp + rename) on every change."""
+
+	def __init__(self, filename, fsync=True):
+		self.filename = filename
+		self.fsync = fsync  # False = not crash durable (i.e.: caches, a lost change only costs work)
+		self._lock = threading.Lock()
+		self._data = self.load()
+
+	def load(self):
+		if not self.filename or not os.path.exists(self.filename):
+			return {}
+		try:
+			with open(self.filename, 'r') as f:
+				data = json.load(f)
+		except (OSError, ValueError):
+			# Corrupt or unreadable state is treated as empty (i.e.: full uploads)
+			return {}
+		if not isinstance(data, dict):
+			return {}
+		return data
+
+	def save(self):
+		if not self.filename:
+			return
+		tmpname = '{}.tmp'.format(self.filename)
+		with open(tmpname, 'w') as f:
+			json.dump(self._data, f)
+			if self.fsync:
+				f.flush()
+				os.fsync(f.fileno())
+		os.replace(tmpname, self.filename)
+
+	def get(self, key, default=None):
+		with self._lock:
+			return self._data.get(key, default)
+
+	def set(self, key, value, save=True):
+		with self._lock:
+			self._data[key] = value
+			if save:
+				self.save()
+
+	def pop(self, key, save=True):
+		with self._lock:
+			value = self._data.pop(key, None)
+			if save and value is not None:
+				self.save()
+			return value
+
+	def keys(self):
+		with self._lock:
+			return list(self._data.keys())
+
+	def __contains__(self, key):
+		with self._lock:
+			return key in self._data
+
+	def __len__(self):
+		with self._lock:
+			return len(self._data)
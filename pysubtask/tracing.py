@@ -0,0 +1,131 @@
+#
+# Script: pysubtask.tracing.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Sampled notify -> upload span tracing (base.TraceSampleRate).
+#
+# The master gives a sampled notify a trace id (random 64 bit), sent to the subtask with
+# the notify (notify channel message, else written in the .notify file). Master and
+# subtask append the spans of that notify (burst buffering, detection delay, queue,
+# snapshot, upload, reconnects) to one trace file, in the Chrome trace event format
+# (JSON array, one complete 'X' event per line, open ended), viewable in
+# chrome://tracing or https://ui.perfetto.dev. Events of one notify share args.trace_id.
+
+import os
+import json
+import time
+import random
+import threading
+
+_TraceCategory = 'pysubtask'
+
+
+class Span():
+
+	def __init__(self, name, trace_id, start, args):
+		self.name = name
+		self.trace_id = trace_id
+		self.start = start
+		self.args = args
+
+
+class Tracer():
+
+	def __init__(self, filename, sample_rate, process_name):
+		self.filename = filename
+		self.sample_rate = sample_rate
+		self.process_name = process_name
+		self._pid = os.getpid()
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._fd = None
+
+	def sampled(self):
+		return random.random() < self.sample_rate
+
+	@staticmethod
+	def new_id():
+		return random.getrandbits(64) or 1  # 0 = not traced
+
+	def current(self):
+		# Trace id of the notify this thread is working on, else 0
+		return getattr(self._local, 'trace_id', 0)
+
+	def set_current(self, trace_id):
+		self._local.trace_id = trace_id
+
+	def begin(self, name, trace_id=None, start=None, **args):
+		# Span of trace_id (default: this thread's), None if not traced
+		trace_id = self.current() if trace_id is None else trace_id
+		if not trace_id:
+			return None
+		return Span(name, trace_id, start or time_now(), args)
+
+	def end(self, span, end=None):
+		if span is not None:
+			self.record(span.name, span.trace_id, span.start, end or time_now(), **span.args)
+
+	def record(self, name, trace_id, start, end, **args):
+		# Complete event, start / end = wall clock secs (comparable across processes)
+		args['trace_id'] = '{:016x}'.format(trace_id)
+		event = {
+			'name': name,
+			'cat': _TraceCategory,
+			'ph': 'X',
+			'ts': int(start * 1000000),
+			'dur': max(0, int((end - start) * 1000000)),
+			'pid': self._pid,
+			'tid': threading.get_ident() & 0x7fffffff,
+			'args': args}
+		self.write(json.dumps(event, separators=(',', ':')) + ',\n')
+
+	def write(self, line):
+		# One O_APPEND write per event, master and subtask share the file
+		with self._lock:
+			if self._fd is None:
+				self._fd = self.open_file()
+			os.write(self._fd, line.encode('utf8'))
+
+	def open_file(self):
+		folder = os.path.dirname(self.filename)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder, exist_ok=True)
+		try:
+			# New file: JSON array start, and this process' name
+			fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o666)
+			os.write(fd, b'[\n')
+		except FileExistsError:
+			fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND)
+		os.write(fd, (json.dumps({
+			'name': 'process_name', 'ph': 'M', 'pid': self._pid,
+			'args': {'name': self.process_name}}, separators=(',', ':')) + ',\n').encode('utf8'))
+		return fd
+
+	def close(self):
+		with self._lock:
+			if self._fd is not None:
+				os.close(self._fd)
+				self._fd = None
+
+
+def time_now():
+	return time.time()
+
+
+def write_notify_trace(nfile, trace_id):
+	# Touch nfile with trace_id as its content (sampled notifies, when not sent over the channel)
+	fd = os.open(nfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+	try:
+		os.write(fd, '{:x}'.format(trace_id).encode())
+	finally:
+		os.close(fd)
+
+
+def read_notify_trace(nfile):
+	# Trace id in nfile, 0 if none
+	try:
+		with open(nfile, 'rb') as f:
+			return int(f.read(32).strip() or b'0', 16)
+	except (OSError, ValueError):
+		return 0
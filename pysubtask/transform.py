@@ -0,0 +1,142 @@
+#
+# Script: pysubtask.transform.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Streaming pre-upload transforms (per watch file, i.e.: 'transform': 'gzip'):
+#
+# 'gzip'            = gzip (zlib), remote name + '.gz'
+# 'zstd'            = Zstandard (requires the zstandard package), remote name + '.zst'
+# 'module:function' = user callable, function(chunks) -> iterable of bytes, where chunks
+#                     is an iterable of source bytes. Optional function attributes:
+#                     extension = remote name suffix (i.e.: '.xz'), per_chunk = True if
+#                     function(bytes) -> bytes may transform independent chunks (process pool).
+#
+# Transforms read the source in chunks and never write temp files. With a process pool,
+# independent chunks are transformed in parallel (gzip members / zstd frames, which
+# decompress as one file when concatenated).
+
+import zlib
+import importlib
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+_ChunkSize = 1048576  # 1 MB, source bytes per transform chunk
+_GzipLevel = 6
+_ZstdLevel = 3
+
+
+def gzip_chunk(data):
+	# Complete gzip member of data (process pool safe)
+	compressor = zlib.compressobj(_GzipLevel, zlib.DEFLATED, 31)
+	return compressor.compress(data) + compressor.flush()
+
+
+def zstd_chunk(data):
+	# Complete zstd frame of data (process pool safe)
+	return zstandard.ZstdCompressor(level=_ZstdLevel).compress(data)
+
+
+def gzip_stream(chunks):
+	compressor = zlib.compressobj(_GzipLevel, zlib.DEFLATED, 31)
+	for data in chunks:
+		out = compressor.compress(data)
+		if out:
+			yield out
+	yield compressor.flush()
+
+
+def zstd_stream(chunks):
+	compressor = zstandard.ZstdCompressor(level=_ZstdLevel).compressobj()
+	for data in chunks:
+		out = compressor.compress(data)
+		if out:
+			yield out
+	yield compressor.flush()
+
+
+class Transform():
+
+	def __init__(self, name, extension, stream, per_chunk=None):
+		self.name = name
+		self.extension = extension
+		self.stream = stream  # stream(chunks) -> iterable of bytes
+		self.per_chunk = per_chunk  # per_chunk(bytes) -> bytes, for a process pool, or None
+
+	def iter_output(self, reader, pool=None, workers=1):
+		# Transformed bytes of reader (read in _ChunkSize chunks)
+		chunks = iter(lambda: reader.read(_ChunkSize), b'')
+		if pool is None or self.per_chunk is None:
+			for out in self.stream(chunks):
+				if out:
+					yield out
+			return
+
+		# Keep up to 2 chunks per worker in flight, yield in order
+		pending = []
+		for data in chunks:
+			pending.append(pool.submit(self.per_chunk, data))
+			if len(pending) >= workers * 2:
+				yield pending.pop(0).result()
+		for future in pending:
+			yield future.result()
+
+
+def load_transform(spec):
+	# Transform for spec ('gzip', 'zstd' or 'module:function'), raises ValueError / ImportError
+	if spec == 'gzip':
+		return Transform(spec, '.gz', gzip_stream, gzip_chunk)
+	if spec == 'zstd':
+		if zstandard is None:
+			raise ImportError("Transform [zstd] requires the zstandard package")
+		return Transform(spec, '.zst', zstd_stream, zstd_chunk)
+	if ':' not in spec:
+		raise ValueError("Unknown transform [{}]".format(spec))
+
+	moduleName, funcName = spec.split(':', 1)
+	func = getattr(importlib.import_module(moduleName), funcName)
+	if not getattr(func, 'per_chunk', False):
+		return Transform(spec, getattr(func, 'extension', ''), func)
+
+	def stream(chunks):
+		for data in chunks:
+			yield func(data)
+	return Transform(spec, getattr(func, 'extension', ''), stream, func)
+
+
+class TransformReader():
+	"""Read-only file wrapper returning the transformed bytes of reader."""
+
+	def __init__(self, reader, transform, pool=None, workers=1):
+		self._output = transform.iter_output(reader, pool, workers)
+		self._buffer = b''
+		self._pos = 0
+		self._eof = False
+		self.bytes_out = 0
+
+	def read(self, size=-1):
+		# Exactly size bytes unless at the end (storbinary / putfo / chunked uploads)
+		if size is None or size < 0:
+			size = -1
+		if size < 0 or len(self._buffer) - self._pos < size:
+			# Refill, only copying the (short) unread remainder
+			parts = [self._buffer[self._pos:]]
+			available = len(parts[0])
+			while not self._eof and (size < 0 or available < size):
+				try:
+					out = next(self._output)
+				except StopIteration:
+					self._eof = True
+				else:
+					parts.append(out)
+					available += len(out)
+			self._buffer = b''.join(parts)
+			self._pos = 0
+		end = len(self._buffer) if size < 0 else min(len(self._buffer), self._pos + size)
+		data = self._buffer[self._pos:end]
+		self._pos = end
+		self.bytes_out += len(data)
+		return data
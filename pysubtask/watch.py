@@ -0,0 +1,225 @@
+#
+# Script: pysubtask.watch.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Change detection backends for BaseSubtask:
+#
+# 'poll'    = Portable, BaseSubtask timer stat()'s every .notify file each interval (default)
+# 'inotify' = Linux only, event driven, folders of watch files / .notify files and watch dirs
+# 'auto'    = 'inotify' if available, else 'poll'
+
+import os
+import sys
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# touch() = IN_ATTRIB, new complete file = IN_CLOSE_WRITE or IN_MOVED_TO
+# (IN_CREATE is not used, file may still be partially written)
+_WATCH_MASK = \
+	IN_ATTRIB | IN_CLOSE_WRITE | \
+	IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+_libc = None
+
+
+def _load_libc():
+	global _libc
+	if _libc is None:
+		libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+		libc.inotify_init1.argtypes = [ctypes.c_int]
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+		_libc = libc
+	return _libc
+
+
+def inotify_available():
+	if not sys.platform.startswith('linux'):
+		return False
+	try:
+		return hasattr(_load_libc(), 'inotify_init1')
+	except OSError:
+		return False
+
+
+class PollingWatcher():
+	"""Portable fallback: no events, BaseSubtask timer polls every interval."""
+
+	name = 'poll'
+	event_driven = False
+
+	def __init__(self, callback, logger=None):
+		self.callback = callback
+		self.logger = logger
+
+	def add_dir(self, path):
+		pass
+
+	def add_fd(self, fd, callback):
+		return False
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
+
+
+class InotifyWatcher():
+	"""Linux inotify on folders, calls callback(path) from its own thread for each changed file.
+
+	callback(None) is called if events were lost (queue overflow), i.e.: a full rescan is needed.
+	"""
+
+	name = 'inotify'
+	event_driven = True
+
+	def __init__(self, callback, logger=None):
+		self.callback = callback
+		self.logger = logger
+		self._wds = {}
+		self._fd_callbacks = {}
+		self._thread = None
+		self._should_continue = False
+
+		libc = _load_libc()
+		self._libc = libc
+		self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self._fd < 0:
+			err = ctypes.get_errno()
+			raise OSError(err, os.strerror(err))
+		# Self-pipe to wake the select() on stop()
+		self._wake_r, self._wake_w = os.pipe()
+
+	def add_dir(self, path):
+		path = os.path.normpath(path)
+		if path in self._wds.values() or not os.path.isdir(path):
+			return False
+		wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+		if wd < 0:
+			err = ctypes.get_errno()
+			if self.logger:
+				self.logger.error("inotify: Cannot watch [{}] [{}]".format(path, os.strerror(err)))
+			return False
+		self._wds[wd] = path
+		return True
+
+	def add_fd(self, fd, callback):
+		# Also wake up for other readable fds (i.e.: a notify socket), callback(fd) when readable
+		self._fd_callbacks[fd] = callback
+		return True
+
+	def start(self):
+		if self._thread:
+			return
+		self._should_continue = True
+		self._thread = threading.Thread(target=self._run, name='InotifyWatcher')
+		self._thread.daemon = True
+		self._thread.start()
+
+	def stop(self):
+		self._should_continue = False
+		if self._thread:
+			os.write(self._wake_w, b'x')
+			if self._thread is not threading.current_thread():
+				self._thread.join(1.0)  # may be waiting on an in-progress callback
+			self._thread = None
+		for fd in (self._fd, self._wake_r, self._wake_w):
+			try:
+				os.close(fd)
+			except OSError:
+				pass
+		self._fd = self._wake_r = self._wake_w = -1
+
+	def _run(self):
+		while self._should_continue:
+			rlist = [self._fd, self._wake_r] + list(self._fd_callbacks.keys())
+			try:
+				readable, _, _ = select.select(rlist, [], [])
+			except (OSError, ValueError):
+				break
+			if not self._should_continue:
+				break
+			for fd in readable:
+				if fd == self._fd:
+					self._read_events()
+				elif fd in self._fd_callbacks:
+					self._fd_callbacks[fd](fd)
+
+	def _read_events(self):
+		try:
+			buf = os.read(self._fd, 65536)
+		except OSError as e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return
+			raise
+
+		for path in self._parse_events(buf):
+			if not self._should_continue:
+				return
+			try:
+				self.callback(path)
+			except Exception as e:
+				if self.logger:
+					self.logger.error("inotify: Event callback [{}] failed [{}]".format(path, e))
+
+	def _parse_events(self, buf):
+		# Changed paths in one read of events, None = queue overflow (rescan)
+		changed = []
+		pos = 0
+		while pos + _EVENT_HEADER.size <= len(buf):
+			wd, mask, cookie, namelen = _EVENT_HEADER.unpack_from(buf, pos)
+			pos += _EVENT_HEADER.size
+			name = buf[pos:pos + namelen].rstrip(b'\0')
+			pos += namelen
+
+			if mask & IN_Q_OVERFLOW:
+				changed.append(None)
+				continue
+			if mask & IN_IGNORED:
+				self._wds.pop(wd, None)
+				continue
+			folder = self._wds.get(wd)
+			if folder is None or not name:
+				continue
+			path = os.path.join(folder, os.fsdecode(name))
+			# Collapse repeated events for the same file in one read
+			if path not in changed:
+				changed.append(path)
+		return changed
+
+
+def create_watcher(backend, callback, logger=None):
+	if backend in ('inotify', 'auto'):
+		if inotify_available():
+			try:
+				return InotifyWatcher(callback, logger)
+			except OSError as e:
+				if logger:
+					logger.error("inotify: Not available [{}], falling back to polling.".format(e))
+		elif backend == 'inotify' and logger:
+			logger.error("inotify: Not available on [{}], falling back to polling.".format(sys.platform))
+	elif backend != 'poll' and logger:
+		logger.error("Unknown watch backend [{}], falling back to polling.".format(backend))
+	return PollingWatcher(callback, logger)
@@ -0,0 +1,79 @@
+#
+# Script: pysubtask.workqueue.py Module
+#
+# https://github.com/djacobson/pysubtask
+#
+# Per file coalescing work queue, between BaseSubtask change detection and transfer.
+#
+# A key (watch file) is in at most one of: queued, in flight.
+# put() of a queued key does nothing, put() of an in flight key marks it dirty,
+# and done() of a dirty key queues it again: exactly one follow-up run of the latest state.
+
+import threading
+from collections import OrderedDict
+
+
+class CoalescingQueue():
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._queued = OrderedDict()
+		self._inflight = set()
+		self._dirty = set()
+		self.puts = 0
+		self.coalesced = 0  # puts absorbed by an already queued or in flight key
+
+	def put(self, key):
+		# Return True if key was newly queued
+		with self._lock:
+			self.puts += 1
+			if key in self._queued:
+				self.coalesced += 1
+				return False
+			if key in self._inflight:
+				self.coalesced += 1
+				self._dirty.add(key)
+				return False
+			self._queued[key] = True
+			return True
+
+	def pop(self):
+		# Next queued key (FIFO) now in flight, None if empty
+		with self._lock:
+			if not self._queued:
+				return None
+			key, _ = self._queued.popitem(last=False)
+			self._inflight.add(key)
+			return key
+
+	def take(self, key):
+		# Specific queued key now in flight, False if not queued
+		with self._lock:
+			if self._queued.pop(key, None) is None:
+				return False
+			self._inflight.add(key)
+			return True
+
+	def done(self, key):
+		# Key finished, return True if it was dirty and is queued again
+		with self._lock:
+			self._inflight.discard(key)
+			if key not in self._dirty:
+				return False
+			self._dirty.discard(key)
+			self._queued[key] = True
+			return True
+
+	def discard(self, key):
+		with self._lock:
+			self._queued.pop(key, None)
+			self._inflight.discard(key)
+			self._dirty.discard(key)
+
+	def is_pending(self, key):
+		with self._lock:
+			return key in self._queued or key in self._inflight
+
+	def __len__(self):
+		with self._lock:
+			return len(self._queued) + len(self._inflight)
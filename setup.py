@@ -9,4 +9,5 @@ setup(
 	author_email='david@jacobsonhome.com',
 	license='MIT',
 	packages=['pysubtask'],
+	python_requires='>=3.6',
 	zip_safe=False)
@@ -0,0 +1,38 @@
+import os
+import sys
+import signal
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+_SubtaskSignals = [signal.SIGTERM, signal.SIGINT] + ([signal.SIGUSR1] if hasattr(signal, 'SIGUSR1') else [])
+
+
+@pytest.fixture
+def make_subtask(tmp_path, monkeypatch):
+	# Build a subtask (no timers started) watching tmp_path/watch/<files>, cwd = tmp_path
+	monkeypatch.chdir(tmp_path)
+	handlers = dict((signum, signal.getsignal(signum)) for signum in _SubtaskSignals)
+	subtasks = []
+
+	def make(cls, files=('data.csv',), args=()):
+		watchDir = tmp_path / 'watch'
+		watchDir.mkdir(exist_ok=True)
+		wfiles = []
+		for name in files:
+			wfile = watchDir / name
+			wfile.write_text('data\n')
+			wfiles.append(str(wfile))
+		parser = cls.parse_args_init(None, cls._Description)
+		pargs = parser.parse_args(['-wf', ','.join(wfiles), '-noconsole'] + list(args))
+		subtask = cls(pargs, LogFileName=str(tmp_path / 'logs' / 'subtask.log.txt'))
+		subtasks.append(subtask)
+		return subtask, wfiles
+
+	yield make
+
+	for subtask in subtasks:
+		subtask.stop()
+	for signum, handler in handlers.items():
+		signal.signal(signum, handler)
@@ -0,0 +1,86 @@
+import os
+import time
+import threading
+
+from pysubtask.aio import AsyncRuntime
+from pysubtask.base import BaseSubtask
+
+
+class SlowSubtask(BaseSubtask):
+	"""Transfers (process_notify) take a while, records how many run at once."""
+
+	TransferSecs = 0.3
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.lock = threading.Lock()
+		self.active = 0
+		self.max_active = 0
+		self.transferred = []
+
+	def process_notify(self, psWatchFile):
+		with self.lock:
+			self.active += 1
+			self.max_active = max(self.max_active, self.active)
+		time.sleep(self.TransferSecs)
+		with self.lock:
+			self.active -= 1
+			self.transferred.append(psWatchFile)
+
+
+def wait_for(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		time.sleep(0.01)
+	return True
+
+
+def test_two_files_transfer_concurrently(make_subtask):
+	subtask, wfiles = make_subtask(
+		SlowSubtask,
+		files=('a.csv', 'b.csv'),
+		args=['-runtime', 'asyncio', '-tconc', '2', '-i', '60', '-hb', '0'])
+	subtask.start()
+	start = time.monotonic()
+	for wfile in wfiles:
+		subtask._dispatch_notify(wfile)
+	assert wait_for(lambda: len(subtask.transferred) == 2)
+	assert sorted(map(os.path.basename, subtask.transferred)) == ['a.csv', 'b.csv']
+	assert subtask.max_active == 2
+	assert time.monotonic() - start < 2 * SlowSubtask.TransferSecs
+
+
+def test_same_file_transfers_are_serialized(make_subtask):
+	subtask, wfiles = make_subtask(
+		SlowSubtask,
+		args=['-runtime', 'asyncio', '-tconc', '2', '-i', '60', '-hb', '0'])
+	subtask.start()
+	subtask._dispatch_notify(wfiles[0])
+	assert wait_for(lambda: subtask.active == 1)
+	# Notifies while in flight = one follow-up transfer
+	subtask._dispatch_notify(wfiles[0])
+	subtask._dispatch_notify(wfiles[0])
+	assert wait_for(lambda: len(subtask.transferred) == 2)
+	time.sleep(SlowSubtask.TransferSecs * 2)
+	assert len(subtask.transferred) == 2
+	assert subtask.max_active == 1
+
+
+def test_call_later_returns_cancellable_handle():
+	runtime = AsyncRuntime(None)
+	runtime.start()
+	called = []
+	try:
+		runtime.call_later(0.1, called.append, 'kept')
+		runtime.call_later(0.1, called.append, 'cancelled').cancel()
+		# Cancelled after the loop scheduled it
+		handle = runtime.call_later(0.3, called.append, 'cancelled later')
+		assert wait_for(lambda: handle.timer is not None)
+		handle.cancel()
+		time.sleep(0.5)
+	finally:
+		runtime.stop()
+		runtime.join(5)
+	assert called == ['kept']
@@ -0,0 +1,44 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pysubtask import defaults_config as defaults
+from pysubtask.base import BaseTaskMaster
+
+
+@pytest.fixture
+def master(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / 'watch').mkdir()
+	(tmp_path / 'watch' / 'data.csv').write_text('data\n')
+	return BaseTaskMaster(
+		[{'file': os.path.join('watch', 'data.csv')}],
+		SimpleNamespace(NotifyChannel=False),
+		LogFileName=str(tmp_path / 'logs' / 'master.log.txt'),
+		LogToConsole=False)
+
+
+def test_archive_file_name_skips_taken_names(master, tmp_path):
+	archpath = tmp_path / 'archive'
+	archpath.mkdir()
+	(archpath / 'a.csv').write_text('')
+	(archpath / 'a_1.csv').write_text('')
+	names = [os.path.basename(master.archive_file_name(str(archpath), 'a.csv')) for _ in range(3)]
+	assert names == ['a_2.csv', 'a_3.csv', 'a_4.csv']
+	assert os.path.basename(master.archive_file_name(str(archpath), 'b.csv')) == 'b.csv'
+	assert os.path.basename(master.archive_file_name(str(archpath), 'b.csv')) == 'b_1.csv'
+
+
+def test_archive_expired_files(master, tmp_path):
+	watch = tmp_path / 'watch'
+	old = time.time() - (defaults.base.ArchiveAfterDaysOld + 2) * 86400
+	for name in ('old.csv', 'old.txt'):
+		(watch / name).write_text('old\n')
+		os.utime(str(watch / name), (old, old))
+	master.archive_expired_files('archive')
+	assert sorted(os.listdir(str(watch))) == ['archive', 'data.csv']
+	stamp = time.localtime(old)
+	archpath = watch / 'archive' / '{}{:02d}'.format(stamp.tm_year, stamp.tm_mon) / '{:02d}'.format(stamp.tm_mday)
+	assert sorted(os.listdir(str(archpath))) == ['old.csv', 'old.txt']
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pysubtask import budget
+from pysubtask.budget import TransferBudget
+
+
+class Clock():
+
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	clock = Clock()
+	monkeypatch.setattr(budget, 'time', SimpleNamespace(monotonic=clock))
+	return clock
+
+
+def test_disabled_budget_never_delays(clock):
+	tb = TransferBudget()
+	assert not tb.enabled
+	tb.record('a', 100)
+	assert tb.delay('a') == 0
+
+
+def test_transaction_bucket_refills_evenly(clock):
+	# 10 transactions / 100 secs = 1 per 10 secs, bursts of up to 2
+	tb = TransferBudget(transactions=10, window_secs=100, burst_secs=20)
+	tb.record('a')
+	tb.record('b')
+	assert tb.delay('c') == pytest.approx(10)
+	clock.now += 5
+	assert tb.delay('c') == pytest.approx(5)
+	clock.now += 5
+	assert tb.delay('c') == 0
+
+
+def test_bucket_holds_at_most_burst(clock):
+	tb = TransferBudget(transactions=10, window_secs=100, burst_secs=20)
+	clock.now += 1000  # idle: capped at 2 tokens, not 100
+	for key in ('a', 'b'):
+		assert tb.delay(key) == 0
+		tb.record(key)
+	assert tb.delay('c') > 0
+
+
+def test_bytes_debt_waits_for_refill(clock):
+	# 1000 bytes / 100 secs = 10 bytes / sec, bucket of 100
+	tb = TransferBudget(nbytes=1000, window_secs=100, burst_secs=10)
+	tb.record('a', 300)  # 200 bytes in debt
+	assert tb.delay('b') == pytest.approx(20)
+	clock.now += 20
+	assert tb.delay('b') == 0
+
+
+def test_rolling_window_is_the_hard_limit(clock):
+	tb = TransferBudget(transactions=2, window_secs=100, burst_secs=100)
+	tb.record('a')
+	clock.now += 50
+	tb.record('b')
+	assert tb.usage() == (2, 0)
+	assert tb.delay('c') == pytest.approx(50)
+	clock.now += 50
+	assert tb.usage() == (1, 0)
+
+
+def test_rate_limit_hold(clock):
+	# Server 429 / Retry-After: all uploads held, budget or not
+	for tb in (TransferBudget(), TransferBudget(transactions=1000)):
+		tb.hold(30)
+		assert tb.is_held()
+		assert tb.delay('a') == pytest.approx(30)
+		tb.hold(10)  # never shortened
+		assert tb.delay('a') == pytest.approx(30)
+		clock.now += 30
+		assert not tb.is_held()
+		assert tb.delay('a') == 0
@@ -0,0 +1,163 @@
+import os
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from pysubtask import base
+from pysubtask.base import BaseTaskMaster
+
+
+class FakeDatetime(datetime):
+	"""datetime.now() = a test controlled clock."""
+
+	current = datetime(2020, 1, 1)
+
+	@classmethod
+	def now(cls, tz=None):
+		return cls.current
+
+	@classmethod
+	def advance(cls, secs):
+		cls.current += timedelta(seconds=secs)
+
+
+@pytest.fixture
+def make_master(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setattr(base, 'datetime', FakeDatetime)
+	(tmp_path / 'watch').mkdir()
+
+	def make(*burstmodes):
+		watch_files = []
+		for i, burstmode in enumerate(burstmodes):
+			wfile = os.path.join('watch', 'data{}.csv'.format(i))
+			(tmp_path / wfile).write_text('')
+			watch_files.append({'file': wfile, 'burstmode': burstmode})
+		master = BaseTaskMaster(
+			watch_files,
+			SimpleNamespace(NotifyChannel=False),
+			LogFileName=str(tmp_path / 'logs' / 'master.log.txt'),
+			LogToConsole=False)
+		master.notified = []
+		master.notify = lambda notify_index, offset=-1: master.notified.append((notify_index, offset))
+		masters.append(master)
+		return master
+
+	masters = []
+	yield make
+	for master in masters:
+		master.stop()
+
+
+def wait_for(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		time.sleep(0.005)
+	return True
+
+
+def grow(master, notify_index, offsets, every_secs=0.1):
+	for offset in offsets:
+		FakeDatetime.advance(every_secs)
+		master.notify_file_by_index(notify_index, offset=offset)
+
+
+def test_enters_and_leaves_byte_rate_burst(make_master):
+	master = make_master({'bytes_per_sec': 1000, 'expire_milli': 60000})
+	state = master._watch_files_state[0]
+	burst_mode = state['burst_mode']
+
+	# First notify, no rate yet: notified
+	grow(master, 0, [0])
+	assert master.notified == [(0, 0)]
+
+	# 100 KB/sec: burst, held
+	grow(master, 0, range(10000, 60000, 10000))
+	assert master.notified == [(0, 0)]
+	assert burst_mode['rate'] > 1000
+	assert burst_mode['start_dt'] is not None
+	assert state['pending_data_dt'] is not None
+
+	# Slows down: burst ended, held data released at the latest offset
+	grow(master, 0, [50010], every_secs=5)
+	assert master.notified == [(0, 0), (0, 50010)]
+	assert burst_mode['rate'] < 1000
+	assert burst_mode['start_dt'] is None
+	assert burst_mode['notified_size'] == 50010
+	assert state['pending_data_dt'] is None
+
+
+def test_max_buffered_bytes_notifies_mid_burst(make_master):
+	master = make_master({'bytes_per_sec': 1000, 'max_buffered_bytes': 25000, 'expire_milli': 60000})
+	burst_mode = master._watch_files_state[0]['burst_mode']
+	grow(master, 0, [0])
+	grow(master, 0, range(10000, 60000, 10000))
+	# Released each time 25000 bytes were buffered, still bursting
+	assert master.notified == [(0, 0), (0, 30000)]
+	assert burst_mode['notified_size'] == 30000
+	assert burst_mode['start_dt'] is not None
+
+
+def test_shrunk_file_resets_rate(make_master):
+	master = make_master({'bytes_per_sec': 1000, 'expire_milli': 60000})
+	burst_mode = master._watch_files_state[0]['burst_mode']
+	grow(master, 0, [0, 10000, 20000])
+	assert burst_mode['rate'] > 1000
+	grow(master, 0, [100])  # rotated / rewritten
+	assert master.notified[-1] == (0, 100)
+	assert burst_mode['rate'] == 0.0
+
+
+def test_per_file_thresholds(make_master):
+	master = make_master(
+		{'bytes_per_sec': 1000, 'expire_milli': 60000},
+		{'bytes_per_sec': 10 ** 9},
+		{'bytes_per_sec': 1000, 'bogus': 1},
+		True)
+	for notify_index in range(4):
+		grow(master, notify_index, [0])
+	del master.notified[:]
+	offsets = range(10000, 60000, 10000)
+	for offset in offsets:
+		FakeDatetime.advance(0.1)
+		for notify_index in range(3):
+			master.notify_file_by_index(notify_index, offset=offset)
+	# Same growth: bursting at 1000 bytes/sec, below a 1 GB/sec threshold
+	assert [offset for notify_index, offset in master.notified if notify_index == 0] == []
+	assert [offset for notify_index, offset in master.notified if notify_index == 1] == list(offsets)
+	# Unknown keys ignored, defaults for the rest
+	burst_mode = master._watch_files_state[2]['burst_mode']
+	assert 'bogus' not in burst_mode
+	assert burst_mode['max_buffered_bytes'] == base.defaults.burst_mode.max_buffered_bytes
+	# 'burstmode': True = notify timing detector only
+	assert master._watch_files_state[3]['burst_mode']['bytes_per_sec'] == 0
+
+
+def test_pending_data_flushed_at_deadline(make_master):
+	master = make_master(True)
+	state = master._watch_files_state[0]
+	master.set_pending_data_dt(0, FakeDatetime.now() + timedelta(seconds=0.1))
+	assert state['pending_job'] is not None
+	assert master.notified == []
+	FakeDatetime.advance(0.1)
+	assert wait_for(lambda: master.notified == [(0, -1)])
+	assert state['pending_data_dt'] is None
+	assert state['pending_job'] is None
+
+
+def test_later_notify_cancels_pending_flush(make_master):
+	master = make_master({'bytes_per_sec': 1000, 'expire_milli': 300})
+	state = master._watch_files_state[0]
+	grow(master, 0, [0, 10000])
+	pending_job = state['pending_job']
+	assert pending_job is not None
+	# Slows down: released by the notify itself, the scheduled flush is cancelled
+	grow(master, 0, [10010], every_secs=5)
+	assert pending_job.cancelled
+	assert state['pending_job'] is None
+	time.sleep(0.5)
+	assert master.notified == [(0, 0), (0, 10010)]
@@ -0,0 +1,127 @@
+import os
+import time
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+from pysubtask.base import BaseSubtask, BaseTaskMaster
+from pysubtask.channel import NotifySender, NotifyReceiver, channel_available
+
+pytestmark = pytest.mark.skipif(not channel_available(), reason='needs AF_UNIX sockets')
+
+
+@pytest.fixture
+def sock_path():
+	# Short folder, AF_UNIX socket paths are limited to ~100 chars
+	folder = tempfile.mkdtemp(prefix='pst')
+	yield os.path.join(folder, 'notify.sock')
+	shutil.rmtree(folder, ignore_errors=True)
+
+
+def test_send_receive_round_trip(sock_path):
+	receiver = NotifyReceiver(sock_path)
+	sender = NotifySender(sock_path)
+	try:
+		assert sender.send(0, 1024, 1.5)
+		assert sender.send(1)
+		assert sender.send(0, 2048, 2.5, 7)
+		assert sender.send(0, 4096, 3.5, 8)
+		messages = dict((message[0], message[1:]) for message in receiver.receive_all())
+		# Per file id: latest offset, oldest timestamp, first trace id
+		assert messages[0] == (4096, 1.5, 7)
+		assert messages[1][0] == -1
+		assert messages[1][2] == 0
+		assert receiver.receive_all() == []
+	finally:
+		sender.close()
+		receiver.close()
+	assert not os.path.exists(sock_path)
+
+
+def test_full_socket_buffer_does_not_block_sender(sock_path):
+	receiver = NotifyReceiver(sock_path)
+	sender = NotifySender(sock_path)
+	try:
+		start = time.monotonic()
+		sent = 0
+		while sender.send(0, sent) and sent < 1000000:
+			sent += 1
+		assert sent < 1000000  # buffer filled up, send returned False
+		assert sender.send(0, sent) is False
+		assert time.monotonic() - start < 10
+		# Draining the receiver makes room again
+		assert receiver.receive_all()[0][1] == sent - 1
+		assert sender.send(0, sent)
+	finally:
+		sender.close()
+		receiver.close()
+
+
+def test_missing_receiver(sock_path):
+	sender = NotifySender(sock_path)
+	try:
+		assert sender.send(0, 1) is False
+		# Stale socket file, nobody bound to it
+		receiver = NotifyReceiver(sock_path)
+		receiver._sock.close()
+		assert os.path.exists(sock_path)
+		assert sender.send(0, 1) is False
+	finally:
+		sender.close()
+
+
+def channel_subtask(make_subtask, monkeypatch):
+	subtask, wfiles = make_subtask(BaseSubtask)
+	monkeypatch.setattr(subtask, '_notify_receiver', SimpleNamespace(close=lambda: None))
+	monkeypatch.setattr(subtask, '_receive_notify_channel', lambda: False)
+	monkeypatch.setattr(subtask, '_dispatch_notify', lambda *args: None)
+	subtask._IgnoreTimer = False
+	return subtask, wfiles[0]
+
+
+def test_snapshot_fence_consumes_channel_offset(make_subtask, monkeypatch):
+	subtask, wfile = channel_subtask(make_subtask, monkeypatch)
+	subtask._notify_channel_pending = {0: (2, time.time(), 0)}
+	subtask._process_notify_channel()
+	subtask.set_snapshot_fence(wfile)
+	assert subtask.upload_size(wfile) == 2
+	# Next notify without an offset: fence at the current size
+	subtask.set_snapshot_fence(wfile)
+	assert subtask.upload_size(wfile) == 5
+
+
+def test_touch_notify_drops_channel_offset(make_subtask, monkeypatch):
+	subtask, wfile = channel_subtask(make_subtask, monkeypatch)
+	subtask._notify_channel_pending = {0: (2, time.time(), 0)}
+	subtask._process_notify_channel()
+	subtask._dispatch_touch_notify(wfile)
+	subtask.set_snapshot_fence(wfile)
+	assert subtask.upload_size(wfile) == 5
+
+
+def test_channel_notify_without_offset_drops_offset(make_subtask, monkeypatch):
+	subtask, wfile = channel_subtask(make_subtask, monkeypatch)
+	subtask._notify_channel_pending = {0: (2, time.time(), 0)}
+	subtask._process_notify_channel()
+	subtask._notify_channel_pending = {0: (-1, time.time(), 0)}
+	subtask._process_notify_channel()
+	subtask.set_snapshot_fence(wfile)
+	assert subtask.upload_size(wfile) == 5
+
+
+def test_master_stop_closes_sender(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	(tmp_path / 'watch').mkdir()
+	(tmp_path / 'watch' / 'data.csv').write_text('')
+	master = BaseTaskMaster(
+		[{'file': os.path.join('watch', 'data.csv'), 'burstmode': False}],
+		SimpleNamespace(NotifyChannel=True),
+		LogFileName=str(tmp_path / 'logs' / 'master.log.txt'),
+		LogToConsole=False)
+	sender = master._notify_sender
+	assert sender is not None
+	master.stop()
+	assert master._notify_sender is None
+	assert sender._sock.fileno() == -1
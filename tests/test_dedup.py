@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from pysubtask import dedup
+from pysubtask.dedup import UploadCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+	return UploadCache(str(tmp_path / 'uploads.json'))
+
+
+def write(path, data, mtime_ns=None):
+	path.write_bytes(data)
+	if mtime_ns is not None:
+		os.utime(str(path), ns=(mtime_ns, mtime_ns))
+	return os.stat(str(path)).st_mtime_ns
+
+
+def test_unchanged_after_record(tmp_path, cache):
+	f = tmp_path / 'a.csv'
+	stamp = write(f, b'abc\n')
+	cache.record(str(f), 'remote/a.csv', 4, stamp)
+	assert cache.unchanged(str(f), 'remote/a.csv', 4)
+	assert not cache.unchanged(str(f), 'other/a.csv', 4)
+
+
+def test_rewritten_same_content_is_unchanged(tmp_path, cache):
+	f = tmp_path / 'a.csv'
+	stamp = write(f, b'abc\n', 1000000000)
+	cache.record(str(f), 'r', 4, stamp)
+	write(f, b'abc\n', 2000000000)
+	assert cache.unchanged(str(f), 'r', 4)
+	write(f, b'abd\n', 3000000000)
+	assert not cache.unchanged(str(f), 'r', 4)
+
+
+def test_changed_while_uploading_not_recorded(tmp_path, cache):
+	f = tmp_path / 'a.csv'
+	stamp = write(f, b'abc\n', 1000000000)
+	write(f, b'abcd\n', 2000000000)
+	cache.record(str(f), 'r', 4, stamp)
+	assert not cache.unchanged(str(f), 'r', 4)
+
+
+def test_append_only_never_hashed(tmp_path, cache, monkeypatch):
+	def no_digest(filename, size):
+		raise AssertionError('append-only file hashed')
+	monkeypatch.setattr(dedup, 'file_digest', no_digest)
+
+	f = tmp_path / 'log.csv'
+	stamp = write(f, b'line1\n')
+	cache.record(str(f), 'r', 6, stamp, append_only=True)
+	assert cache.unchanged(str(f), 'r', 6, offset=6)
+	# Append offset disagrees (i.e.: offset state lost), upload
+	assert not cache.unchanged(str(f), 'r', 6, offset=None)
+	# Appended
+	write(f, b'line1\nline2\n')
+	assert not cache.unchanged(str(f), 'r', 12, offset=6)
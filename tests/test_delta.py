@@ -0,0 +1,66 @@
+import io
+
+from pysubtask.delta import BlockManifest, SignatureReader, changed_blocks, load_manifest, save_manifest
+
+BlockSize = 4
+
+
+def manifest_of(data):
+	manifest = BlockManifest(BlockSize)
+	for pos in range(0, len(data), BlockSize):
+		manifest.add(data[pos:pos + BlockSize])
+	return manifest
+
+
+def diff(old_data, new_data):
+	new = BlockManifest(BlockSize)
+	blocks = list(changed_blocks(io.BytesIO(new_data), manifest_of(old_data), new))
+	return blocks, new
+
+
+def test_unchanged_file_has_no_blocks():
+	blocks, new = diff(b'aaaabbbbcc', b'aaaabbbbcc')
+	assert blocks == []
+	assert new.size == 10
+
+
+def test_changed_block_at_its_offset():
+	blocks, new = diff(b'aaaabbbbcccc', b'aaaaBBBBcccc')
+	assert blocks == [(4, b'BBBB')]
+	assert new.strong == manifest_of(b'aaaaBBBBcccc').strong
+
+
+def test_appended_and_grown_tail_blocks():
+	blocks, new = diff(b'aaaabb', b'aaaabbbbcc')
+	assert blocks == [(4, b'bbbb'), (8, b'cc')]
+
+
+def test_truncated_tail_block_differs():
+	# Same bytes, shorter block: not a match
+	blocks, new = diff(b'aaaabbbb', b'aaaabb')
+	assert blocks == [(4, b'bb')]
+
+
+def test_insertion_rewrites_the_rest():
+	blocks, new = diff(b'aaaabbbbcccc', b'aaaaXbbbbcccc')
+	assert [offset for offset, data in blocks] == [4, 8, 12]
+
+
+def test_signature_reader_matches_block_manifest():
+	data = b'0123456789abcdef012'
+	reader = SignatureReader(io.BytesIO(data), BlockManifest(BlockSize))
+	while reader.read(5):
+		pass
+	expected = manifest_of(data)
+	assert (reader.manifest.size, reader.manifest.weak, reader.manifest.strong) == (
+		expected.size, expected.weak, expected.strong)
+
+
+def test_saved_manifest_round_trip(tmp_path):
+	filename = str(tmp_path / 'a.csv.manifest')
+	save_manifest(filename, manifest_of(b'aaaabbbbcc'))
+	manifest = load_manifest(filename, BlockSize)
+	assert list(changed_blocks(io.BytesIO(b'aaaabbbbcc'), manifest, BlockManifest(BlockSize))) == []
+	# Other block size: full upload
+	assert load_manifest(filename, BlockSize * 2) is None
+	assert load_manifest(str(tmp_path / 'missing'), BlockSize) is None
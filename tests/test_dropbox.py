@@ -0,0 +1,82 @@
+import os
+from types import SimpleNamespace
+
+import dropbox
+import pytest
+
+from pysubtask.dropbox import DropboxSubtask
+
+
+class RateLimitedDropbox():
+	# Stub SDK: every upload is rate limited (HTTP 429, Retry-After)
+
+	def __init__(self, backoff=30):
+		self.backoff = backoff
+		self.uploads = 0
+
+	def files_upload(self, *args, **kwargs):
+		self.uploads += 1
+		raise dropbox.exceptions.RateLimitError('request-id', backoff=self.backoff)
+
+	def users_get_current_account(self):
+		return None
+
+	def close(self):
+		pass
+
+
+class StubDropbox(RateLimitedDropbox):
+
+	def files_upload(self, data, path, *args, **kwargs):
+		self.uploads += 1
+		return SimpleNamespace(name=os.path.basename(path))
+
+
+@pytest.fixture
+def subtask(make_subtask):
+	# Transfer budget enabled (100 uploads / day)
+	subtask, wfiles = make_subtask(DropboxSubtask, args=['-dtoken', 'token', '-btx', '100'])
+	subtask._dropbox = RateLimitedDropbox()
+	yield subtask, wfiles[0]
+	subtask._dropbox = None
+
+
+def test_rate_limited_upload_fails_and_holds_budget(subtask):
+	subtask, wfile = subtask
+	assert subtask.upload_file(wfile) is False
+	assert subtask.budget_held()
+	assert subtask.process_notify(wfile) is False
+
+
+def test_rate_limited_upload_counted_as_failure(subtask):
+	subtask, wfile = subtask
+	label = subtask.metrics_file_label(wfile)
+	subtask._process_upload(wfile, wfile)
+	assert subtask.metric_upload_failures.value(label) == 1
+	assert subtask.metric_uploads.value(label) == 0
+	assert subtask.metric_transfer_secs.count(label) == 0
+	assert subtask._budget.usage() == (0, 0)
+
+
+def test_budget_records_only_sent_uploads(subtask):
+	subtask, wfile = subtask
+	subtask._dropbox = StubDropbox()
+	assert subtask.upload_file(wfile) is True
+	assert subtask._budget.usage() == (1, os.path.getsize(wfile))
+	# Unchanged content, skipped: no budget spent
+	assert subtask.upload_file(wfile) is True
+	assert subtask._dropbox.uploads == 1
+	assert subtask._budget.usage() == (1, os.path.getsize(wfile))
+
+
+def test_append_only_without_new_bytes_skipped_before_connect(subtask, monkeypatch):
+	subtask, wfile = subtask
+	subtask._dropbox = StubDropbox()
+	subtask._upload_cache = None
+	subtask._append_only_names = {os.path.basename(wfile)}
+	assert subtask.upload_file(wfile) is True
+	# Disconnected meanwhile: no new bytes, so no reconnect and no upload
+	subtask._dropbox = None
+	monkeypatch.setattr(subtask, 'connect', lambda: pytest.fail('connected'))
+	assert subtask.upload_file(wfile) is True
+	assert subtask.metric_uploads_skipped.value(subtask.metrics_file_label(wfile)) == 1
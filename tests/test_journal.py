@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from pysubtask.base import BaseSubtask
+from pysubtask.journal import UploadJournal, load_journal, journal_key, is_uploaded
+
+
+@pytest.fixture
+def jfile(tmp_path):
+	return str(tmp_path / 'journal.jsonl')
+
+
+def lines(filename):
+	with open(filename) as f:
+		return f.read().splitlines()
+
+
+def test_last_event_per_key_and_torn_line(jfile):
+	journal = UploadJournal(jfile)
+	journal.append('notify', 'a.csv', 4, 1)
+	journal.append('done', 'a.csv', 4, 1, fsync=True)
+	journal.append('notify', 'd/a.csv', 8, 2)
+	journal.close()
+	with open(jfile, 'a') as f:
+		f.write('{"e": "done", "n": "d/a.cs')  # crash mid write
+	entries = load_journal(jfile)
+	assert entries['a.csv']['e'] == 'done'
+	assert entries['d/a.csv']['e'] == 'notify'
+
+
+def test_compacts_every_n_events(jfile):
+	journal = UploadJournal(jfile, compact_every=5)
+	for i in range(12):
+		journal.append('done', 'a.csv', i, i)
+	journal.close()
+	# Compacted at 5 and 10 events: 1 + 2 appended since
+	assert len(lines(jfile)) == 3
+	assert load_journal(jfile)['a.csv']['s'] == 11
+
+
+def test_is_uploaded(tmp_path):
+	f = tmp_path / 'a.csv'
+	f.write_text('abc\n')
+	stat = os.stat(str(f))
+	done = {'e': 'done', 's': stat.st_size, 'm': stat.st_mtime_ns}
+	assert is_uploaded(done, stat)
+	assert not is_uploaded(None, stat)
+	assert not is_uploaded(dict(done, e='snapshot'), stat)
+	assert not is_uploaded(dict(done, s=stat.st_size + 1), stat)
+
+
+def test_journal_key_relative_to_watch_root(tmp_path):
+	root = str(tmp_path / 'watch')
+	assert journal_key(os.path.join(root, 'a.csv'), root) == 'a.csv'
+	assert journal_key(os.path.join(root, 'upload', 'a.csv'), root) == 'upload/a.csv'
+
+
+def test_subtask_journals_snapshot_as_watch_file(make_subtask, tmp_path):
+	subtask, wfiles = make_subtask(BaseSubtask, files=('a.csv',), args=['-bakto', 'upload'])
+	upFile = subtask._process_snapshot(wfiles[0])
+	assert os.path.dirname(upFile) != os.path.dirname(wfiles[0])
+	subtask.upload_recorded(upFile, 'a.csv', os.path.getsize(upFile), subtask.upload_started(upFile))
+	subtask._journal.close()
+	entries = load_journal(subtask._journal.filename)
+	assert list(entries) == ['a.csv']
+	assert entries['a.csv']['e'] == 'done'
@@ -0,0 +1,110 @@
+import time
+import threading
+
+import pytest
+
+from pysubtask.Scheduler import Scheduler
+
+
+@pytest.fixture
+def scheduler():
+	scheduler = Scheduler(name='TestScheduler', daemon=True)
+	scheduler.start()
+	yield scheduler
+	scheduler.stop()
+	scheduler.join(5)
+
+
+def wait_for(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		time.sleep(0.005)
+	return True
+
+
+def test_calls_run_in_due_order(scheduler):
+	ran = []
+	now = time.monotonic()
+	for name, delay in (('c', 0.06), ('a', 0.02), ('b', 0.04)):
+		scheduler.call_at(now + delay, ran.append, name)
+	# Same due time: in call order
+	for name in ('d', 'e', 'f'):
+		scheduler.call_at(now + 0.08, ran.append, name)
+	assert wait_for(lambda: len(ran) == 6)
+	assert ran == ['a', 'b', 'c', 'd', 'e', 'f']
+
+
+def test_cancelled_call_and_removed_job_do_not_run(scheduler):
+	ran = []
+	job = scheduler.call_later(0.02, ran.append, 'cancelled')
+	job.cancelled = True
+	scheduler.add_job('periodic', 0.01, lambda: ran.append('periodic'))
+	assert wait_for(lambda: 'periodic' in ran)
+	scheduler.remove_job('periodic')
+	time.sleep(0.03)  # a run in progress may still finish
+	count = len(ran)
+	time.sleep(0.05)
+	assert len(ran) == count
+	assert 'cancelled' not in ran
+
+
+def test_replaced_job_runs_once_per_interval(scheduler):
+	ran = []
+	scheduler.add_job('job', 10, lambda: ran.append('old'))
+	scheduler.add_job('job', 10, lambda: ran.append('new'), first_delay=0)
+	assert wait_for(lambda: ran)
+	time.sleep(0.05)
+	assert ran == ['new']
+
+
+def test_fixed_rate_stays_on_the_grid(scheduler):
+	# Runs due every period from the first due time, a late run skips the missed ones
+	period = 0.05
+	dues = []
+	done = threading.Event()
+
+	def target():
+		dues.append(job.due)
+		if len(dues) == 2:
+			time.sleep(period * 2.5)  # late: next 2 runs missed
+		if len(dues) == 5:
+			done.set()
+
+	job = scheduler.add_job('grid', period, target, first_delay=0)
+	assert done.wait(5)
+	scheduler.remove_job('grid')
+	steps = [(due - dues[0]) / period for due in dues[:5]]
+	assert steps == pytest.approx([0, 1, 4, 5, 6])
+
+
+def test_fixed_delay_measured_from_end_of_run(scheduler):
+	period = 0.03
+	ends = []
+	starts = []
+	done = threading.Event()
+
+	def target():
+		starts.append(time.monotonic())
+		time.sleep(period)
+		ends.append(time.monotonic())
+		if len(ends) == 3:
+			done.set()
+
+	scheduler.add_job('delay', period, target, fixed_rate=False, first_delay=0)
+	assert done.wait(5)
+	scheduler.remove_job('delay')
+	for end, start in zip(ends, starts[1:]):
+		assert start - end >= period - 0.005
+
+
+def test_failing_job_keeps_running(scheduler):
+	calls = []
+
+	def target():
+		calls.append(1)
+		raise RuntimeError('job failed')
+
+	scheduler.add_job('failing', 0.01, target, first_delay=0)
+	assert wait_for(lambda: len(calls) >= 3)
@@ -0,0 +1,98 @@
+import io
+import gzip
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pysubtask import transform
+from pysubtask.transform import TransformReader, load_transform
+
+
+def upper_stream(chunks):
+	for data in chunks:
+		yield data.upper()
+
+
+upper_stream.extension = '.up'
+
+
+def upper_chunk(data):
+	return data.upper()
+
+
+upper_chunk.per_chunk = True
+
+
+@pytest.fixture
+def source(monkeypatch):
+	# Small transform chunks, so several chunks (gzip members / zstd frames) per source
+	monkeypatch.setattr(transform, '_ChunkSize', 4096)
+	rand = random.Random(15)
+	return b''.join(rand.choice([b'abc,', b'123\n', bytes([rand.randrange(256)])]) for _ in range(50000))
+
+
+def read_all(reader, size):
+	parts = []
+	while True:
+		data = reader.read(size)
+		if not data:
+			return b''.join(parts)
+		assert len(data) == size or not reader.read(size)  # short read only at the end
+		parts.append(data)
+
+
+@pytest.mark.parametrize('size', [1000, 65536, -1])
+def test_gzip_round_trip(source, size):
+	gz = load_transform('gzip')
+	assert gz.extension == '.gz'
+	reader = TransformReader(io.BytesIO(source), gz)
+	out = read_all(reader, size) if size > 0 else reader.read()
+	assert gzip.decompress(out) == source
+	assert reader.bytes_out == len(out)
+
+
+def test_gzip_pool_round_trip(source):
+	# Independent gzip members, decompress as one file
+	with ThreadPoolExecutor(2) as pool:
+		out = TransformReader(io.BytesIO(source), load_transform('gzip'), pool, 2).read()
+	assert gzip.decompress(out) == source
+
+
+@pytest.mark.skipif(transform.zstandard is None, reason='zstandard not installed')
+def test_zstd_round_trip(source):
+	zstandard = transform.zstandard
+	zst = load_transform('zstd')
+	assert zst.extension == '.zst'
+	out = read_all(TransformReader(io.BytesIO(source), zst), 1000)
+	assert zstandard.ZstdDecompressor().stream_reader(io.BytesIO(out)).read() == source
+	with ThreadPoolExecutor(2) as pool:
+		out = TransformReader(io.BytesIO(source), zst, pool, 2).read()
+	reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(out), read_across_frames=True)
+	assert reader.read() == source
+
+
+@pytest.mark.skipif(transform.zstandard is not None, reason='zstandard installed')
+def test_zstd_unavailable():
+	with pytest.raises(ImportError):
+		load_transform('zstd')
+
+
+def test_callable_round_trip(source):
+	upper = load_transform('{}:upper_stream'.format(__name__))
+	assert upper.extension == '.up'
+	assert upper.per_chunk is None
+	assert read_all(TransformReader(io.BytesIO(source), upper), 1000) == source.upper()
+
+
+def test_per_chunk_callable_round_trip(source):
+	upper = load_transform('{}:upper_chunk'.format(__name__))
+	assert upper.extension == ''
+	assert TransformReader(io.BytesIO(source), upper).read() == source.upper()
+	with ThreadPoolExecutor(2) as pool:
+		assert TransformReader(io.BytesIO(source), upper, pool, 2).read() == source.upper()
+
+
+def test_unknown_transform():
+	with pytest.raises(ValueError):
+		load_transform('bogus')
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+from pysubtask.watch import InotifyWatcher, inotify_available
+
+pytestmark = pytest.mark.skipif(
+	not sys.platform.startswith('linux') or not inotify_available(),
+	reason='inotify is Linux only')
+
+
+@pytest.fixture
+def watched(tmp_path):
+	changed = []
+	event = threading.Event()
+
+	def callback(path):
+		changed.append(path)
+		event.set()
+
+	watcher = InotifyWatcher(callback)
+	assert watcher.add_dir(str(tmp_path))
+	watcher.start()
+	yield tmp_path, changed, event
+	watcher.stop()
+
+
+def wait_for(condition, event, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		event.wait(0.05)
+		event.clear()
+	return True
+
+
+def test_write_and_close_notifies(watched):
+	folder, changed, event = watched
+	path = str(folder / 'data.csv')
+	with open(path, 'w') as f:
+		f.write('data\n')
+	assert wait_for(lambda: path in changed, event)
+
+
+def test_touch_notifies(watched):
+	folder, changed, event = watched
+	path = folder / 'data.csv.notify'
+	path.write_text('')
+	assert wait_for(lambda: str(path) in changed, event)
+	del changed[:]
+	os.utime(str(path))
+	assert wait_for(lambda: str(path) in changed, event)
+
+
+def test_rename_and_delete_are_reported(watched):
+	folder, changed, event = watched
+	old, new = folder / 'data.csv.tmp', folder / 'data.csv'
+	old.write_text('data\n')
+	assert wait_for(lambda: str(old) in changed, event)
+	del changed[:]
+	os.rename(str(old), str(new))
+	assert wait_for(lambda: str(old) in changed and str(new) in changed, event)
+	del changed[:]
+	os.remove(str(new))
+	assert wait_for(lambda: str(new) in changed, event)
+
+
+def test_unwatched_folder_is_not_reported(watched, tmp_path_factory):
+	folder, changed, event = watched
+	other = tmp_path_factory.mktemp('other')
+	(other / 'data.csv').write_text('data\n')
+	(folder / 'marker').write_text('')
+	assert wait_for(lambda: str(folder / 'marker') in changed, event)
+	assert not any(path and path.startswith(str(other)) for path in changed)
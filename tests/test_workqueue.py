@@ -0,0 +1,42 @@
+from pysubtask.workqueue import CoalescingQueue
+
+
+def test_fifo_and_coalesce_while_queued():
+	queue = CoalescingQueue()
+	assert queue.put('a')
+	assert queue.put('b')
+	assert not queue.put('a')
+	assert queue.coalesced == 1
+	assert queue.pop() == 'a'
+	assert queue.pop() == 'b'
+	assert queue.pop() is None
+
+
+def test_put_while_in_flight_runs_once_more():
+	queue = CoalescingQueue()
+	queue.put('a')
+	assert queue.pop() == 'a'
+	# Changed twice while uploading: one follow-up run of the latest state
+	assert not queue.put('a')
+	assert not queue.put('a')
+	assert queue.pop() is None
+	assert queue.is_pending('a')
+	assert queue.done('a')
+	assert queue.pop() == 'a'
+	assert not queue.done('a')
+	assert not queue.is_pending('a')
+	assert len(queue) == 0
+	assert (queue.puts, queue.coalesced) == (3, 2)
+
+
+def test_take_and_discard():
+	queue = CoalescingQueue()
+	queue.put('a')
+	queue.put('b')
+	assert queue.take('b')
+	assert not queue.take('b')
+	queue.put('b')  # dirty while in flight
+	queue.discard('b')
+	assert not queue.done('b')
+	assert queue.pop() == 'a'
+	assert queue.pop() is None